@@ -1,69 +1,116 @@
 import requests
-import json
-import time
+import run_metrics
 from datetime import datetime, timedelta
+from notion_api import get_client, is_gone_response
+from notion_uploader import DEFAULT_MAX_WORKERS, run_streaming
 
-def add_reminders_for_upcoming_courses(api_key, database_id):
-    """查詢未來一個月內、尚未設定提醒的課程，並批次為它們加上提醒。"""
-    print("\n▶️  add_reminders: 開始執行提醒新增任務...")
-    
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-        "Notion-Version": "2022-06-28",
-    }
-    
-    query_url = f"https://api.notion.com/v1/databases/{database_id}/query"
+DEFAULT_WINDOW_DAYS = 30
+DEFAULT_REMINDER_MINUTES = 20
 
-    one_month_later = (datetime.now() + timedelta(days=30)).isoformat()
+def build_reminder(minutes_before):
+    """將提前分鐘數轉成 Notion 的 reminder 物件，能整除時改用較大的單位。"""
+    if minutes_before % 1440 == 0:
+        return {"unit": "day", "value": minutes_before // 1440}
+    if minutes_before % 60 == 0:
+        return {"unit": "hour", "value": minutes_before // 60}
+    return {"unit": "minute", "value": minutes_before}
 
+def _stream_pages_in_window(client, database_id, window_start, window_end):
+    """以產生器逐頁串流查詢結果，呼叫端處理前一頁時才會去抓下一頁。"""
     query_payload = {
         "filter": {
             "and": [
-                {"property": "課程日期與提醒", "date": {"on_or_after": datetime.now().isoformat()}},
-                {"property": "課程日期與提醒", "date": {"on_or_before": one_month_later}},
+                {"property": "課程日期與提醒", "date": {"on_or_after": window_start.isoformat()}},
+                {"property": "課程日期與提醒", "date": {"on_or_before": window_end.isoformat()}},
                 {"property": "課程日期與提醒", "date": {"is_not_empty": True}}
             ]
-        }
+        },
+        "sorts": [{"property": "課程日期與提醒", "direction": "ascending"}],
     }
-    
+    return client.query_database(database_id, query_payload)
+
+def _patch_reminder(client, database_id, page, reminder, cache):
+    """為單一頁面加上提醒，回傳 "updated"、"skipped" 或 "failed"。"""
+    page_id = page["id"]
     try:
-        print("   正在查詢未來一個月內的課程...")
-        response = requests.post(query_url, headers=headers, data=json.dumps(query_payload))
-        response.raise_for_status()
-        pages_to_update = response.json().get("results", [])
+        page_title = page["properties"]["課程名稱"]["title"][0]["text"]["content"]
+        original_date = page["properties"]["課程日期與提醒"]["date"]
+    except (KeyError, IndexError, TypeError):
+        print(f"     ⚠️  頁面 {page_id} 缺少必要屬性，已跳過。")
+        run_metrics.incr("reminders.skipped")
+        return "skipped"
 
-        if not pages_to_update:
-            print("   ✅ 檢查完畢，未來一個月內沒有需要新增提醒的課程。")
-            return
+    # 如果已經有提醒，就跳過，避免重複設定
+    if not original_date or original_date.get("reminder"):
+        run_metrics.incr("reminders.skipped")
+        return "skipped"
 
-        print(f"   偵測到 {len(pages_to_update)} 堂課需要更新提醒，開始處理...")
+    update_payload = {"properties": {"課程日期與提醒": {"date": dict(original_date, reminder=reminder)}}}
+    try:
+        update_response = client.patch(f"/v1/pages/{page_id}", update_payload)
+    except requests.exceptions.RequestException as e:
+        run_metrics.incr("reminders.failed")
+        print(f"     ❌ 更新 '{page_title}' 時發生網路錯誤: {e}")
+        return "failed"
 
-        for page in pages_to_update:
-            page_id = page["id"]
-            page_title = page["properties"]["課程名稱"]["title"][0]["text"]["content"]
-            original_date = page["properties"]["課程日期與提醒"]["date"]
-            
-            # 如果已經有提醒，就跳過，避免重複設定
-            if original_date and original_date.get("reminder"):
-                print(f"     ℹ️  '{page_title}' 已有提醒，跳過。")
-                continue
+    if update_response.status_code == 200:
+        print(f"     ✅ 已為 '{page_title}' 加上提醒。")
+        run_metrics.incr("reminders.updated")
+        if cache is not None:
+            cache.upsert_page(database_id, update_response.json())
+        return "updated"
+    if is_gone_response(update_response):
+        # 鏡像中的頁面已在 Notion 上被封存或刪除：移除該列，下次查詢就不會再挑中它
+        print(f"     ⚠️  '{page_title}' 已被封存或刪除，已跳過。")
+        run_metrics.incr("reminders.skipped")
+        if cache is not None:
+            cache.delete_page(page_id)
+        return "skipped"
+    run_metrics.incr("reminders.failed")
+    print(f"     ❌ 更新 '{page_title}' 失敗: {update_response.text}")
+    return "failed"
 
-            original_date["reminder"] = {"unit": "minute", "value": 20}
-            
-            update_payload = {"properties": {"課程日期與提醒": {"date": original_date}}}
-            
-            update_url = f"https://api.notion.com/v1/pages/{page_id}"
-            update_response = requests.patch(update_url, headers=headers, data=json.dumps(update_payload))
-            
-            if update_response.status_code == 200:
-                print(f"     ✅ 已為 '{page_title}' 加上提醒。")
-            else:
-                print(f"     ❌ 更新 '{page_title}' 失敗: {update_response.text}")
-            
-            time.sleep(0.4)
+@run_metrics.timed("reminders.total")
+def add_reminders_for_upcoming_courses(api_key, database_id, cache=None, window_days=DEFAULT_WINDOW_DAYS,
+                                       reminder_minutes=DEFAULT_REMINDER_MINUTES, max_workers=DEFAULT_MAX_WORKERS):
+    """查詢未來 window_days 天內、尚未設定提醒的課程，並批次為它們加上提前 reminder_minutes 分鐘的提醒。
 
-        print("\n✅ 所有近期課程的提醒已設定完畢！")
+    查詢結果以分頁串流方式取得，每取得一筆就交給有限併發的 PATCH 執行緒池處理，
+    寫入與後續分頁的查詢同時進行。
+    若傳入 NotionCache，會先增量更新本地鏡像，再於本地找出缺少提醒的課程，只對 API 發出寫入請求。
+    """
+    print("\n▶️  add_reminders: 開始執行提醒新增任務...")
+    
+    client = get_client(api_key)
+    window_start = datetime.now()
+    window_end = window_start + timedelta(days=window_days)
+    reminder = build_reminder(reminder_minutes)
+
+    try:
+        if cache is not None:
+            print("   正在增量更新本地課程鏡像...")
+            updated = cache.refresh(client, database_id)
+            print(f"   本地鏡像已更新 {updated} 個頁面，改由本地查詢未來 {window_days} 天內的課程...")
+            pages = cache.courses_lacking_reminders(database_id, window_start, window_end)
+        else:
+            print(f"   正在串流查詢未來 {window_days} 天內的課程...")
+            pages = _stream_pages_in_window(client, database_id, window_start, window_end)
+
+        results, elapsed = run_streaming(lambda page: _patch_reminder(client, database_id, page, reminder, cache),
+                                         pages, max_workers)
+        run_metrics.observe("reminders.write_phase", elapsed)
+        counts = {"updated": 0, "skipped": 0, "failed": 0}
+        for outcome in results:
+            counts[outcome] += 1
 
     except requests.exceptions.RequestException as e:
-        print(f"❌ 執行提醒新增任務時發生錯誤: {e.response.text}")
\ No newline at end of file
+        print(f"❌ 執行提醒新增任務時發生錯誤: {e}")
+        return False
+
+    if not counts["updated"] and not counts["failed"]:
+        print(f"   ✅ 檢查完畢，未來 {window_days} 天內沒有需要新增提醒的課程 (已有提醒 {counts['skipped']} 堂)。")
+        return True
+
+    print(f"\n✅ 提醒設定完畢：新增 {counts['updated']} 堂、已有提醒跳過 {counts['skipped']} 堂、失敗 {counts['failed']} 堂。")
+    client.print_latency_report()
+    return counts["failed"] == 0
@@ -0,0 +1,186 @@
+"""多帳號批次執行學期性功能 (抓取 → 處理 → 上傳)。
+
+名冊檔可為 CSV (第一列為欄位名) 或 JSONL (每行一個 JSON 物件)，欄位：
+    username, password, notion_key, course_database_id, semester_name, start_date, end_date
+選填欄位 login_url、fetch_mode、exclude_dates 未提供時沿用 config.txt；fused 模式另需 note_database_id。
+
+用法:
+    python batch_runner.py roster.csv --workers 4
+    python batch_runner.py roster.csv --dry-run     # 只試算請求數與預估耗時
+    python batch_runner.py roster.csv --upload-mode fused # 建立課程頁面時一併建立筆記與近期提醒
+    python batch_runner.py roster.csv --upload-mode ics   # 只輸出 .ics 行事曆檔 (名冊不需 Notion 欄位)
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import run_metrics
+from config_loader import read_config, config_flag
+
+REQUIRED_FIELDS = ["username", "password", "notion_key", "course_database_id", "semester_name", "start_date", "end_date"]
+NOTION_FIELDS = ("notion_key", "course_database_id")
+
+
+def read_roster(path):
+    """讀取 CSV 或 JSONL 名冊，回傳帳號字典列表。"""
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        if path.lower().endswith(('.jsonl', '.json')):
+            return [json.loads(line) for line in f if line.strip()]
+        return [dict(row) for row in csv.DictReader(f)]
+
+
+def validate_account(account, upload_mode="sync"):
+    """檢查名冊中的單一帳號，回傳錯誤訊息；無誤時回傳 None。ics 模式不需要 Notion 欄位，fused 模式另需筆記資料庫。"""
+    required = REQUIRED_FIELDS + (["note_database_id"] if upload_mode == "fused" else [])
+    missing = [field for field in required
+               if not account.get(field) and not (upload_mode == "ics" and field in NOTION_FIELDS)]
+    if missing:
+        return f"缺少欄位: {', '.join(missing)}"
+    try:
+        datetime.strptime(account["start_date"], "%Y-%m-%d")
+        datetime.strptime(account["end_date"], "%Y-%m-%d")
+    except ValueError:
+        return "日期格式錯誤，應為YYYY-MM-DD"
+    return None
+
+
+def run_account(account, defaults, upload_mode="sync", resume=False, force=False, dry_run=False):
+    """為單一帳號執行抓取、處理與上傳 (與 main.execute_semester_task 共用 run_semester_pipeline)，
+    回傳包含各階段耗時的結果字典。
+
+    課表與設定都和上次成功上傳時相同時跳過處理與上傳 (stage 為 "cached")；sync 模式下以上次成功上傳的
+    CSV 快照比對，只同步受影響的課程。force=True 時忽略快取與快照。
+    dry_run=True 時只試算 (stage 為 "planned")，結果字典的 plan 欄位為試算結果，不寫入 Notion、CSV 或快取。
+    upload_mode="ics" 時不呼叫 Notion API，改在 CSV 旁輸出 .ics 行事曆檔 (結果字典的 ics_path 欄位)。
+    """
+    from main import run_semester_pipeline
+
+    username = account.get("username", "")
+    result = {"username": username, "semester": account.get("semester_name", ""), "success": False,
+              "stage": "validate", "error": None, "timings": {}}
+    started = time.perf_counter()
+    try:
+        error = validate_account(account, upload_mode)
+        if error:
+            result["error"] = error
+            return result
+
+        config = dict(defaults, USERNAME=username, PASSWORD=account["password"],
+                      LOGIN_URL=account.get("login_url") or defaults.get("LOGIN_URL"),
+                      FETCH_MODE=account.get("fetch_mode") or defaults.get("FETCH_MODE", "auto"),
+                      EXCLUDE_DATES=account.get("exclude_dates") or defaults.get("EXCLUDE_DATES"),
+                      NOTION_KEY=account.get("notion_key"), COURSE_DATABASE_ID=account.get("course_database_id"),
+                      NOTE_DATABASE_ID=account.get("note_database_id"),
+                      # 多個帳號平行寫入同一個 SQLite 鏡像會互相鎖住，批次執行不使用本地鏡像
+                      USE_NOTION_CACHE="false")
+        # 每個帳號的 CSV 與課表快取放在各自的子目錄，避免同一開學日互相覆寫
+        result.update(run_semester_pipeline(config, account["semester_name"], account["start_date"],
+                                            account["end_date"], upload_mode, resume, force, dry_run,
+                                            output_dir=os.path.join("course_schedule", username)))
+        return result
+    except Exception as e:
+        result["error"] = f"{type(e).__name__} - {e}"
+        return result
+    finally:
+        result["timings"]["total"] = time.perf_counter() - started
+
+
+def run_batch(accounts, defaults, workers=4, upload_mode="sync", resume=False, force=False, dry_run=False):
+    """以執行緒池平行處理所有帳號；所有帳號共用同一個 Notion 權杖桶限流器。"""
+    print(f"🚀 批次執行開始：共 {len(accounts)} 個帳號，{workers} 個工作執行緒。")
+    done_count = [0]
+    lock = threading.Lock()
+
+    def worker(account):
+        result = run_account(account, defaults, upload_mode, resume, force, dry_run)
+        with lock:
+            done_count[0] += 1
+            status = "✅" if result["success"] else "❌"
+            print(f"\n{status} [{done_count[0]}/{len(accounts)}] 帳號 {result['username']} 完成 "
+                  f"({result['timings']['total']:.1f} 秒){'' if result['success'] else '：' + str(result['error'])}")
+        return result
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(worker, accounts))
+    return results, time.perf_counter() - started
+
+
+def print_batch_report(results, elapsed):
+    print("\n" + "="*70)
+    print("📋 批次執行報告")
+    print(f"{'帳號':<12}{'學期':<8}{'結果':<6}{'抓取':>8}{'處理':>8}{'上傳':>8}{'總計':>8}  備註")
+    for r in results:
+        t = r["timings"]
+        cells = "".join(f"{t[k]:>8.1f}" if k in t else f"{'-':>8}" for k in ("fetch", "process", "upload", "total"))
+        note = "課表未變動，已略過" if r["stage"] == "cached" else ("" if r["success"] else f"{r['stage']}: {r['error']}")
+        if "plan" in r:
+            note = (f"試算: 讀取 {r['plan']['reads']}、寫入 {r['plan']['write_total']} 次，"
+                    f"{r['plan']['payload_bytes'] / 1024:.1f} KB")
+        print(f"{r['username']:<12}{r['semester']:<8}{'成功' if r['success'] else '失敗':<6}{cells}  {note}")
+    succeeded = sum(1 for r in results if r["success"])
+    print("-"*70)
+    print(f"成功 {succeeded}/{len(results)} 個帳號，總耗時 {elapsed:.1f} 秒。")
+    plans = [r["plan"] for r in results if "plan" in r]
+    if plans:
+        # 所有帳號共用同一個權杖桶，實際執行的耗時下限為總請求數 ÷ 速率
+        requests_total = sum(p["requests"] for p in plans)
+        eta = max(requests_total / plans[0]["rate"], max(p["eta_s"] for p in plans))
+        print(f"📋 試算合計：{requests_total} 次請求 (寫入 {sum(p['write_total'] for p in plans)} 次)，"
+              f"payload {sum(p['payload_bytes'] for p in plans) / 1024:.1f} KB，預估耗時約 {eta:.0f} 秒。")
+    print("="*70)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("roster", help="名冊檔路徑 (.csv 或 .jsonl)")
+    parser.add_argument("--workers", type=int, default=4, help="同時處理的帳號數 (預設 4)")
+    parser.add_argument("--rate", type=float, default=None, help="所有帳號共用的 Notion 請求速率上限 (次/秒，預設 3)")
+    parser.add_argument("--upload-mode", choices=["sync", "upload", "fused", "ics"], default="sync",
+                        help="sync 只同步差異；upload 全部重新建立；fused 建立時一併建立筆記與近期提醒；"
+                             "ics 只輸出 .ics 行事曆檔，不呼叫 Notion API")
+    parser.add_argument("--resume", action="store_true", help="upload/fused 模式下依檢查點日誌只補送上次未完成的頁面")
+    parser.add_argument("--force", action="store_true", help="忽略課表快取，一律重新抓取、處理與上傳")
+    parser.add_argument("--dry-run", action="store_true", help="只試算每個帳號將送出的請求數與預估耗時，不做任何寫入")
+    parser.add_argument("--config", default="config.txt", help="提供預設 LOGIN_URL/FETCH_MODE 的設定檔")
+    args = parser.parse_args(argv)
+
+    defaults = read_config(args.config) or {}
+    # 作息表為整個行程共用，批次中的帳號需屬於同一校區作息
+    from process_courses import configure_schedule
+    try:
+        configure_schedule(defaults)
+    except ValueError as e:
+        print(f"❌ 設定檔中的作息或停課日設定格式錯誤: {e}")
+        return 1
+    try:
+        accounts = read_roster(args.roster)
+    except (OSError, ValueError) as e:
+        print(f"❌ 讀取名冊失敗: {e}")
+        return 1
+    if not accounts:
+        print("❌ 名冊中沒有任何帳號。")
+        return 1
+
+    if args.rate:
+        from rate_limiter import notion_limiter
+        notion_limiter.rate = args.rate
+
+    run_metrics.start_run("batch", live=config_flag(defaults, "METRICS_LIVE"))
+    results, elapsed = run_batch(accounts, defaults, args.workers, args.upload_mode, args.resume, args.force,
+                                 args.dry_run)
+    print_batch_report(results, elapsed)
+    metrics_path = run_metrics.finish_run(defaults.get("METRICS_DIR") or run_metrics.DEFAULT_METRICS_DIR)
+    if metrics_path:
+        print(f"📈 本次執行指標已輸出至 {metrics_path}")
+    return 0 if all(r["success"] for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""離線 Notion 寫入路徑基準測試：對本地替身伺服器執行真實的上傳、筆記、提醒與初始化流程。
+
+依序執行 setup_all_databases → upload_courses_to_notion → create_weekly_notes_for_semester
+→ add_reminders_for_upcoming_courses，再以融合模式 (上傳時一併建立筆記與提醒) 重跑一次，並以 JSON 輸出每個情境的請求數、requests/s、
+用戶端量測的 p50/p95 延遲、429 次數與總耗時。
+
+用法:
+    python benchmarks/bench_notion.py                          # 6 門課 × 18 週，3 次/秒
+    python benchmarks/bench_notion.py --courses 30 --rate 30 --latency-ms 80 --rate-limit-prob 0.05
+    python benchmarks/bench_notion.py --output bench_output.json
+"""
+import argparse
+import builtins
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, ROOT)
+
+from fake_notion_server import start_fake_notion  # noqa: E402
+
+SEMESTER_NAME = "114上"
+FUSED_SEMESTER_NAME = "114上-融合"
+_WEEKDAYS = "一二三四五"
+
+
+def build_courses(course_count, weeks):
+    """產生 course_count 門課，學期從三週前開始，讓部分週次落在提醒的 30 天視窗內。"""
+    from process_courses import build_course
+
+    start = date.today() - timedelta(days=21)
+    end = start + timedelta(days=weeks * 7 - 1)
+    courses = []
+    for i in range(course_count):
+        first_period = 2 + (i % 3) * 3
+        time_str = "/".join(f"{_WEEKDAYS[i % 5]}{p}" for p in range(first_period, first_period + 3))
+        courses.append(build_course(f"BM__{i:05d}", f"基準測試課程 {i}", "選" if i % 2 else "學程", f"教師{i}", time_str,
+                                    f"理工二館E{400 + i}", "3/3", start.isoformat(), end.isoformat()))
+    return courses
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[int(q * (len(values) - 1))]
+
+
+def _summarize_result(result):
+    """上傳任務回傳結構化結果字典，只保留計數欄位以免輸出過長。"""
+    if isinstance(result, dict):
+        return {k: v for k, v in result.items() if isinstance(v, int)}
+    return result if isinstance(result, (bool, int, type(None))) else str(result)
+
+
+def run_scenario(name, server, api_key, func, verbose):
+    """執行單一情境並彙整用戶端與伺服器端的量測結果。"""
+    from notion_api import get_client
+
+    server.reset_log()
+    output = io.StringIO()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stdout if verbose else output):
+        result = func()
+    elapsed = time.perf_counter() - started
+
+    client_stats = get_client(api_key).overall_latency_stats()
+    with server.lock:
+        log = list(server.request_log)
+    server_latencies = [entry[3] for entry in log]
+    return {
+        "scenario": name,
+        "result": _summarize_result(result),
+        "wall_time_s": round(elapsed, 3),
+        "requests": len(log),
+        "requests_per_s": round(len(log) / elapsed, 2) if elapsed else 0.0,
+        "throttled_429": sum(1 for entry in log if entry[2] == 429),
+        "errors": sum(1 for entry in log if entry[2] >= 400 and entry[2] != 429),
+        "client_latency_ms": {"p50": round(client_stats["p50"] * 1000, 2), "p95": round(client_stats["p95"] * 1000, 2),
+                              "max": round(client_stats["max"] * 1000, 2)},
+        "server_latency_ms": {"p50": round(_percentile(server_latencies, 0.50) * 1000, 2),
+                              "p95": round(_percentile(server_latencies, 0.95) * 1000, 2)},
+        "client_retries": client_stats["retries"],
+    }
+
+
+def run_all_scenarios(server, parent_page_id, courses, scenarios, verbose, clear_blocks=0):
+    """依序執行所有情境，結果附加到 scenarios。"""
+    from setup_databases import setup_all_databases, clear_all_blocks_on_page
+    from notion_uploader import upload_courses_to_notion
+    from create_notes import create_weekly_notes_for_semester
+    from add_reminders import add_reminders_for_upcoming_courses
+
+    if clear_blocks:
+        # 清空一個內容很多的儀表板頁面 (分頁列出 + 併發刪除)
+        dashboard_page_id = "1" * 32
+        server.add_page(dashboard_page_id, "待清空的儀表板")
+        server.add_page_blocks(dashboard_page_id, clear_blocks)
+        scenarios.append(run_scenario("clear_all_blocks_on_page", server, "bench-clear",
+                                      lambda: clear_all_blocks_on_page("bench-clear", dashboard_page_id), verbose))
+
+    scenarios.append(run_scenario("setup_all_databases", server, "bench-setup",
+                                  lambda: setup_all_databases("bench-setup", parent_page_id), verbose))
+
+    titles = {d["title"][0]["plain_text"]: d["id"] for d in server.databases.values()}
+    course_db = titles["📚 課程總資料庫"]
+    notes_db = titles["📝 學習筆記總資料庫"]
+
+    scenarios.append(run_scenario("upload_courses_to_notion", server, "bench-upload",
+                                  lambda: upload_courses_to_notion("bench-upload", course_db, courses, SEMESTER_NAME),
+                                  verbose))
+    scenarios.append(run_scenario("create_weekly_notes_for_semester", server, "bench-notes",
+                                  lambda: create_weekly_notes_for_semester("bench-notes", course_db, notes_db, SEMESTER_NAME),
+                                  verbose))
+    scenarios.append(run_scenario("add_reminders_for_upcoming_courses", server, "bench-reminders",
+                                  lambda: add_reminders_for_upcoming_courses("bench-reminders", course_db),
+                                  verbose))
+    # 融合模式：以另一個學期名稱重跑，建立課程頁面時一併建立筆記與近期提醒，可與上面三個情境的總和比較
+    scenarios.append(run_scenario("fused_upload_notes_reminders", server, "bench-fused",
+                                  lambda: upload_courses_to_notion("bench-fused", course_db, courses, FUSED_SEMESTER_NAME,
+                                                                   notes_db_id=notes_db, reminder_window_days=30),
+                                  verbose))
+
+
+def run(args):
+    server = start_fake_notion(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                               rate_limit_prob=args.rate_limit_prob, retry_after=args.retry_after, seed=args.seed)
+    os.environ["NOTION_API_BASE_URL"] = server.base_url
+
+    import notion_api
+    import rate_limiter
+    notion_api.NOTION_API_BASE_URL = server.base_url
+    rate_limiter.notion_limiter.rate = args.rate
+    rate_limiter.notion_limiter.capacity = max(rate_limiter.notion_limiter.capacity, args.rate)
+
+    parent_page_id = "0" * 32
+    server.add_page(parent_page_id, "基準測試父頁面")
+    server.add_page_blocks(parent_page_id, args.parent_blocks)
+    courses = build_courses(args.courses, args.weeks)
+    scenarios = []
+
+    # setup 會改寫工作目錄下的 config.txt 並以 input() 詢問是否清空頁面；上傳與筆記會寫入檢查點日誌，
+    # 因此整個基準測試都在暫存目錄中執行
+    original_cwd, original_input = os.getcwd(), builtins.input
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        builtins.input = lambda prompt="": "n"
+        try:
+            run_all_scenarios(server, parent_page_id, courses, scenarios, args.verbose, args.clear_blocks)
+        finally:
+            builtins.input = original_input
+            os.chdir(original_cwd)
+    server.shutdown()
+
+    return {
+        "config": {"courses": args.courses, "weeks": args.weeks, "course_pages": sum(len(c["重複日期列表"]) for c in courses),
+                   "rate": args.rate, "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms,
+                   "rate_limit_prob": args.rate_limit_prob, "parent_blocks": args.parent_blocks,
+                   "clear_blocks": args.clear_blocks},
+        "scenarios": scenarios,
+        "total_wall_time_s": round(sum(s["wall_time_s"] for s in scenarios), 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--courses", type=int, default=6)
+    parser.add_argument("--weeks", type=int, default=18)
+    parser.add_argument("--rate", type=float, default=3.0, help="Notion 請求速率上限 (次/秒)")
+    parser.add_argument("--latency-ms", type=float, default=150.0, help="替身伺服器的基本延遲")
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--rate-limit-prob", type=float, default=0.02, help="每個請求回應 429 的機率")
+    parser.add_argument("--retry-after", type=float, default=0.5)
+    parser.add_argument("--parent-blocks", type=int, default=0, help="父頁面上預先放置的區塊數")
+    parser.add_argument("--clear-blocks", type=int, default=250, help="清空情境中待清空頁面上的區塊數 (0 表示略過)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="將 JSON 結果寫入檔案 (預設輸出到 stdout)")
+    parser.add_argument("--verbose", action="store_true", help="顯示各任務原本的輸出")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
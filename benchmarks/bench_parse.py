@@ -0,0 +1,109 @@
+"""課表解析後端的正確性與效能基準測試。
+
+對 fixtures/ 中的選課頁面 (以及依其放大產生的大型頁面) 逐一執行：
+  1. 舊版路徑：BeautifulSoup html.parser 解析整份頁面；
+  2. 每個可用的後端：直接切出 grd_selects 表格後解析。
+先確認所有後端的輸出與舊版完全相同，再回報每頁的平均解析時間。
+
+用法:
+    python benchmarks/bench_parse.py [--iterations 50] [--json]
+"""
+import argparse
+import base64
+import glob
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from process_courses import GRID_TABLE_ID, PARSER_BACKENDS, available_parser_backends, extract_grid_rows  # noqa: E402
+
+FIXTURES_DIR = os.path.join(ROOT, "benchmarks", "fixtures")
+
+
+def legacy_bs4_rows(page_source):
+    """舊版 process_source_and_create_files 的解析方式：html.parser 解析整份頁面。"""
+    from bs4 import BeautifulSoup
+    table = BeautifulSoup(page_source, 'html.parser').find('table', id=GRID_TABLE_ID)
+    if not table:
+        return None
+    return [[(td.get_text(), td.get_text(strip=True)) for td in tr.find_all('td')] for tr in table.find_all('tr')]
+
+
+def inflate_page(page_source, row_copies=8, viewstate_kb=64, nav_items=400):
+    """以真實頁面的特徵放大 fixture：大型 __VIEWSTATE、冗長選單與更多課程列。"""
+    rng = random.Random(0)
+    viewstate = base64.b64encode(rng.randbytes(viewstate_kb * 768)).decode()
+    page = page_source.replace("{viewstate}", viewstate)
+    nav = "\n".join(f'<li><a href="course_query.aspx?dept={i}">系所課程 {i}</a></li>' for i in range(nav_items))
+    page = page.replace('<ul class="nav">', '<ul class="nav">\n' + nav, 1)
+    header_end = page.index("</tr>", page.index(f'id="{GRID_TABLE_ID}"')) + len("</tr>")
+    table_end = page.index("</table>", header_end)
+    body = page[header_end:table_end]
+    return page[:header_end] + body * row_copies + page[table_end:]
+
+
+def load_pages():
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            source = f.read()
+        if GRID_TABLE_ID not in source:
+            continue
+        name = os.path.basename(path)
+        pages[name] = source
+        pages[f"{name} (放大)"] = inflate_page(source)
+    return pages
+
+
+def time_per_call(func, source, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func(source)
+    return (time.perf_counter() - started) / iterations
+
+
+def run(iterations):
+    backends = available_parser_backends()
+    results = []
+    for name, source in load_pages().items():
+        expected = legacy_bs4_rows(source)
+        entry = {"page": name, "bytes": len(source.encode("utf-8")), "rows": len(expected) - 1,
+                 "legacy_bs4_ms": time_per_call(legacy_bs4_rows, source, iterations) * 1000, "backends": {}}
+        for backend in backends:
+            output = extract_grid_rows(source, backend)
+            entry["backends"][backend] = {
+                "matches": output == expected,
+                "ms": time_per_call(lambda s: extract_grid_rows(s, backend), source, iterations) * 1000,
+            }
+        results.append(entry)
+    return {"available_backends": backends, "all_backends": list(PARSER_BACKENDS), "iterations": iterations, "pages": results}
+
+
+def print_report(report):
+    print(f"可用後端: {', '.join(report['available_backends'])} (每頁重複 {report['iterations']} 次)")
+    for entry in report["pages"]:
+        print(f"\n📄 {entry['page']}: {entry['bytes'] / 1024:.0f} KB, {entry['rows']} 列課程")
+        print(f"   {'舊版 bs4 整頁':<16}{entry['legacy_bs4_ms']:>9.3f} ms/頁")
+        for backend, stat in entry["backends"].items():
+            speedup = entry["legacy_bs4_ms"] / stat["ms"] if stat["ms"] else float("inf")
+            status = "✅ 輸出一致" if stat["matches"] else "❌ 輸出不一致"
+            print(f"   {backend:<16}{stat['ms']:>9.3f} ms/頁  ({speedup:.1f}x)  {status}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--json", action="store_true", help="以 JSON 輸出結果")
+    args = parser.parse_args()
+    report = run(args.iterations)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+    all_match = all(stat["matches"] for entry in report["pages"] for stat in entry["backends"].values())
+    sys.exit(0 if all_match else 1)
@@ -0,0 +1,161 @@
+"""課程紀錄與頁面 payload 編碼的微基準測試 (不需網路)。
+
+比較兩條路徑在大型批次 (預設 200 位學生 × 8 門課 × 18 週) 下的耗時與記憶體配置：
+  1. 舊版路徑：每門課為中文鍵字典並預先展開「重複日期列表」，上傳時每週重新組出完整
+     properties，再 json.dumps(..., ensure_ascii=False).encode()；
+  2. 目前路徑：Course 紀錄 (__slots__、上課日延遲產生) + CoursePayloadTemplate
+     (靜態屬性每門課序列化一次，每週只接上週次與日期)。
+先確認兩條路徑產生的 payload 完全相同，再回報耗時、tracemalloc 量到的配置峰值與保留大小。
+
+用法:
+    python benchmarks/bench_payload.py [--students 200] [--courses 8] [--weeks 18] [--repeat 5] [--json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from notion_uploader import CoursePayloadTemplate, build_course_page_properties, iter_course_slots  # noqa: E402
+from process_courses import build_course, format_class_time_to_dict, generate_recurring_dates  # noqa: E402
+
+_WEEKDAYS = "一二三四五"
+REMINDER = {"unit": "minute", "value": 20}
+DATABASE_ID = "0" * 32
+SEMESTER_NAME = "115上"
+
+
+def course_rows(students, courses_per_student):
+    """產生 (代碼, 名稱, 必選修, 教師, 上課時間, 教室, 學分) 欄位列，模擬整屆學生的課表。"""
+    rows = []
+    for s in range(students):
+        for c in range(courses_per_student):
+            i = s * courses_per_student + c
+            first_period = 2 + (c % 3) * 3
+            time_str = "/".join(f"{_WEEKDAYS[c % 5]}{p}" for p in range(first_period, first_period + 3))
+            rows.append((f"BM__{i:05d}", f"基準測試課程 {c}", "選" if c % 2 else "必", f"教師{c}", time_str,
+                         f"理工二館E{400 + c}", "3/3"))
+    return rows
+
+
+def legacy_courses(rows, start, end, exclude_dates):
+    """舊版 process_source_and_create_files 產生的課程字典。"""
+    courses = []
+    for code, name, category, teacher, time_str, room, credits in rows:
+        details = format_class_time_to_dict(time_str)
+        courses.append({
+            "課程代碼": code, "課程名稱": name, "必選修": category, "授課教師": teacher,
+            "星期": details.get("weekday"), "開始時間": details.get("start_time"), "結束時間": details.get("end_time"),
+            "重複日期列表": generate_recurring_dates(time_str, start, end, exclude_dates),
+            "上課教室": room, "學分": credits,
+        })
+    return courses
+
+
+def compact_courses(rows, start, end, exclude_dates):
+    return [build_course(code, name, category, teacher, time_str, room, credits, start, end, exclude_dates)
+            for code, name, category, teacher, time_str, room, credits in rows]
+
+
+def legacy_payloads(courses, reminder_cutoff):
+    """舊版上傳迴圈：每週重新組出完整 properties 並整份序列化。"""
+    bodies = []
+    for course in courses:
+        for i, date_info in enumerate(course.get("重複日期列表", [])):
+            week_num = date_info.get("week", i + 1)
+            properties = build_course_page_properties(course, SEMESTER_NAME, week_num, date_info)
+            if date_info["start"] < reminder_cutoff:
+                properties["課程日期與提醒"]["date"]["reminder"] = REMINDER
+            payload = {"parent": {"database_id": DATABASE_ID}, "properties": properties}
+            bodies.append(json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+    return bodies
+
+
+def template_payloads(courses, reminder_cutoff):
+    bodies = []
+    for course in courses:
+        template = CoursePayloadTemplate(course, SEMESTER_NAME, DATABASE_ID, REMINDER)
+        for week_num, start_iso, end_iso in iter_course_slots(course):
+            bodies.append(template.render(week_num, start_iso, end_iso, start_iso < reminder_cutoff))
+    return bodies
+
+
+def measure(func, *args, repeat=5):
+    """回傳 (最快一次耗時秒數, 配置峰值位元組, 回傳值保留的位元組, 回傳值)。"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    result = func(*args)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, retained, result
+
+
+def run(students, courses_per_student, weeks, repeat):
+    start = date(2026, 2, 23)
+    end = start + timedelta(days=weeks * 7 - 1)
+    exclude_dates = frozenset({(start + timedelta(days=39)).isoformat(), (start + timedelta(days=42)).isoformat()})
+    # 約前四週的課帶提醒，模擬融合模式的提醒視窗
+    reminder_cutoff = (start + timedelta(days=28)).isoformat()
+    rows = course_rows(students, courses_per_student)
+    start_text, end_text = start.isoformat(), end.isoformat()
+
+    report = {"students": students, "courses": len(rows), "weeks": weeks, "repeat": repeat, "stages": {}}
+    stages = report["stages"]
+    legacy_time, legacy_peak, legacy_kept, old = measure(legacy_courses, rows, start_text, end_text, exclude_dates,
+                                                         repeat=repeat)
+    compact_time, compact_peak, compact_kept, new = measure(compact_courses, rows, start_text, end_text, exclude_dates,
+                                                            repeat=repeat)
+    stages["build_courses"] = {"legacy": (legacy_time, legacy_peak, legacy_kept),
+                               "current": (compact_time, compact_peak, compact_kept)}
+
+    legacy_time, legacy_peak, _, old_bodies = measure(legacy_payloads, old, reminder_cutoff, repeat=repeat)
+    compact_time, compact_peak, _, new_bodies = measure(template_payloads, new, reminder_cutoff, repeat=repeat)
+    stages["encode_payloads"] = {"legacy": (legacy_time, legacy_peak, None), "current": (compact_time, compact_peak, None)}
+
+    report["pages"] = len(old_bodies)
+    report["payload_bytes"] = {"legacy": sum(map(len, old_bodies)), "current": sum(map(len, new_bodies))}
+    report["matches"] = ([dict(course) for course in new] == old and len(old_bodies) == len(new_bodies)
+                         and all(json.loads(a) == json.loads(b) for a, b in zip(old_bodies, new_bodies)))
+    return report
+
+
+def print_report(report):
+    print(f"📦 {report['students']} 位學生、{report['courses']} 門課 × {report['weeks']} 週 = {report['pages']} 個頁面 "
+          f"(取 {report['repeat']} 次中最快者)")
+    labels = {"build_courses": "建立課程紀錄", "encode_payloads": "組出並編碼 payload"}
+    for stage, paths in report["stages"].items():
+        print(f"\n   {labels[stage]}")
+        legacy_time = paths["legacy"][0]
+        for path, (elapsed, peak, kept) in paths.items():
+            speedup = legacy_time / elapsed if elapsed else float("inf")
+            kept_text = f"，保留 {kept / 1024 / 1024:6.2f} MB" if kept is not None else ""
+            print(f"   {'舊版' if path == 'legacy' else '目前':<4}{elapsed * 1000:>9.1f} ms  ({speedup:.1f}x)  "
+                  f"配置峰值 {peak / 1024 / 1024:6.2f} MB{kept_text}")
+    sizes = report["payload_bytes"]
+    print(f"\n   payload 總大小：舊版 {sizes['legacy'] / 1024:.0f} KB，目前 {sizes['current'] / 1024:.0f} KB (省去空白)")
+    print(f"   {'✅ 兩條路徑的課程與 payload 內容一致' if report['matches'] else '❌ 兩條路徑的輸出不一致'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--courses", type=int, default=8, help="每位學生的課程數")
+    parser.add_argument("--weeks", type=int, default=18)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="以 JSON 輸出結果")
+    args = parser.parse_args()
+    report = run(args.students, args.courses, args.weeks, args.repeat)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+    sys.exit(0 if report["matches"] else 1)
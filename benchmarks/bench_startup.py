@@ -0,0 +1,166 @@
+"""子命令冷啟動基準測試：以全新的直譯器執行 cli.py 的每個子命令，量測啟動時間並檢查延遲匯入。
+
+每個子命令都在獨立的子行程中執行 (對本地替身 Notion 與替身選課系統)，回報：
+  - import_s: 直譯器啟動後匯入 cli 所花的時間
+  - ready_s:  從直譯器啟動到子命令送出第一個 HTTP 請求前的時間 (冷啟動成本)
+  - total_s:  子行程總耗時
+  - heavy_imports: 執行期間嘗試匯入的重量級套件 (selenium、bs4、requests...)
+
+reminders 與 notes 路徑若嘗試匯入 selenium 或任何 HTML 解析套件，結束碼為 1。
+
+用法:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeat 5 --output startup.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(ROOT)
+sys.path.insert(0, REPO)
+sys.path.insert(0, ROOT)
+
+from fake_course_site import start_fake_course_site  # noqa: E402
+from fake_notion_server import start_fake_notion  # noqa: E402
+
+HEAVY_MODULES = ("selenium", "bs4", "lxml", "selectolax", "requests", "urllib3", "sqlite3")
+# 這些路徑只需要 Notion API，不應載入瀏覽器自動化或 HTML 解析套件
+FORBIDDEN = {"reminders": ("selenium", "bs4", "lxml", "selectolax"),
+             "notes": ("selenium", "bs4", "lxml", "selectolax")}
+
+# 在子行程中執行：攔截 __import__ 記錄所有嘗試匯入的重量級套件 (即使未安裝也會記錄)，
+# 並以第一次建立 socket 連線的時間作為「準備就緒」時間點。
+_CHILD = r"""
+import sys, time, json, io, contextlib, socket
+started = time.perf_counter()
+heavy = set(HEAVY)
+attempted = []
+
+import builtins
+_import = builtins.__import__
+def _recording_import(name, *args, **kwargs):
+    top = name.split('.')[0]
+    if top in heavy and top not in attempted:
+        attempted.append(top)
+    return _import(name, *args, **kwargs)
+builtins.__import__ = _recording_import
+first_request = []
+_connect = socket.socket.connect
+def _record_connect(self, *args, **kwargs):
+    if not first_request:
+        first_request.append(time.perf_counter())
+    return _connect(self, *args, **kwargs)
+socket.socket.connect = _record_connect
+
+sys.path.insert(0, REPO)
+import cli
+imported = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    rc = cli.main(ARGV)
+finished = time.perf_counter()
+print(json.dumps({"rc": rc, "import_s": imported - started,
+                  "ready_s": (first_request[0] if first_request else finished) - started,
+                  "run_s": finished - started,
+                  "heavy_imports": sorted(set(attempted) | {m for m in heavy if m in sys.modules})}))
+"""
+
+
+def _child_source(argv):
+    return (_CHILD.replace("HEAVY", repr(HEAVY_MODULES)).replace("REPO", repr(REPO))
+            .replace("ARGV", repr(argv)))
+
+
+def run_subcommand(argv, env, cwd):
+    """在全新直譯器中執行一個子命令，回傳量測結果字典。"""
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", _child_source(argv)], env=env, cwd=cwd,
+                          capture_output=True, text=True, timeout=600)
+    total = time.perf_counter() - started
+    lines = [line for line in proc.stdout.splitlines() if line.startswith("{")]
+    if proc.returncode != 0 or not lines:
+        return {"rc": proc.returncode, "error": (proc.stderr or proc.stdout)[-2000:], "total_s": round(total, 4)}
+    result = json.loads(lines[-1])
+    result["total_s"] = total
+    return result
+
+
+def _median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def run(args):
+    notion = start_fake_notion()
+    site = start_fake_course_site()
+    parent_page_id = "0" * 32
+    notion.add_page(parent_page_id, "啟動測試父頁面")
+    from setup_databases import course_database_properties, note_database_properties
+    _, course_db = notion.create_database({"title": [{"text": {"content": "課程"}}],
+                                           "properties": course_database_properties()})
+    _, notes_db = notion.create_database({"title": [{"text": {"content": "筆記"}}],
+                                          "properties": note_database_properties(course_db["id"])})
+
+    env = dict(os.environ, NOTION_API_BASE_URL=notion.base_url,
+               NOTION_AUTO_NOTION_KEY="bench-startup", NOTION_AUTO_PARENT_PAGE_ID=parent_page_id,
+               NOTION_AUTO_COURSE_DATABASE_ID=course_db["id"], NOTION_AUTO_NOTE_DATABASE_ID=notes_db["id"],
+               NOTION_AUTO_LOGIN_URL=site.login_url, NOTION_AUTO_USERNAME=site.username,
+               NOTION_AUTO_PASSWORD=site.password, NOTION_AUTO_FETCH_MODE="http")
+    subcommands = {
+        "setup": ["--rate", "500", "setup"],
+        "sync-semester": ["--rate", "500", "sync-semester", "--semester", "114上",
+                          "--start", "2025-09-08", "--end", "2026-01-09"],
+        "notes": ["--rate", "500", "notes", "--semester", "114上"],
+        "reminders": ["--rate", "500", "reminders"],
+        "daemon": ["--rate", "500", "daemon", "--reminders-every", "1", "--jitter", "0", "--once"],
+    }
+
+    report, violations = [], []
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, argv in subcommands.items():
+            runs = [run_subcommand(argv, env, workdir) for _ in range(args.repeat)]
+            failed = [r for r in runs if "error" in r]
+            if failed:
+                report.append({"subcommand": name, "rc": failed[0]["rc"], "error": failed[0]["error"]})
+                violations.append(f"{name}: 子行程執行失敗")
+                continue
+            heavy = sorted({module for r in runs for module in r["heavy_imports"]})
+            bad = [module for module in heavy if module in FORBIDDEN.get(name, ())]
+            if bad:
+                violations.append(f"{name}: 不應載入 {', '.join(bad)}")
+            report.append({
+                "subcommand": name,
+                "rc": runs[-1]["rc"],
+                "import_ms": round(_median([r["import_s"] for r in runs]) * 1000, 1),
+                "ready_ms": round(_median([r["ready_s"] for r in runs]) * 1000, 1),
+                "total_ms": round(_median([r["total_s"] for r in runs]) * 1000, 1),
+                "heavy_imports": heavy,
+            })
+    notion.shutdown()
+    site.shutdown()
+    return {"python": sys.version.split()[0], "repeat": args.repeat, "subcommands": report,
+            "violations": violations}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="每個子命令執行幾次 (取中位數)")
+    parser.add_argument("--output", help="將 JSON 結果寫入檔案 (預設輸出到 stdout)")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if report["violations"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""選課系統的本地替身伺服器：以 fixtures/ 中的頁面模擬 ASP.NET 登入流程。
+
+用法:
+    python benchmarks/fake_course_site.py --port 8081          # 啟動伺服器
+    python benchmarks/fake_course_site.py --check               # 啟動後以 HTTP 模式登入並驗證
+
+啟動後將 config.txt 的 LOGIN_URL 指向 http://127.0.0.1:<port>/Default.aspx 即可離線測試。
+"""
+import argparse
+import os
+import secrets
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+SESSION_COOKIE = "ASP.NET_SessionId"
+
+
+def _load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+class FakeCourseSite(ThreadingHTTPServer):
+    """記住發出的 __VIEWSTATE/__EVENTVALIDATION 與已登入的 session。"""
+
+    daemon_threads = True
+
+    def __init__(self, address, username, password, course_page="course_sele.html"):
+        super().__init__(address, _Handler)
+        self.username = username
+        self.password = password
+        self.login_page = _load_fixture("login.html")
+        self.course_page = _load_fixture(course_page)
+        self.issued_tokens = {}
+        self.sessions = set()
+        self.lock = threading.Lock()
+
+    @property
+    def login_url(self):
+        return f"http://127.0.0.1:{self.server_port}/Default.aspx"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _session(self):
+        for part in (self.headers.get("Cookie") or "").split(";"):
+            name, _, value = part.strip().partition("=")
+            if name == SESSION_COOKIE:
+                return value
+        return None
+
+    def _send(self, status, body="", headers=None):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _redirect(self, location, headers=None):
+        self._send(302, "", dict(headers or {}, Location=location))
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        server = self.server
+        if path.endswith("/Default.aspx"):
+            viewstate, validation = secrets.token_hex(16), secrets.token_hex(8)
+            with server.lock:
+                server.issued_tokens[viewstate] = validation
+            page = server.login_page.replace("{viewstate}", viewstate).replace("{eventvalidation}", validation)
+            self._send(200, page)
+        elif path.endswith("/course_sele.aspx"):
+            with server.lock:
+                logged_in = self._session() in server.sessions
+            if not logged_in:
+                self._redirect("Default.aspx")
+                return
+            self._send(200, server.course_page.replace("{viewstate}", secrets.token_hex(16)))
+        elif path.endswith("/Logout.aspx"):
+            with server.lock:
+                server.sessions.discard(self._session())
+            self._redirect("Default.aspx", {"Set-Cookie": f"{SESSION_COOKIE}=; Path=/"})
+        else:
+            self._send(404, "Not Found")
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        server = self.server
+        length = int(self.headers.get("Content-Length") or 0)
+        form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode("utf-8"), keep_blank_values=True).items()}
+        if not path.endswith("/Default.aspx"):
+            self._send(404, "Not Found")
+            return
+        with server.lock:
+            valid_state = server.issued_tokens.pop(form.get("__VIEWSTATE"), None) == form.get("__EVENTVALIDATION")
+        credentials_ok = (form.get("ctl00$ContentPlaceHolder1$ed_StudNo") == server.username
+                          and form.get("ctl00$ContentPlaceHolder1$ed_pass") == server.password
+                          and "ctl00$ContentPlaceHolder1$BtnLoginNew" in form)
+        if not (valid_state and credentials_ok):
+            # 真實系統在失敗時會重新顯示登入頁並跳出 alert
+            self._send(200, "<script>alert('帳號或密碼錯誤');</script>" + server.login_page)
+            return
+        session_id = secrets.token_hex(12)
+        with server.lock:
+            server.sessions.add(session_id)
+        self._redirect("course_sele.aspx", {"Set-Cookie": f"{SESSION_COOKIE}={session_id}; Path=/; HttpOnly"})
+
+
+def start_fake_course_site(username="411000000", password="secret", port=0):
+    """在背景執行緒啟動替身伺服器並回傳之 (port=0 表示自動選擇空閒埠)。"""
+    server = FakeCourseSite(("127.0.0.1", port), username, password)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _check():
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from web_scraper import login_and_get_page_source_http
+
+    server = start_fake_course_site()
+    try:
+        source = login_and_get_page_source_http(server.login_url, server.username, server.password)
+        ok = bool(source) and "ContentPlaceHolder1_grd_selects" in source and not server.sessions
+        wrong = login_and_get_page_source_http(server.login_url, server.username, "wrong-password")
+    finally:
+        server.shutdown()
+    print(f"正確帳密取得選課頁並已登出: {ok}；錯誤帳密被拒: {wrong is None}")
+    return ok and wrong is None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--username", default="411000000")
+    parser.add_argument("--password", default="secret")
+    parser.add_argument("--check", action="store_true", help="啟動替身伺服器並驗證 HTTP 登入流程後結束")
+    args = parser.parse_args()
+    if args.check:
+        sys.exit(0 if _check() else 1)
+    site = FakeCourseSite(("127.0.0.1", args.port), args.username, args.password)
+    print(f"替身選課系統已啟動: {site.login_url} (帳號 {args.username})")
+    site.serve_forever()
@@ -0,0 +1,394 @@
+"""Notion API 的本地替身伺服器，供基準測試與離線開發使用。
+
+支援 /v1/pages、/v1/databases、/v1/databases/{id}/query、/v1/blocks/{id}/children、
+/v1/blocks/{id}、/v1/users/me 與 /v1/search；資料存在記憶體中。
+可設定每個請求的延遲、429 注入機率與查詢分頁大小。
+
+用法:
+    python benchmarks/fake_notion_server.py --port 8082 --latency-ms 150 --rate-limit-prob 0.02
+    NOTION_API_BASE_URL=http://127.0.0.1:8082 python main.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def _new_id():
+    return str(uuid.uuid4())
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:00.000Z")
+
+
+def _norm(notion_id):
+    return (notion_id or "").replace("-", "")
+
+
+def _rich_text(items):
+    """將請求中的 rich text 補上 API 回應會帶的 plain_text 與 type。"""
+    result = []
+    for item in items or []:
+        content = item.get("text", {}).get("content", "")
+        result.append(dict(item, type=item.get("type", "text"), plain_text=content))
+    return result
+
+
+def _property_to_response(prop, schema_type=None):
+    if "title" in prop:
+        return {"type": "title", "title": _rich_text(prop["title"])}
+    if "rich_text" in prop:
+        return {"type": "rich_text", "rich_text": _rich_text(prop["rich_text"])}
+    for key in ("select", "number", "date", "relation", "status", "checkbox"):
+        if key in prop:
+            return {"type": key, key: prop[key]}
+    return dict(prop, type=schema_type)
+
+
+def _date_value(prop):
+    date = (prop or {}).get("date") or {}
+    start = date.get("start")
+    if not start:
+        return None
+    try:
+        parsed = datetime.fromisoformat(start.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.astimezone()
+
+
+def _plain(prop):
+    prop = prop or {}
+    items = prop.get("title") or prop.get("rich_text") or []
+    return "".join(item.get("plain_text", "") for item in items)
+
+
+def _matches(page, condition):
+    """極簡版的 Notion filter 求值器，涵蓋本專案用到的條件。"""
+    if "and" in condition:
+        return all(_matches(page, c) for c in condition["and"])
+    if "or" in condition:
+        return any(_matches(page, c) for c in condition["or"])
+    if condition.get("timestamp") in ("last_edited_time", "created_time"):
+        key = condition["timestamp"]
+        since = condition[key].get("on_or_after")
+        return since is None or page[key] >= since
+    prop = page["properties"].get(condition.get("property"))
+    if "select" in condition:
+        name = ((prop or {}).get("select") or {}).get("name")
+        return name == condition["select"].get("equals")
+    if "rich_text" in condition:
+        return _plain(prop) == condition["rich_text"].get("equals")
+    if "number" in condition:
+        return (prop or {}).get("number") == condition["number"].get("equals")
+    if "relation" in condition:
+        wanted = _norm(condition["relation"].get("contains"))
+        return any(_norm(r["id"]) == wanted for r in (prop or {}).get("relation") or [])
+    if "date" in condition:
+        value = _date_value(prop)
+        rule = condition["date"]
+        if rule.get("is_not_empty"):
+            return value is not None
+        if rule.get("is_empty"):
+            return value is None
+        if value is None:
+            return False
+        for op, check in (("on_or_after", lambda v, b: v >= b), ("on_or_before", lambda v, b: v <= b)):
+            if op in rule:
+                bound = datetime.fromisoformat(rule[op].replace("Z", "+00:00"))
+                bound = bound if bound.tzinfo else bound.astimezone()
+                if not check(value, bound):
+                    return False
+        return True
+    return True
+
+
+class FakeNotion(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency_ms=0.0, jitter_ms=0.0, rate_limit_prob=0.0, retry_after=0.5,
+                 page_size_cap=100, seed=None):
+        super().__init__(address, _Handler)
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.rate_limit_prob = rate_limit_prob
+        self.retry_after = retry_after
+        self.page_size_cap = page_size_cap
+        self.random = random.Random(seed)
+        self.lock = threading.RLock()
+        self.pages = {}       # page_id(無橫線) -> page
+        self.databases = {}   # database_id(無橫線) -> database
+        self.blocks = {}      # parent_id(無橫線) -> [block]
+        self.request_log = []  # (method, endpoint, status, seconds)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+    # --- 種子資料 ---
+    def add_page(self, page_id, title="Untitled"):
+        """放入一個不屬於任何資料庫的一般頁面 (例如初始化用的父頁面)。"""
+        page = {"object": "page", "id": page_id, "created_time": _now(), "last_edited_time": _now(),
+                "parent": {"type": "workspace", "workspace": True}, "archived": False,
+                "url": f"https://www.notion.so/{_norm(page_id)}",
+                "properties": {"title": _property_to_response({"title": [{"text": {"content": title}}]})}}
+        with self.lock:
+            self.pages[_norm(page_id)] = page
+        return page
+
+    def add_page_blocks(self, parent_id, count):
+        with self.lock:
+            children = self.blocks.setdefault(_norm(parent_id), [])
+            for i in range(count):
+                children.append({"object": "block", "id": _new_id(), "type": "paragraph",
+                                 "paragraph": {"rich_text": _rich_text([{"text": {"content": f"區塊 {i}"}}])}})
+
+    # --- 資源操作 ---
+    def create_database(self, body):
+        db_id = _new_id()
+        database = {
+            "object": "database", "id": db_id, "created_time": _now(), "last_edited_time": _now(),
+            "title": _rich_text(body.get("title")), "icon": body.get("icon"), "parent": body.get("parent"),
+            "url": f"https://www.notion.so/{_norm(db_id)}", "archived": False,
+            "properties": {name: dict(spec, id=_new_id()[:4], name=name, type=next(iter(spec)))
+                           for name, spec in (body.get("properties") or {}).items()},
+        }
+        with self.lock:
+            self.databases[_norm(db_id)] = database
+            parent_id = _norm((body.get("parent") or {}).get("page_id"))
+            if parent_id:
+                self.blocks.setdefault(parent_id, []).append({
+                    "object": "block", "id": db_id, "type": "child_database",
+                    "child_database": {"title": _plain({"title": database["title"]})}})
+        return 200, database
+
+    def update_database(self, db_id, body):
+        with self.lock:
+            database = self.databases.get(_norm(db_id))
+            if database is None:
+                return 404, {"object": "error", "status": 404, "code": "object_not_found", "message": "database not found"}
+            for name, spec in (body.get("properties") or {}).items():
+                database["properties"][name] = dict(database["properties"].get(name, {}), **spec, name=name,
+                                                    type=next(iter(spec)))
+            database["last_edited_time"] = _now()
+            return 200, database
+
+    def create_page(self, body):
+        parent = body.get("parent") or {}
+        db_id = _norm(parent.get("database_id"))
+        if db_id and db_id not in self.databases:
+            return 404, {"object": "error", "status": 404, "code": "object_not_found", "message": "database not found"}
+        if len(body.get("children") or []) > 100:
+            return 400, {"object": "error", "status": 400, "code": "validation_error",
+                         "message": "body.children.length should be ≤ 100"}
+        page_id = _new_id()
+        page = {
+            "object": "page", "id": page_id, "created_time": _now(), "last_edited_time": _now(),
+            "parent": parent, "archived": False, "url": f"https://www.notion.so/{_norm(page_id)}",
+            "properties": {name: _property_to_response(prop) for name, prop in (body.get("properties") or {}).items()},
+        }
+        with self.lock:
+            self.pages[_norm(page_id)] = page
+            if body.get("children"):
+                self.blocks[_norm(page_id)] = [dict(b, id=_new_id(), object="block") for b in body["children"]]
+        return 200, page
+
+    def update_page(self, page_id, body):
+        with self.lock:
+            page = self.pages.get(_norm(page_id))
+            if page is None:
+                return 404, {"object": "error", "status": 404, "code": "object_not_found", "message": "page not found"}
+            if page["archived"] and body.get("archived") is not False:
+                return 400, {"object": "error", "status": 400, "code": "validation_error",
+                             "message": "Can't edit block that is archived. You must unarchive the block before editing."}
+            for name, prop in (body.get("properties") or {}).items():
+                page["properties"][name] = _property_to_response(prop)
+            if "archived" in body:
+                page["archived"] = bool(body["archived"])
+            page["last_edited_time"] = _now()
+            return 200, page
+
+    def query_database(self, db_id, body):
+        with self.lock:
+            if _norm(db_id) not in self.databases:
+                return 404, {"object": "error", "status": 404, "code": "object_not_found", "message": "database not found"}
+            pages = [p for p in self.pages.values()
+                     if _norm(p["parent"].get("database_id")) == _norm(db_id) and not p["archived"]]
+        if body.get("filter"):
+            pages = [p for p in pages if _matches(p, body["filter"])]
+        for sort in body.get("sorts") or []:
+            if sort.get("timestamp"):
+                pages.sort(key=lambda p: p[sort["timestamp"]], reverse=sort.get("direction") == "descending")
+        return 200, self._paginate(pages, body.get("start_cursor"), body.get("page_size"))
+
+    def _paginate(self, items, cursor, page_size):
+        size = min(int(page_size or 100), self.page_size_cap)
+        offset = int(cursor or 0)
+        chunk = items[offset:offset + size]
+        has_more = offset + size < len(items)
+        return {"object": "list", "results": chunk, "has_more": has_more,
+                "next_cursor": str(offset + size) if has_more else None}
+
+    # --- 記錄 ---
+    def log(self, method, endpoint, status, seconds):
+        with self.lock:
+            self.request_log.append((method, endpoint, status, seconds))
+
+    def reset_log(self):
+        with self.lock:
+            self.request_log = []
+
+
+_ROUTES = [
+    ("POST", re.compile(r"^/v1/pages$"), "pages"),
+    ("GET", re.compile(r"^/v1/pages/([^/]+)$"), "page_get"),
+    ("PATCH", re.compile(r"^/v1/pages/([^/]+)$"), "page_patch"),
+    ("POST", re.compile(r"^/v1/databases$"), "database_create"),
+    ("GET", re.compile(r"^/v1/databases/([^/]+)$"), "database_get"),
+    ("PATCH", re.compile(r"^/v1/databases/([^/]+)$"), "database_patch"),
+    ("POST", re.compile(r"^/v1/databases/([^/]+)/query$"), "database_query"),
+    ("GET", re.compile(r"^/v1/blocks/([^/]+)/children$"), "children_get"),
+    ("PATCH", re.compile(r"^/v1/blocks/([^/]+)/children$"), "children_append"),
+    ("DELETE", re.compile(r"^/v1/blocks/([^/]+)$"), "block_delete"),
+    ("GET", re.compile(r"^/v1/users/me$"), "users_me"),
+    ("POST", re.compile(r"^/v1/search$"), "search"),
+]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body, headers=None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self, method):
+        started = time.perf_counter()
+        server = self.server
+        parsed = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        endpoint = re.sub(r"/[0-9a-fA-F-]{32,36}", "/{id}", parsed.path)
+
+        if server.latency or server.jitter:
+            time.sleep(server.latency + server.random.uniform(0, server.jitter))
+        with server.lock:
+            throttled = server.rate_limit_prob and server.random.random() < server.rate_limit_prob
+        if throttled:
+            self._reply(429, {"object": "error", "status": 429, "code": "rate_limited", "message": "Rate limited"},
+                        {"Retry-After": str(server.retry_after)})
+            server.log(method, endpoint, 429, time.perf_counter() - started)
+            return
+
+        try:
+            body = json.loads(raw.decode("utf-8")) if raw else {}
+        except ValueError:
+            self._reply(400, {"object": "error", "status": 400, "code": "invalid_json", "message": "invalid JSON"})
+            server.log(method, endpoint, 400, time.perf_counter() - started)
+            return
+
+        status, payload = 404, {"object": "error", "status": 404, "code": "invalid_request_url", "message": "unknown route"}
+        for route_method, pattern, name in _ROUTES:
+            match = pattern.match(parsed.path)
+            if route_method == method and match:
+                status, payload = self._dispatch(name, match.groups(), body, parse_qs(parsed.query))
+                break
+        self._reply(status, payload)
+        server.log(method, endpoint, status, time.perf_counter() - started)
+
+    def _dispatch(self, name, args, body, query):
+        server = self.server
+        if name == "pages":
+            return server.create_page(body)
+        if name == "page_get":
+            page = server.pages.get(_norm(args[0]))
+            return (200, page) if page else (404, {"object": "error", "status": 404, "code": "object_not_found"})
+        if name == "page_patch":
+            return server.update_page(args[0], body)
+        if name == "database_create":
+            return server.create_database(body)
+        if name == "database_get":
+            database = server.databases.get(_norm(args[0]))
+            return (200, database) if database else (404, {"object": "error", "status": 404, "code": "object_not_found"})
+        if name == "database_patch":
+            return server.update_database(args[0], body)
+        if name == "database_query":
+            return server.query_database(args[0], body)
+        if name == "children_get":
+            with server.lock:
+                children = [b for b in server.blocks.get(_norm(args[0]), []) if not b.get("archived")]
+            return 200, server._paginate(children, (query.get("start_cursor") or [None])[0],
+                                         (query.get("page_size") or [100])[0])
+        if name == "children_append":
+            if len(body.get("children", [])) > 100:
+                return 400, {"object": "error", "status": 400, "code": "validation_error",
+                             "message": "body.children.length should be ≤ 100"}
+            new_blocks = [dict(b, id=_new_id(), object="block") for b in body.get("children", [])]
+            with server.lock:
+                server.blocks.setdefault(_norm(args[0]), []).extend(new_blocks)
+            return 200, {"object": "list", "results": new_blocks, "has_more": False, "next_cursor": None}
+        if name == "block_delete":
+            with server.lock:
+                for children in server.blocks.values():
+                    for block in children:
+                        if _norm(block["id"]) == _norm(args[0]):
+                            block["archived"] = True
+                            return 200, block
+            return 404, {"object": "error", "status": 404, "code": "object_not_found"}
+        if name == "users_me":
+            return 200, {"object": "user", "id": _new_id(), "type": "bot", "name": "Fake Notion Bot"}
+        if name == "search":
+            with server.lock:
+                results = [d for d in server.databases.values() if not d["archived"]]
+            return 200, server._paginate(results, body.get("start_cursor"), body.get("page_size"))
+        return 404, {"object": "error", "status": 404, "code": "invalid_request_url"}
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+
+def start_fake_notion(port=0, **options):
+    """在背景執行緒啟動替身伺服器並回傳之 (port=0 表示自動選擇空閒埠)。"""
+    server = FakeNotion(("127.0.0.1", port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--rate-limit-prob", type=float, default=0.0, help="每個請求回應 429 的機率")
+    parser.add_argument("--retry-after", type=float, default=0.5)
+    parser.add_argument("--page-size", type=int, default=100, help="查詢每頁最多回傳筆數")
+    args = parser.parse_args()
+    fake = FakeNotion(("127.0.0.1", args.port), args.latency_ms, args.jitter_ms, args.rate_limit_prob,
+                      args.retry_after, args.page_size)
+    print(f"替身 Notion API 已啟動: {fake.base_url}")
+    fake.serve_forever()
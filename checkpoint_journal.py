@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+import time
+
+DEFAULT_JOURNAL_DIR = ".checkpoints"
+
+
+def journal_path(kind, database_id, semester_name, directory=DEFAULT_JOURNAL_DIR):
+    """依任務種類、目標資料庫與學期決定日誌檔路徑，讓不同批次互不干擾。"""
+    safe_semester = "".join(ch if ch.isalnum() else "_" for ch in semester_name)
+    return os.path.join(directory, f"{kind}-{database_id.replace('-', '')}-{safe_semester}.jsonl")
+
+
+class CheckpointJournal:
+    """只追加寫入的 JSONL 檢查點日誌，記錄已完成項目的 key → page_id。
+
+    每筆記錄寫入後立即 flush 到作業系統，並每 fsync_every 筆或每 fsync_interval 秒
+    批次 fsync 一次；行程崩潰時最多只會遺失最後一行，讀取時會略過不完整的行。
+    """
+
+    def __init__(self, path, fsync_every=20, fsync_interval=1.0):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._completed = {}
+        self._failed = {}
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    @staticmethod
+    def _key(key):
+        # JSON 沒有 tuple，統一轉成字串形式的 key 方便比對
+        return json.dumps(list(key) if isinstance(key, (list, tuple)) else [key], ensure_ascii=False)
+
+    def load(self):
+        """讀入既有日誌，回傳已完成的項目數。"""
+        self._completed.clear()
+        self._failed.clear()
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # 崩潰時寫到一半的最後一行
+                key = self._key(entry["key"])
+                if entry.get("status") == "done":
+                    self._completed[key] = entry.get("page_id")
+                    self._failed.pop(key, None)
+                elif key not in self._completed:
+                    self._failed[key] = entry.get("error")
+        return len(self._completed)
+
+    def reset(self):
+        """清空日誌，開始一個全新的批次。"""
+        with self._lock:
+            self._close_file()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self._completed.clear()
+            self._failed.clear()
+
+    def finish(self):
+        """整個批次都成功後刪除日誌，下次執行時不會再被當成未完成的批次。"""
+        self.reset()
+
+    def completed_page_id(self, key):
+        """回傳已完成項目的 page_id；尚未完成時回傳 None。"""
+        return self._completed.get(self._key(key))
+
+    def is_completed(self, key):
+        return self._key(key) in self._completed
+
+    @property
+    def completed_count(self):
+        return len(self._completed)
+
+    @property
+    def failed_count(self):
+        return len(self._failed)
+
+    def record_done(self, key, page_id):
+        self._append({"key": list(key), "status": "done", "page_id": page_id})
+        with self._lock:
+            self._completed[self._key(key)] = page_id
+            self._failed.pop(self._key(key), None)
+
+    def record_failure(self, key, error=None):
+        self._append({"key": list(key), "status": "failed", "error": error})
+        with self._lock:
+            self._failed[self._key(key)] = error
+
+    def _append(self, entry):
+        entry["ts"] = round(time.time(), 3)
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(line)
+            self._file.flush()
+            self._unsynced += 1
+            now = time.monotonic()
+            if self._unsynced >= self.fsync_every or now - self._last_sync >= self.fsync_interval:
+                os.fsync(self._file.fileno())
+                self._unsynced = 0
+                self._last_sync = now
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+            self._unsynced = 0
+
+    def close(self):
+        """fsync 尚未落地的記錄並關閉檔案。"""
+        with self._lock:
+            self._close_file()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,272 @@
+"""非互動式命令列介面與常駐排程模式。
+
+每個子命令的參數優先順序為：命令列參數 > 環境變數 NOTION_AUTO_<設定名稱> > config.txt。
+
+用法:
+    python cli.py setup [--clear-parent]
+    python cli.py sync-semester --semester 115上 --start 2026-02-23 --end 2026-06-19 [--mode sync|upload|fused|ics] [--resume] [--dry-run]
+    python cli.py notes --semester 115上 [--resume] [--dry-run]
+    python cli.py reminders [--window-days 30] [--minutes-before 20] [--dry-run]
+    python cli.py daemon --reminders-every 3600 --notes-every 86400 --notes-semester 115上 --jitter 120
+"""
+import argparse
+import json
+import os
+import random
+import signal
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import run_metrics
+from config_loader import config_flag, load_settings
+
+DEFAULT_LOCK_DIR = ".locks"
+DEFAULT_HEALTH_FILE = os.path.join(".daemon", "health.json")
+DRY_RUN_HELP = "只讀取 Notion 現況，印出將送出的請求數、payload 大小與預估耗時，不做任何寫入"
+
+
+# --- 跨行程的任務鎖 ---
+
+def _try_lock(handle):
+    """對已開啟的檔案取得非阻塞的獨佔鎖，成功回傳 True。"""
+    try:
+        import fcntl
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except ImportError:
+        import msvcrt
+        try:
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+    except OSError:
+        return False
+    return True
+
+
+@contextmanager
+def task_lock(name, directory=DEFAULT_LOCK_DIR):
+    """同一任務同時只允許一個行程執行 (例如 cron 與常駐模式重疊)；取得鎖時產出 True，否則產出 False。
+
+    鎖由作業系統在檔案關閉或行程結束時釋放，因此不會因崩潰而殘留。
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    handle = open(os.path.join(directory, f"{name}.lock"), 'a+')
+    try:
+        acquired = _try_lock(handle)
+        if acquired:
+            handle.seek(0)
+            handle.truncate()
+            handle.write(f"{os.getpid()}\n")
+            handle.flush()
+        yield acquired
+    finally:
+        handle.close()
+
+
+def run_locked(name, func, *args, **kwargs):
+    """在任務鎖內執行 func；若已有其他行程在執行同一任務則跳過並回傳 None。"""
+    with task_lock(name) as acquired:
+        if not acquired:
+            print(f"⏭️  任務「{name}」正由其他行程執行中，本次跳過。")
+            run_metrics.incr(f"lock.skipped.{name}")
+            return None
+        return func(*args, **kwargs)
+
+
+# --- 子命令 ---
+
+def cmd_setup(args, config):
+    from main import run_initial_setup
+    return run_locked("setup", run_initial_setup, config, clear_parent=args.clear_parent)
+
+
+def cmd_sync_semester(args, config):
+    from main import execute_semester_task
+    if args.dry_run:
+        # 試算只讀取 Notion，不需要與實際執行互斥
+        return execute_semester_task(config, args.semester, args.start, args.end, args.mode, args.resume,
+                                     args.force, dry_run=True)
+    return run_locked("semester", execute_semester_task, config, args.semester, args.start, args.end,
+                      args.mode, args.resume, args.force)
+
+
+def cmd_notes(args, config):
+    from main import execute_note_task
+    if args.dry_run:
+        return execute_note_task(config, args.semester, args.resume, dry_run=True)
+    return run_locked("notes", execute_note_task, config, args.semester, args.resume)
+
+
+def cmd_reminders(args, config):
+    from main import execute_reminder_task
+    if args.window_days is not None:
+        config["REMINDER_WINDOW_DAYS"] = str(args.window_days)
+    if args.minutes_before is not None:
+        config["REMINDER_MINUTES_BEFORE"] = str(args.minutes_before)
+    if args.dry_run:
+        return execute_reminder_task(config, dry_run=True)
+    return run_locked("reminders", execute_reminder_task, config)
+
+
+# --- 常駐排程模式 ---
+
+def _write_health(path, state):
+    """以暫存檔加 os.replace 原子性地寫入健康狀態檔，讓監控程式不會讀到寫一半的內容。"""
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    snapshot = run_metrics.current_run().snapshot()
+    state = dict(state, updated_at=datetime.now().isoformat(timespec='seconds'),
+                 counters=snapshot["counters"], timers=snapshot["timers"])
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _daemon_jobs(args, config):
+    """依參數組出排程工作列表：(名稱, 間隔秒數, 執行函式)。"""
+    from main import execute_reminder_task, execute_note_task
+    jobs = []
+    if args.reminders_every > 0:
+        jobs.append(("reminders", args.reminders_every, lambda: execute_reminder_task(config)))
+    if args.notes_every > 0:
+        jobs.append(("notes", args.notes_every, lambda: execute_note_task(config, args.notes_semester, True)))
+    return jobs
+
+
+def run_daemon(args, config):
+    """常駐行程：共用同一個暖機的 Notion 連線池，依排程執行提醒與筆記補建。
+
+    每次執行後的下次時間為「間隔 + 0~jitter 秒的隨機延遲」，避免多個帳號同時打到 API；
+    每個工作都在跨行程的任務鎖內執行，與 cron 觸發的單次執行不會重疊。
+    """
+    jobs = _daemon_jobs(args, config)
+    if not jobs:
+        print("❌ 未啟用任何排程工作 (請設定 --reminders-every 或 --notes-every)。")
+        return False
+    if any(name == "notes" for name, _, _ in jobs) and not args.notes_semester:
+        print("❌ 啟用筆記補建時必須指定 --notes-semester。")
+        return False
+
+    stop = threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+
+    now = time.time()
+    state = {"pid": os.getpid(), "started_at": datetime.now().isoformat(timespec='seconds'), "status": "running",
+             "jobs": {name: {"interval_s": interval, "runs": 0, "failures": 0, "last_status": None,
+                             "last_started": None, "last_duration_s": None, "next_run": None}
+                      for name, interval, _ in jobs}}
+    next_run = {name: now + random.uniform(0, args.jitter) for name, _, _ in jobs}
+    print(f"🛰️  常駐模式啟動 (PID {os.getpid()})，工作: {', '.join(name for name, _, _ in jobs)}。按 Ctrl-C 結束。")
+
+    try:
+        while not stop.is_set():
+            for name, _, _ in jobs:
+                state["jobs"][name]["next_run"] = datetime.fromtimestamp(next_run[name]).isoformat(timespec='seconds')
+            _write_health(args.health_file, state)
+
+            name, interval, func = min(jobs, key=lambda job: next_run[job[0]])
+            if stop.wait(max(0.0, next_run[name] - time.time())):
+                break
+
+            job_state = state["jobs"][name]
+            job_state["last_started"] = datetime.now().isoformat(timespec='seconds')
+            started = time.perf_counter()
+            try:
+                with run_metrics.span(f"daemon.{name}"):
+                    ok = run_locked(name, func)
+                job_state["last_status"] = "skipped" if ok is None else ("ok" if ok else "failed")
+            except Exception as e:
+                # 單次工作失敗不應讓常駐行程結束
+                job_state["last_status"] = f"error: {type(e).__name__} - {e}"
+                print(f"❌ 排程工作「{name}」發生未預期錯誤: {e}")
+            job_state["last_duration_s"] = round(time.perf_counter() - started, 3)
+            job_state["runs"] += 1
+            if job_state["last_status"] not in ("ok", "skipped"):
+                job_state["failures"] += 1
+            next_run[name] = time.time() + interval + random.uniform(0, args.jitter)
+
+            if args.once and all(state["jobs"][n]["runs"] for n, _, _ in jobs):
+                break
+    except KeyboardInterrupt:
+        print("\n🛑 收到中斷訊號，正在結束常駐模式...")
+
+    state["status"] = "stopped"
+    _write_health(args.health_file, state)
+    return all(job["failures"] == 0 for job in state["jobs"].values())
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="config.txt", help="設定檔路徑 (預設 config.txt)")
+    parser.add_argument("--rate", type=float, default=None, help="Notion 請求速率上限 (次/秒，預設 3)")
+    parser.add_argument("--metrics-dir", default=None, help="執行指標 JSON 的輸出目錄")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("setup", help="建立所有 Notion 資料庫並寫回設定檔")
+    p.add_argument("--clear-parent", action="store_true", help="先清空父頁面上的所有區塊 (不可復原)")
+    p.set_defaults(handler=cmd_setup)
+
+    p = sub.add_parser("sync-semester", help="抓取課表並上傳/同步到課程資料庫")
+    p.add_argument("--semester", required=True, help="學期名稱，例如 115上")
+    p.add_argument("--start", required=True, help="學期開始日期 YYYY-MM-DD")
+    p.add_argument("--end", required=True, help="學期結束日期 YYYY-MM-DD")
+    p.add_argument("--mode", choices=["sync", "upload", "fused", "ics"], default="sync",
+                   help="sync 只同步差異；upload 全部建立；fused 建立時一併建立筆記與近期提醒；"
+                        "ics 只輸出 .ics 行事曆檔，不呼叫 Notion API")
+    p.add_argument("--resume", action="store_true", help="upload/fused 模式下依檢查點日誌只補送未完成的項目")
+    p.add_argument("--force", action="store_true", help="忽略課表快取，一律重新抓取、處理與上傳")
+    p.add_argument("--dry-run", action="store_true", help=DRY_RUN_HELP)
+    p.set_defaults(handler=cmd_sync_semester)
+
+    p = sub.add_parser("notes", help="為指定學期批次建立課堂筆記")
+    p.add_argument("--semester", required=True)
+    p.add_argument("--resume", action="store_true")
+    p.add_argument("--dry-run", action="store_true", help=DRY_RUN_HELP)
+    p.set_defaults(handler=cmd_notes)
+
+    p = sub.add_parser("reminders", help="為近期課程加上提醒")
+    p.add_argument("--window-days", type=int, default=None)
+    p.add_argument("--minutes-before", type=int, default=None)
+    p.add_argument("--dry-run", action="store_true", help=DRY_RUN_HELP)
+    p.set_defaults(handler=cmd_reminders)
+
+    p = sub.add_parser("daemon", help="常駐執行提醒與筆記補建排程")
+    p.add_argument("--reminders-every", type=float, default=3600, help="提醒任務間隔秒數 (0 表示停用，預設 3600)")
+    p.add_argument("--notes-every", type=float, default=0, help="筆記補建間隔秒數 (0 表示停用)")
+    p.add_argument("--notes-semester", default=None, help="筆記補建的學期名稱")
+    p.add_argument("--jitter", type=float, default=60, help="每次排程額外加上的 0~N 秒隨機延遲 (預設 60)")
+    p.add_argument("--health-file", default=DEFAULT_HEALTH_FILE, help="健康狀態與指標檔路徑")
+    p.add_argument("--once", action="store_true", help="每個工作各執行一次後結束 (供測試或 cron 使用)")
+    p.set_defaults(handler=run_daemon)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    config = load_settings(args.config)
+    if args.rate:
+        from rate_limiter import notion_limiter
+        notion_limiter.rate = args.rate
+
+    run_metrics.start_run(args.command, live=config_flag(config, "METRICS_LIVE"))
+    try:
+        ok = args.handler(args, config)
+    finally:
+        metrics_path = run_metrics.finish_run(args.metrics_dir or config.get("METRICS_DIR")
+                                              or run_metrics.DEFAULT_METRICS_DIR)
+        print("\n" + run_metrics.current_run().summary_line())
+        if metrics_path:
+            print(f"📈 本次執行指標已輸出至 {metrics_path}")
+    # 因任務鎖而跳過 (None) 不視為失敗，避免 cron 誤報
+    return 0 if ok is not False else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
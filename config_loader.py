@@ -0,0 +1,47 @@
+"""設定檔讀取：不依賴任何爬蟲或 Notion 模組，讓只需要設定的路徑可以快速啟動。"""
+import os
+
+# 環境變數覆寫 config.txt 時使用的前綴，例如 NOTION_AUTO_NOTION_KEY
+ENV_PREFIX = "NOTION_AUTO_"
+CONFIG_KEYS = [
+    "NOTION_KEY", "PARENT_PAGE_ID", "LOGIN_URL", "USERNAME", "PASSWORD",
+    "COURSE_DATABASE_ID", "TASK_DATABASE_ID", "NOTE_DATABASE_ID",
+    "FETCH_MODE", "PARSER_BACKEND", "EXCLUDE_DATES", "PERIOD_TIMES", "PERIOD_FIRST_START", "PERIOD_MINUTES", "CLASS_MINUTES",
+    "REMINDER_WINDOW_DAYS", "REMINDER_MINUTES_BEFORE", "USE_NOTION_CACHE", "NOTION_CACHE_PATH", "NOTION_CACHE_FULL_REFRESH_HOURS",
+    "SCHEDULE_CACHE_TTL_MINUTES",
+    "METRICS_DIR", "METRICS_LIVE", "NOTE_TEMPLATE_PATH", "AUTO_ADD_SELECT_OPTIONS",
+]
+
+_TRUTHY = ("1", "true", "yes", "y")
+
+
+def read_config(filename='config.txt'):
+    """從設定檔讀取設定，並回傳一個字典。"""
+    config = {}
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            for line in f:
+                if '=' in line and not line.strip().startswith('#'):
+                    key, value = line.strip().split('=', 1)
+                    config[key.strip()] = value.strip()
+        return config
+    except FileNotFoundError:
+        print(f"❌ 錯誤：找不到設定檔 {filename}。")
+        return None
+
+
+def load_settings(config_path="config.txt"):
+    """讀取 config.txt (不存在時視為空白) 並以 NOTION_AUTO_* 環境變數覆寫。"""
+    config = (read_config(config_path) if os.path.exists(config_path) else None) or {}
+    for key in CONFIG_KEYS:
+        value = os.environ.get(ENV_PREFIX + key)
+        if value is not None:
+            config[key] = value
+    config["CONFIG_PATH"] = config_path
+    return config
+
+
+def config_flag(config, key, default=False):
+    """將 true/yes/1 之類的設定值視為開啟；未設定時回傳 default。"""
+    value = (config.get(key) or "").strip().lower()
+    return value in _TRUTHY if value else default
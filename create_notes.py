@@ -1,84 +1,180 @@
 import requests
-import json
-import time
+import run_metrics
+from checkpoint_journal import CheckpointJournal, journal_path
+from notion_api import get_client
+from notion_schema import check_payload_schema
+from note_template import note_template_values
+from notion_uploader import DEFAULT_MAX_WORKERS, run_streaming
 
-def create_weekly_notes_for_semester(api_key, course_db_id, notes_db_id, semester_name):
+def fetch_noted_course_page_ids(client, notes_db_id, semester_name):
+    """一次分頁查詢該學期的所有筆記，回傳已有筆記關聯到的課程頁面 ID 集合 (不含連字號)。"""
+    noted = set()
+    query = {"filter": {"property": "學期", "select": {"equals": semester_name}}}
+    for note in client.query_database(notes_db_id, query):
+        relation = (note.get("properties", {}).get("關聯到課程") or {}).get("relation") or []
+        noted.update(item["id"].replace('-', '') for item in relation)
+    return noted
+
+def build_note_payload(course_page, notes_db_id, semester_name):
+    """由課程頁面組出筆記頁面的建立請求；缺少必要屬性時拋出 KeyError/IndexError。"""
+    course_name = course_page["properties"]["課程名稱"]["title"][0]["text"]["content"]
+    week_num = course_page["properties"]["週次"]["number"]
+    course_date_obj = course_page["properties"]["課程日期與提醒"]["date"]
+
+    note_title = f"{course_name} - 課堂筆記"
+    return {
+        "parent": {"database_id": notes_db_id},
+        "properties": {
+            "筆記標題": {"title": [{"text": {"content": note_title}}]},
+            "關聯到課程": {"relation": [{"id": course_page["id"]}]},
+            "學期": {"select": {"name": semester_name}},
+            "週次": {"number": week_num},
+            "上課日期": {"date": {"start": course_date_obj["start"] if course_date_obj else None}},
+            "分類": {"select": {"name": "課堂筆記"}}
+        }
+    }
+
+def _append_note_body(client, page_id, bodies, note_title):
+    """將範本超過 100 個區塊的部分分批附加到筆記頁面，全部成功回傳 True。"""
+    for body in bodies:
+        try:
+            response = client.patch(f"/v1/blocks/{page_id}/children", data=body)
+        except requests.exceptions.RequestException as e:
+            print(f"     ⚠️  筆記 '{note_title}' 附加內容時發生網路錯誤: {e}")
+            return False
+        if response.status_code != 200:
+            print(f"     ⚠️  筆記 '{note_title}' 附加內容失敗: {response.text}")
+            return False
+        run_metrics.incr("notes.body_appends")
+    return True
+
+def sample_note_properties(notes_db_id, semester_name):
+    """組出一份代表性的筆記 properties，供寫入前的 schema 檢查使用 (各筆記只有值不同)。"""
+    sample_page = {"id": "0" * 32, "properties": {"課程名稱": {"title": [{"text": {"content": ""}}]},
+                                                  "週次": {"number": 1}, "課程日期與提醒": {"date": None}}}
+    return build_note_payload(sample_page, notes_db_id, semester_name)["properties"]
+
+def create_note_for_course_page(client, course_page, notes_db_id, semester_name, cache, journal, template=None):
+    """為單一課程頁面建立筆記並寫入檢查點日誌，回傳 "created"、"failed" 或 "skipped"。
+
+    傳入 NoteTemplate 時，筆記內容的前 100 個區塊隨建立請求一併送出，其餘分批附加。
+    """
+    course_page_id = course_page["id"]
+    try:
+        payload = build_note_payload(course_page, notes_db_id, semester_name)
+        values = None
+        if template is not None:
+            values = note_template_values(course_page, semester_name, payload["properties"]["週次"]["number"],
+                                          payload["properties"]["上課日期"]["date"]["start"])
+    except (KeyError, IndexError, TypeError) as e:
+        run_metrics.incr("notes.skipped")
+        print(f"     ⚠️  處理課程頁面 {course_page_id} 時缺少必要屬性 ({e})，已跳過。")
+        return "skipped"
+
+    note_title = payload["properties"]["筆記標題"]["title"][0]["text"]["content"]
+    week_num = payload["properties"]["週次"]["number"]
+    try:
+        if template is None:
+            create_response = client.post("/v1/pages", payload)
+        else:
+            create_response = client.post("/v1/pages", data=template.render_create_body(payload, values))
+    except requests.exceptions.RequestException as e:
+        run_metrics.incr("notes.failed")
+        journal.record_failure((course_page_id,), str(e))
+        print(f"     ❌ 建立筆記 '{note_title}' (第{week_num}週) 時發生網路錯誤: {e}")
+        return "failed"
+
+    if create_response.status_code == 200:
+        note_page_id = create_response.json().get("id")
+        if template is not None and template.append_requests:
+            if not _append_note_body(client, note_page_id, template.render_append_bodies(values), note_title):
+                # 頁面已建立，只是內容不完整；仍記為完成以免重複建立筆記
+                run_metrics.incr("notes.body_incomplete")
+        print(f"     ✅ 已建立筆記: {note_title} (第{week_num}週)")
+        run_metrics.incr("notes.created")
+        journal.record_done((course_page_id,), note_page_id)
+        if cache is not None:
+            cache.upsert_page(notes_db_id, create_response.json())
+        return "created"
+    run_metrics.incr("notes.failed")
+    journal.record_failure((course_page_id,), f"HTTP {create_response.status_code}")
+    print(f"     ❌ 建立筆記 '{note_title}' (第{week_num}週) 失敗: {create_response.text}")
+    return "failed"
+
+@run_metrics.timed("notes.total")
+def create_weekly_notes_for_semester(api_key, course_db_id, notes_db_id, semester_name, cache=None, resume=False,
+                                     max_workers=DEFAULT_MAX_WORKERS, template=None, add_missing_options=True):
     """
     為指定學期的所有課程，批次建立每週的筆記頁面。
-    此版本已修復100筆資料限制，並會填入新欄位。
+    課程查詢以分頁串流，每取得一頁就交給筆記建立的執行緒池，查詢與寫入同時進行；
+    已有筆記的週次以一次筆記資料庫查詢批次找出並跳過。
+    若傳入 NotionCache，會增量更新本地鏡像，只為尚未有筆記的週次建立筆記。
+    resume=True 時依檢查點日誌跳過上次已建立筆記的課程頁面。
+    傳入 NoteTemplate 時每則筆記都帶有範本內容，範本只序列化一次並在所有筆記間共用。
+    寫入前先以快取的資料庫結構在本地驗證筆記 payload，不符時直接停止。
     """
     print(f"\n▶️  create_notes: 開始為「{semester_name}」學期建立筆記...")
-    
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json", "Notion-Version": "2022-06-28"}
-    
-    # 處理分頁 (Pagination)，確保抓取所有課程
-    all_course_pages = []
-    start_cursor = None
-    while True:
-        print(f"   正在查詢課程資料庫 (已取得 {len(all_course_pages)} 筆)...")
-        query_url = f"https://api.notion.com/v1/databases/{course_db_id}/query"
-        payload = {"filter": {"property": "學期", "select": {"equals": semester_name}}}
-        if start_cursor:
-            payload["start_cursor"] = start_cursor
-            
-        try:
-            response = requests.post(query_url, headers=headers, data=json.dumps(payload))
-            response.raise_for_status()
-            data = response.json()
-            
-            all_course_pages.extend(data.get("results", []))
-            
-            if data.get("has_more"):
-                start_cursor = data.get("next_cursor")
-            else:
-                break # 如果沒有下一頁了，就跳出迴圈
-        except requests.exceptions.RequestException as e:
-            print(f"❌ 查詢課程時發生錯誤: {e.response.text}")
-            return False
-    
-    if not all_course_pages:
+
+    client = get_client(api_key)
+    if not check_payload_schema(client, notes_db_id, [sample_note_properties(notes_db_id, semester_name)],
+                                add_missing_options, label="筆記資料庫"):
+        return False
+
+    journal = CheckpointJournal(journal_path("notes", notes_db_id, semester_name))
+    if resume:
+        print(f"   🔁 續傳模式：檢查點日誌中已有 {journal.load()} 堂課建立過筆記。")
+    else:
+        journal.reset()
+
+    noted = set()
+    try:
+        if cache is not None:
+            print("   正在增量更新本地課程與筆記鏡像...")
+            updated = cache.refresh(client, course_db_id) + cache.refresh(client, notes_db_id)
+            print(f"   本地鏡像已更新 {updated} 個頁面。")
+            course_pages = cache.course_weeks_lacking_notes(course_db_id, notes_db_id, semester_name)
+        else:
+            print("   正在查詢已存在的筆記...")
+            noted = fetch_noted_course_page_ids(client, notes_db_id, semester_name)
+            print(f"   已有 {len(noted)} 堂課建立過筆記，將邊查詢課程邊建立其餘筆記...")
+            course_query = {"filter": {"property": "學期", "select": {"equals": semester_name}}}
+            course_pages = client.query_database(course_db_id, course_query)
+    except requests.exceptions.RequestException as e:
+        print(f"❌ 查詢課程或筆記時發生錯誤: {e}")
+        return False
+
+    seen = {"total": 0, "existing": 0}
+
+    def pages_needing_notes():
+        for course_page in course_pages:
+            seen["total"] += 1
+            if course_page["id"].replace('-', '') in noted or journal.is_completed((course_page["id"],)):
+                seen["existing"] += 1
+                continue
+            yield course_page
+
+    try:
+        with journal:
+            results, elapsed = run_streaming(
+                lambda page: create_note_for_course_page(client, page, notes_db_id, semester_name, cache, journal,
+                                                         template),
+                pages_needing_notes(), max_workers)
+    except requests.exceptions.RequestException as e:
+        print(f"❌ 查詢課程時發生錯誤: {e}")
+        return False
+    run_metrics.observe("notes.write_phase", elapsed)
+    if not results.count("failed"):
+        # 全部成功時刪除日誌，下次執行不會被誤認為中斷的批次
+        journal.finish()
+
+    if not seen["total"]:
         print(f"   ℹ️  在「課程總資料庫」中找不到任何標記為「{semester_name}」的課程。")
         return True
 
-    print(f"   查詢完畢，共找到 {len(all_course_pages)} 堂課，準備逐一建立筆記...")
-
-    total_notes_created = 0
-    for course_page in all_course_pages:
-        course_page_id = course_page["id"]
-        
-        try:
-            course_name = course_page["properties"]["課程名稱"]["title"][0]["text"]["content"]
-            week_num = course_page["properties"]["週次"]["number"]
-            course_date_obj = course_page["properties"]["課程日期與提醒"]["date"]
-            
-            note_title = f"{course_name} - 課堂筆記"
-            
-            new_note_payload = {
-                "parent": {"database_id": notes_db_id},
-                "properties": {
-                    "筆記標題": {"title": [{"text": {"content": note_title}}]},
-                    "關聯到課程": {"relation": [{"id": course_page_id}]},
-                    "學期": {"select": {"name": semester_name}},
-                    "週次": {"number": week_num},
-                    "上課日期": {"date": {"start": course_date_obj["start"] if course_date_obj else None}},
-                    "分類": {"select": {"name": "課堂筆記"}}
-                }
-            }
-
-            create_url = "https://api.notion.com/v1/pages"
-            create_response = requests.post(create_url, headers=headers, data=json.dumps(new_note_payload, ensure_ascii=False).encode('utf-8'))
-            
-            if create_response.status_code == 200:
-                print(f"     ✅ 已建立筆記: {note_title} (第{week_num}週)")
-                total_notes_created += 1
-            else:
-                print(f"     ❌ 建立筆記 '{note_title}' (第{week_num}週) 失敗: {create_response.text}")
-            
-            time.sleep(0.4)
-
-        except (KeyError, IndexError) as e:
-            print(f"     ⚠️  處理課程頁面 {course_page_id} 時缺少必要屬性 ({e})，已跳過。")
-            continue
-
-    print(f"\n✅ create_notes: 任務完成，共成功建立了 {total_notes_created} 則筆記。")
-    return True
\ No newline at end of file
+    total_notes_created = results.count("created")
+    print(f"\n✅ create_notes: 任務完成，共 {seen['total']} 堂課，已有筆記跳過 {seen['existing']} 堂，"
+          f"成功建立了 {total_notes_created} 則筆記。")
+    print(f"   ⏱️  查詢與寫入共耗時 {elapsed:.1f} 秒。")
+    if results.count("failed"):
+        print(f"   ⚠️  有 {results.count('failed')} 則筆記建立失敗，可以續傳模式重新執行。")
+    return True
@@ -0,0 +1,247 @@
+"""試算模式：只讀取 Notion 現況，計算實際執行時會送出的請求數、payload 大小與預估耗時，不做任何寫入。"""
+import json
+from datetime import datetime, timedelta
+
+import requests
+
+import run_metrics
+from checkpoint_journal import CheckpointJournal, journal_path
+from notion_api import RequestCounter, get_client, property_value
+from notion_schema import get_database_schema, validate_properties
+from notion_uploader import (DEFAULT_MAX_WORKERS, CoursePayloadTemplate, build_course_page_properties,
+                             course_page_key, fetch_existing_course_pages, iter_course_occurrences, iter_course_slots,
+                             plan_semester_sync)
+
+WRITE_KINDS = ("create", "update", "archive", "append", "schema")
+
+
+def _payload_bytes(payload):
+    # 與 NotionClient 送出時相同的編碼方式
+    if isinstance(payload, bytes):
+        return len(payload)
+    return len(json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+
+
+class RequestPlan:
+    """累計一個任務會送出的讀取與寫入請求 (依課程分類)、payload 位元組數與略過的項目。"""
+
+    def __init__(self, task, client):
+        self.task = task
+        self.client = client
+        self.writes = dict.fromkeys(WRITE_KINDS, 0)
+        self.skipped = 0
+        self.payload_bytes = 0
+        self.per_course = {}
+        self.errors = []
+        self.reads = RequestCounter()
+
+    def reading(self):
+        """試算函式以 with plan.reading(): 包住查詢，只計入這份試算自己送出的讀取請求。"""
+        return self.client.counting(self.reads)
+
+    def _course(self, course_code):
+        return self.per_course.setdefault(course_code, dict.fromkeys(WRITE_KINDS + ("skip",), 0))
+
+    def write(self, kind, payload, course_code=None):
+        self.writes[kind] += 1
+        self.payload_bytes += _payload_bytes(payload)
+        if course_code is not None:
+            self._course(course_code)[kind] += 1
+
+    def skip(self, course_code=None, count=1):
+        self.skipped += count
+        if course_code is not None:
+            self._course(course_code)["skip"] += count
+
+    def check_schema(self, database_id, properties_list, add_missing_options=True):
+        """與實際執行相同的 schema 檢查：讀取結構 (計為讀取)，缺少的選項計為一次 schema PATCH。"""
+        errors, missing_options = validate_properties(get_database_schema(self.client, database_id), properties_list)
+        self.errors += errors
+        if missing_options:
+            if add_missing_options:
+                self.write("schema", {"properties": {name: {"select": {"options": [{"name": o} for o in options]}}
+                                                     for name, options in missing_options.items()}})
+            else:
+                self.errors += [f"屬性「{name}」沒有選項: {', '.join(options)}" for name, options in missing_options.items()]
+
+    def report(self, max_workers=DEFAULT_MAX_WORKERS):
+        """回傳試算結果字典；預估耗時取限速與「讀取時量到的延遲 ÷ 併發數」兩者中較慢者。"""
+        reads = self.reads.count
+        total = reads + sum(self.writes.values())
+        rate = self.client.limiter.rate if self.client.limiter is not None else float("inf")
+        eta = max(total / rate, total * self.reads.p50 / max_workers)
+        return {"task": self.task, "reads": reads, "writes": dict(self.writes), "write_total": sum(self.writes.values()),
+                "skipped": self.skipped, "requests": total, "payload_bytes": self.payload_bytes,
+                "eta_s": round(eta, 1), "rate": rate, "per_course": self.per_course, "errors": self.errors}
+
+    def print_report(self, max_workers=DEFAULT_MAX_WORKERS):
+        report = self.report(max_workers)
+        writes = report["writes"]
+        print(f"\n📋 試算結果 ({self.task})：未送出任何寫入。")
+        if report["per_course"]:
+            print(f"   {'課程代碼':<14}{'建立':>6}{'更新':>6}{'封存':>6}{'附加':>6}{'略過':>6}")
+            for code, counts in sorted(report["per_course"].items()):
+                print(f"   {code:<14}{counts['create']:>6}{counts['update']:>6}{counts['archive']:>6}"
+                      f"{counts['append']:>6}{counts['skip']:>6}")
+        print(f"   讀取 {report['reads']} 次，寫入 {report['write_total']} 次 (建立 {writes['create']}、更新 {writes['update']}、"
+              f"封存 {writes['archive']}、附加 {writes['append']}、schema {writes['schema']})，略過 {report['skipped']} 項。")
+        print(f"   寫入 payload 共 {report['payload_bytes'] / 1024:.1f} KB。")
+        print(f"   ⏱️  預估耗時約 {report['eta_s']:.1f} 秒 (共 {report['requests']} 次請求，限速 {report['rate']:g} 次/秒)。")
+        for problem in report["errors"]:
+            print(f"   ❌ {problem}")
+        return report
+
+
+def _note_requests(plan, notes_db_id, semester_name, course_code, course_name, week_num, date_start, template):
+    """試算一則筆記的建立與附加請求。"""
+    from create_notes import sample_note_properties
+    properties = sample_note_properties(notes_db_id, semester_name)
+    properties["筆記標題"]["title"][0]["text"]["content"] = f"{course_name} - 課堂筆記"
+    properties["週次"]["number"] = week_num
+    properties["上課日期"]["date"]["start"] = date_start
+    payload = {"parent": {"database_id": notes_db_id}, "properties": properties}
+    if template is None:
+        plan.write("create", payload, course_code)
+        return
+    values = {"course_name": course_name, "course_page_id": "0" * 32, "course_url": "", "semester": semester_name,
+              "week": week_num, "date": (date_start or "")[:10]}
+    plan.write("create", template.render_create_body(payload, values), course_code)
+    for body in template.render_append_bodies(values):
+        plan.write("append", body, course_code)
+
+
+@run_metrics.timed("dry_run.semester")
+def plan_semester_task(api_key, database_id, courses_data, semester_name, mode="sync", resume=False, only_codes=None,
+                       notes_db_id=None, note_template=None, reminder_window_days=None, reminder_minutes=None,
+                       add_missing_options=True):
+    """試算學期性任務 (sync/upload/fused) 會送出的請求，回傳 RequestPlan；查詢失敗時回傳 None。"""
+    client = get_client(api_key)
+    plan = RequestPlan(f"學期課表 {semester_name} ({mode})", client)
+    try:
+        with plan.reading():
+            if mode == "sync":
+                if only_codes is not None:
+                    if not only_codes:
+                        return plan
+                    courses_data = [course for course in courses_data if course.get("課程代碼", "") in only_codes]
+                properties = [build_course_page_properties(course, semester_name, week_num, date_info)
+                              for course in courses_data for week_num, date_info in iter_course_occurrences(course)]
+                plan.check_schema(database_id, properties, add_missing_options)
+                existing, duplicates = fetch_existing_course_pages(client, database_id, semester_name, only_codes)
+                sync_plan = plan_semester_sync(existing, duplicates, courses_data, semester_name)
+                for key, props in sync_plan["create"]:
+                    plan.write("create", {"parent": {"database_id": database_id}, "properties": props}, key[0])
+                for _, key, props in sync_plan["update"]:
+                    plan.write("update", {"properties": props}, key[0])
+                for _, key in sync_plan["archive"]:
+                    plan.write("archive", {"archived": True}, key[0])
+                plan.skip(count=sync_plan["unchanged"])
+                return plan
+
+            journal = CheckpointJournal(journal_path("upload", database_id, semester_name))
+            notes_journal = (CheckpointJournal(journal_path("notes", notes_db_id, semester_name))
+                             if notes_db_id else None)
+            if resume:
+                journal.load()
+                if notes_journal is not None:
+                    notes_journal.load()
+            reminder = None
+            if reminder_window_days:
+                from add_reminders import build_reminder, DEFAULT_REMINDER_MINUTES
+                reminder = build_reminder(reminder_minutes or DEFAULT_REMINDER_MINUTES)
+                window_start = datetime.now()
+                window_end = window_start + timedelta(days=reminder_window_days)
+
+            payloads = []
+            for course in courses_data:
+                code, course_name = course.get("課程代碼", ""), course.get("課程名稱", "無標題課程")
+                template = None
+                for week_num, start_iso, end_iso in iter_course_slots(course):
+                    page_id = journal.completed_page_id(course_page_key(course, week_num))
+                    note_done = notes_journal is None or (page_id is not None
+                                                          and notes_journal.is_completed((page_id,)))
+                    if page_id is not None and note_done:
+                        plan.skip(code)
+                        continue
+                    if template is None:
+                        # 與實際上傳相同：每門課一份 schema 樣本，payload 以預先序列化的範本產生
+                        template = CoursePayloadTemplate(course, semester_name, database_id, reminder)
+                        payloads.append(build_course_page_properties(course, semester_name, week_num,
+                                                                     {"start": start_iso, "end": end_iso}))
+                    with_reminder = (reminder is not None and
+                                     window_start <= datetime.fromisoformat(start_iso[:19]) <= window_end)
+                    if page_id is None:
+                        plan.write("create", template.render(week_num, start_iso, end_iso, with_reminder), code)
+                    if notes_journal is not None:
+                        _note_requests(plan, notes_db_id, semester_name, code, course_name, week_num,
+                                       start_iso, note_template)
+            plan.check_schema(database_id, payloads, add_missing_options)
+            if notes_db_id and payloads:
+                from create_notes import sample_note_properties
+                plan.check_schema(notes_db_id, [sample_note_properties(notes_db_id, semester_name)],
+                                  add_missing_options)
+    except requests.exceptions.RequestException as e:
+        print(f"❌ 試算時查詢 Notion 現況失敗: {e}")
+        return None
+    return plan
+
+
+@run_metrics.timed("dry_run.notes")
+def plan_note_task(api_key, course_db_id, notes_db_id, semester_name, resume=False, template=None,
+                   add_missing_options=True):
+    """試算筆記建立任務會送出的請求，回傳 RequestPlan；查詢失敗時回傳 None。"""
+    from create_notes import fetch_noted_course_page_ids, sample_note_properties
+    client = get_client(api_key)
+    plan = RequestPlan(f"課堂筆記 {semester_name}", client)
+    journal = CheckpointJournal(journal_path("notes", notes_db_id, semester_name))
+    if resume:
+        journal.load()
+    try:
+        with plan.reading():
+            plan.check_schema(notes_db_id, [sample_note_properties(notes_db_id, semester_name)], add_missing_options)
+            noted = fetch_noted_course_page_ids(client, notes_db_id, semester_name)
+            course_query = {"filter": {"property": "學期", "select": {"equals": semester_name}}}
+            for page in client.query_database(course_db_id, course_query):
+                props = page.get("properties", {})
+                code = property_value(props.get("課程代碼"))
+                if page["id"].replace('-', '') in noted or (resume and journal.is_completed((page["id"],))):
+                    plan.skip(code)
+                    continue
+                try:
+                    course_name = props["課程名稱"]["title"][0]["text"]["content"]
+                    week_num = props["週次"]["number"]
+                    date_start = (props["課程日期與提醒"]["date"] or {}).get("start")
+                except (KeyError, IndexError, TypeError):
+                    plan.skip(code)
+                    continue
+                _note_requests(plan, notes_db_id, semester_name, code, course_name, week_num, date_start, template)
+    except requests.exceptions.RequestException as e:
+        print(f"❌ 試算時查詢 Notion 現況失敗: {e}")
+        return None
+    return plan
+
+
+@run_metrics.timed("dry_run.reminders")
+def plan_reminder_task(api_key, database_id, window_days, reminder_minutes):
+    """試算提醒任務會送出的請求，回傳 RequestPlan；查詢失敗時回傳 None。"""
+    from add_reminders import build_reminder, _stream_pages_in_window
+    client = get_client(api_key)
+    plan = RequestPlan(f"近期提醒 (未來 {window_days} 天)", client)
+    reminder = build_reminder(reminder_minutes)
+    window_start = datetime.now()
+    try:
+        with plan.reading():
+            window_end = window_start + timedelta(days=window_days)
+            for page in _stream_pages_in_window(client, database_id, window_start, window_end):
+                props = page.get("properties", {})
+                code = property_value(props.get("課程代碼"))
+                date = (props.get("課程日期與提醒") or {}).get("date")
+                if not date or date.get("reminder"):
+                    plan.skip(code)
+                    continue
+                payload = {"properties": {"課程日期與提醒": {"date": dict(date, reminder=reminder)}}}
+                plan.write("update", payload, code)
+    except requests.exceptions.RequestException as e:
+        print(f"❌ 試算時查詢 Notion 現況失敗: {e}")
+        return None
+    return plan
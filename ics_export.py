@@ -0,0 +1,156 @@
+"""將處理好的課程資料直接輸出成 RFC 5545 行事曆檔 (.ics)，完全不需呼叫 Notion API。
+
+每門課輸出一個 VEVENT：以 RRULE:FREQ=WEEKLY 表示每週重複、EXDATE 表示停課週，
+並以 VALARM 提供與 Notion 提醒相同的課前提醒。
+"""
+import os
+from datetime import datetime, timedelta, timezone
+
+import run_metrics
+
+ICS_TIMEZONE = "Asia/Taipei"
+ICS_UTC_OFFSET = timedelta(hours=8)
+PRODID = "-//notion-auto//course schedule//ZH-TW"
+DEFAULT_REMINDER_MINUTES = 20
+
+# 台北無日光節約時間，一個 STANDARD 區段即可完整描述
+_VTIMEZONE = [
+    "BEGIN:VTIMEZONE",
+    f"TZID:{ICS_TIMEZONE}",
+    "BEGIN:STANDARD",
+    "DTSTART:19700101T000000",
+    "TZOFFSETFROM:+0800",
+    "TZOFFSETTO:+0800",
+    "TZNAME:CST",
+    "END:STANDARD",
+    "END:VTIMEZONE",
+]
+
+
+def ics_path(output_dir, semester_start):
+    return os.path.join(output_dir, f"{semester_start}_course_schedule.ics")
+
+
+def _escape(text):
+    """TEXT 值的跳脫：反斜線、分號、逗號與換行。"""
+    return (str(text or "").replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def _fold(line):
+    """每行最多 75 個位元組，超過時折行 (不會切斷 UTF-8 多位元組字元)。"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return [line]
+    lines, current, size, limit = [], [], 0, 75
+    for ch in line:
+        width = len(ch.encode('utf-8'))
+        if size + width > limit:
+            lines.append("".join(current))
+            current, size, limit = [], 0, 74  # 續行開頭的空白佔一個位元組
+        current.append(ch)
+        size += width
+    lines.append("".join(current))
+    return [lines[0]] + [" " + part for part in lines[1:]]
+
+
+def _local(iso_text):
+    return datetime.fromisoformat(iso_text[:19])
+
+
+def _format_local(moment):
+    return moment.strftime("%Y%m%dT%H%M%S")
+
+
+def _format_utc(moment):
+    return (moment - ICS_UTC_OFFSET).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _reminder_trigger(minutes):
+    if minutes % 1440 == 0:
+        return f"-P{minutes // 1440}D"
+    if minutes % 60 == 0:
+        return f"-PT{minutes // 60}H"
+    return f"-PT{minutes}M"
+
+
+def course_to_vevent(course, semester_name, reminder_minutes=DEFAULT_REMINDER_MINUTES, dtstamp=None):
+    """將一門課轉成 VEVENT 的各行 (未折行)；沒有任何上課日的課程回傳空列表。"""
+    occurrences = sorted(course.get("重複日期列表", []), key=lambda d: d["start"])
+    if not occurrences:
+        return []
+    first_start, first_end = _local(occurrences[0]["start"]), _local(occurrences[0]["end"])
+    last_start = _local(occurrences[-1]["start"])
+
+    # 從第一次到最後一次上課之間，每週應有的日期中沒出現的就是停課日
+    held = {_local(d["start"]) for d in occurrences}
+    excluded = []
+    moment = first_start
+    while moment <= last_start:
+        if moment not in held:
+            excluded.append(moment)
+        moment += timedelta(days=7)
+
+    code = course.get("課程代碼", "")
+    description = "\n".join(f"{label}: {course.get(key)}" for label, key in
+                            (("課程代碼", "課程代碼"), ("授課教師", "授課教師"), ("必選修", "必選修"), ("學分", "學分"))
+                            if course.get(key))
+    uid = "".join(ch if ch.isalnum() or ch in "-_" else "-" for ch in f"{code}-{semester_name}-{first_start:%a%H%M}")
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{uid}@notion-auto",
+        f"DTSTAMP:{dtstamp or datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}",
+        f"DTSTART;TZID={ICS_TIMEZONE}:{_format_local(first_start)}",
+        f"DTEND;TZID={ICS_TIMEZONE}:{_format_local(first_end)}",
+    ]
+    if len(occurrences) > 1:
+        lines.append(f"RRULE:FREQ=WEEKLY;UNTIL={_format_utc(last_start)}")
+    if excluded:
+        lines.append(f"EXDATE;TZID={ICS_TIMEZONE}:{','.join(_format_local(m) for m in excluded)}")
+    lines += [
+        f"SUMMARY:{_escape(course.get('課程名稱', '無標題課程'))}",
+        f"LOCATION:{_escape(course.get('上課教室', ''))}",
+        f"DESCRIPTION:{_escape(description)}",
+        f"CATEGORIES:{_escape(semester_name)}",
+    ]
+    if reminder_minutes:
+        lines += ["BEGIN:VALARM", "ACTION:DISPLAY", f"TRIGGER:{_reminder_trigger(reminder_minutes)}",
+                  f"DESCRIPTION:{_escape(course.get('課程名稱', '上課提醒'))}", "END:VALARM"]
+    lines.append("END:VEVENT")
+    return lines
+
+
+def build_calendar(courses_data, semester_name, reminder_minutes=DEFAULT_REMINDER_MINUTES):
+    """組出整份 .ics 內容 (CRLF 換行、已折行)，回傳 (文字, VEVENT 數)。"""
+    dtstamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", f"PRODID:{PRODID}", "CALSCALE:GREGORIAN",
+             f"X-WR-CALNAME:{_escape(semester_name + ' 課表')}", f"X-WR-TIMEZONE:{ICS_TIMEZONE}"] + _VTIMEZONE
+    events = 0
+    for course in courses_data:
+        vevent = course_to_vevent(course, semester_name, reminder_minutes, dtstamp)
+        if vevent:
+            lines += vevent
+            events += 1
+    lines.append("END:VCALENDAR")
+    return "".join(folded + "\r\n" for line in lines for folded in _fold(line)), events
+
+
+@run_metrics.timed("ics.export")
+def export_courses_to_ics(courses_data, semester_name, semester_start, output_dir="course_schedule",
+                          reminder_minutes=DEFAULT_REMINDER_MINUTES):
+    """將課程寫成與課表 CSV 同目錄的 .ics 檔，成功時回傳檔案路徑，失敗時回傳 None。"""
+    text, events = build_calendar(courses_data, semester_name, reminder_minutes)
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    path = ics_path(output_dir, semester_start)
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"❌ 寫入行事曆檔時發生錯誤: {e}")
+        return None
+    run_metrics.incr("ics.events", events)
+    print(f"✅ ics_export: 已將 {events} 門課 (每週重複、含課前 {reminder_minutes} 分鐘提醒) 輸出至 {path}")
+    return path
@@ -1,14 +1,11 @@
 import time
 from datetime import datetime
-from web_scraper import read_config
-from setup_databases import setup_all_databases
+import run_metrics
+from config_loader import read_config, config_flag
 
+@run_metrics.timed("task.semester")
 def run_semester_task(config):
-    """執行每學期一次的抓取與上傳任務，並回報結果。"""
-    from web_scraper import login_and_get_page_source
-    from process_courses import process_source_and_create_files
-    from notion_uploader import upload_courses_to_notion
-
+    """互動式詢問新學期資訊後，執行每學期一次的抓取與上傳任務，並回報結果。"""
     print("\n--- 您選擇了【學期性功能】 ---")
     
     print("▶️  請依序輸入新學期的資訊...")
@@ -19,6 +16,31 @@ def run_semester_task(config):
 
     start_date_str = input(f"   - 「{semester_name}」的開始日期 (格式YYYY-MM-DD): ").strip()
     end_date_str = input(f"   - 「{semester_name}」的結束日期 (格式YYYY-MM-DD): ").strip()
+    
+    sync_choice = input("   - 若此學期已上傳過，是否以同步模式只更新差異？(Y/n): ").strip().lower()
+    mode = "sync" if sync_choice != 'n' else "upload"
+    resume = False
+    if mode == "upload":
+        resume = _ask_resume("upload", config.get("COURSE_DATABASE_ID") or "", semester_name)
+        if config.get("NOTE_DATABASE_ID"):
+            fused_choice = input("   - 是否在建立課程頁面的同時建立筆記並加上近期提醒 (融合模式，省去任務3與4)？(Y/n): ").strip().lower()
+            if fused_choice != 'n':
+                mode = "fused"
+
+    return execute_semester_task(config, semester_name, start_date_str, end_date_str, mode, resume)
+
+def execute_semester_task(config, semester_name, start_date_str, end_date_str, mode="sync", resume=False,
+                          force=False, dry_run=False):
+    """不需互動的學期性任務：抓取 → 處理 → 上傳。
+
+    mode 為 "sync" (只同步差異)、"upload" (全部建立)、"fused" (建立時一併建立筆記與近期提醒)
+    或 "ics" (只在課表 CSV 旁輸出 .ics 行事曆檔，不呼叫 Notion API，也不需要 Notion 設定)。
+    課表與設定都和上次成功上傳時相同時會跳過處理與上傳；在 SCHEDULE_CACHE_TTL_MINUTES 內重跑
+    則連登入都省略。sync 模式下若上次成功上傳的課表 CSV 快照仍在，只同步新增、退選或異動的課程。
+    force=True 時忽略快取與快照。dry_run=True 時照常抓取與處理，但只讀取 Notion 現況並印出
+    試算的請求數、payload 大小與預估耗時，不寫入 Notion、CSV 或快取。
+    """
+    from process_courses import configure_schedule
 
     try:
         datetime.strptime(start_date_str, "%Y-%m-%d")
@@ -26,83 +48,287 @@ def run_semester_task(config):
     except ValueError:
         print("❌ 日期格式錯誤，應為YYYY-MM-DD。任務中止。")
         return False
-    
+    try:
+        configure_schedule(config)
+    except ValueError as e:
+        print(f"❌ config.txt 中的作息或停課日設定格式錯誤: {e}")
+        return False
+
     print(f"ℹ️  好的，將為「{semester_name}」學期 ({start_date_str} 至 {end_date_str}) 進行排程...")
-    
+    result = run_semester_pipeline(config, semester_name, start_date_str, end_date_str, mode, resume, force, dry_run)
+    return result["success"]
+
+def run_semester_pipeline(config, semester_name, start_date_str, end_date_str, mode="sync", resume=False,
+                          force=False, dry_run=False, output_dir="course_schedule"):
+    """學期性任務的共用流程 (execute_semester_task 與 batch_runner.run_account 都呼叫它)。
+
+    作息表須已由呼叫端以 configure_schedule 套用。CSV、快照、.ics 與課表快取都放在 output_dir。
+    回傳結果字典：success、stage ("cached"、"planned"、"done" 或失敗時所在的階段)、error、
+    timings (fetch/process/upload 秒數)，以及視情況附上的 changes (課表變動數)、plan (試算結果)、ics_path。
+    """
+    import os
+    from web_scraper import fetch_with_retries
+    import process_courses
+    from process_courses import (process_source_and_create_files, parse_exclusion_dates, extract_grid_rows,
+                                 snapshot_path, load_schedule_snapshot, snapshot_rows, diff_course_schedules,
+                                 affected_course_codes, print_schedule_diff)
+    from notion_uploader import upload_courses_to_notion, sync_courses_to_notion
+    from schedule_cache import (ScheduleCache, cache_path, grid_table_hash, notion_targets, schedule_params_hash,
+                                snapshot_hash, DEFAULT_TTL_MINUTES)
+
+    result = {"success": False, "stage": "validate", "error": None, "timings": {}}
+
+    def fail(message, error):
+        print(message)
+        result["error"] = error
+        return result
+
     login_url, username, password = config.get("LOGIN_URL"), config.get("USERNAME"), config.get("PASSWORD")
     api_key, database_id = config.get("NOTION_KEY"), config.get("COURSE_DATABASE_ID")
-    if not all([login_url, username, password, api_key, database_id]):
-        print("❌ config.txt 中缺少執行此任務所需的固定資訊。")
-        return False
+    notes_db_id = config.get("NOTE_DATABASE_ID")
+    notion_ready = mode == "ics" or all([api_key, database_id])
+    if not all([login_url, username, password]) or not notion_ready:
+        return fail("❌ config.txt 中缺少執行此任務所需的固定資訊。", "缺少登入或 Notion 設定")
+    if mode == "fused" and not notes_db_id:
+        return fail("❌ 融合模式需要 config.txt 中的 NOTE_DATABASE_ID。", "融合模式缺少筆記資料庫")
+    try:
+        window_days, reminder_minutes = _reminder_settings(config)
+        exclude_dates = parse_exclusion_dates(config.get("EXCLUDE_DATES"))
+        ttl_minutes = float(config.get("SCHEDULE_CACHE_TTL_MINUTES") or DEFAULT_TTL_MINUTES)
+        note_template = _note_template(config) if mode == "fused" else None
+    except ValueError as e:
+        return fail(f"❌ config.txt 中的停課日、提醒、快取或筆記範本設定格式錯誤: {e}", f"設定格式錯誤: {e}")
 
-    page_source = None
-    max_attempts = 3
-    for attempt in range(max_attempts):
-        print("\n" + "="*50)
-        print(f"▶️  第 {attempt + 1}/{max_attempts} 次嘗試抓取課程網頁...")
-        source = login_and_get_page_source(login_url, username, password)
-        if source:
-            print("✅ 網頁抓取成功！")
-            page_source = source
-            break
-        else:
-            print(f"⚠️ 第 {attempt + 1} 次抓取失敗。")
-            if attempt < max_attempts - 1:
-                print("   將在 5 秒後重試...")
-                time.sleep(5)
+    # ics 模式另用一個快取檔，避免覆寫 Notion 同步用來判斷快照是否可信的紀錄
+    targets = notion_targets(mode, database_id, notes_db_id)
+    schedule_cache = ScheduleCache(cache_path(output_dir, username,
+                                              f"{semester_name}_ics" if mode == "ics" else semester_name), targets)
+    params_hash = schedule_params_hash(start_date_str, end_date_str, exclude_dates, process_courses.PERIOD_TABLE, mode,
+                                       targets)
+    if mode == "ics":
+        from ics_export import ics_path, export_courses_to_ics
+        if not os.path.exists(ics_path(output_dir, start_date_str)):
+            force = True
+    if not force and schedule_cache.is_fresh(params_hash, ttl_minutes):
+        print(f"⏭️  {ttl_minutes:g} 分鐘內已成功上傳過相同設定的課表，略過登入、處理與上傳。")
+        print(f"   (如需強制重跑，請刪除 {schedule_cache.path} 或使用 cli.py sync-semester --force)")
+        run_metrics.incr("schedule_cache.ttl_hit")
+        result["stage"], result["success"] = "cached", True
+        return result
 
+    result["stage"] = "fetch"
+    stage_started = time.perf_counter()
+    page_source = fetch_with_retries(login_url, username, password, config.get("FETCH_MODE", "auto"))
+    result["timings"]["fetch"] = time.perf_counter() - stage_started
     if not page_source:
-        print("\n☠️ 抓取課程網頁失敗，已達重試上限。任務終止。")
-        return False
+        return fail("\n☠️ 抓取課程網頁失敗，已達重試上限。任務終止。", "抓取課程網頁失敗")
 
-    final_courses_data = process_source_and_create_files(page_source, start_date_str, end_date_str)
-    
+    result["stage"] = "process"
+    stage_started = time.perf_counter()
+    parser_backend = config.get("PARSER_BACKEND", "auto")
+    with run_metrics.span("process.parse"):
+        table_rows = extract_grid_rows(page_source, parser_backend)
+    table_hash = grid_table_hash(table_rows)
+    if not force and schedule_cache.is_unchanged(params_hash, table_hash):
+        if not dry_run:
+            schedule_cache.touch()
+        print("⏭️  課表與上次成功上傳時完全相同，略過處理與上傳。")
+        run_metrics.incr("schedule_cache.hash_hit")
+        result["timings"]["process"] = time.perf_counter() - stage_started
+        result["stage"], result["success"] = "cached", True
+        return result
+
+    # 處理時會覆寫 CSV，先讀出上次的快照；只有雜湊與上次成功上傳時相符才拿來比對
+    base_params_hash = schedule_params_hash(start_date_str, end_date_str, exclude_dates,
+                                            process_courses.PERIOD_TABLE, None, targets[:1])
+    previous_rows = load_schedule_snapshot(snapshot_path(output_dir, start_date_str))
+    if previous_rows is not None and not schedule_cache.matches_snapshot(snapshot_hash(base_params_hash, previous_rows)):
+        previous_rows = None
+
+    final_courses_data = process_source_and_create_files(page_source, start_date_str, end_date_str, output_dir,
+                                                         parser_backend=parser_backend,
+                                                         exclude_dates=exclude_dates, table_rows=table_rows,
+                                                         write_csv=not dry_run)
+    result["timings"]["process"] = time.perf_counter() - stage_started
     if not final_courses_data:
-        print("☠️ 資料處理後無有效課程，任務終止。")
-        return False
+        return fail("☠️ 資料處理後無有效課程，任務終止。", "資料處理後無有效課程")
 
-    # === 核心修改：修正函式呼叫，傳入所有必要的參數 ===
-    upload_courses_to_notion(api_key, database_id, final_courses_data, semester_name)
-    return True
+    config["SEMESTER_NAME_FROM_TASK_2"] = semester_name
+    # 課表中出現資料庫尚未有的選項 (例如新的必選修類別) 時，預設自動補上
+    add_options = config_flag(config, "AUTO_ADD_SELECT_OPTIONS", default=True)
+    result["stage"] = "upload"
+    stage_started = time.perf_counter()
+    only_codes = None
+    if mode == "sync" and previous_rows is not None and not force:
+        diff = diff_course_schedules(previous_rows, final_courses_data)
+        print_schedule_diff(diff)
+        only_codes = affected_course_codes(diff)
+        result["changes"] = {k: len(v) for k, v in diff.items()}
+    if mode == "ics":
+        if dry_run:
+            print(f"\n📋 試算結果 (行事曆匯出 {semester_name})：將寫入 {ics_path(output_dir, start_date_str)}，"
+                  f"共 {len(final_courses_data)} 門課，不會送出任何 Notion 請求。")
+            result["stage"], result["success"] = "planned", True
+            return result
+        result["ics_path"] = export_courses_to_ics(final_courses_data, semester_name, start_date_str, output_dir,
+                                                   reminder_minutes)
+        ok, error = result["ics_path"] is not None, "寫入行事曆檔失敗"
+    elif dry_run:
+        from dry_run import plan_semester_task
+        plan = plan_semester_task(api_key, database_id, final_courses_data, semester_name, mode, resume, only_codes,
+                                  notes_db_id if mode == "fused" else None, note_template,
+                                  window_days if mode == "fused" else None, reminder_minutes, add_options)
+        result["timings"]["upload"] = time.perf_counter() - stage_started
+        if plan is None:
+            result["error"] = "試算時查詢 Notion 失敗"
+            return result
+        result["plan"] = plan.print_report()
+        if result["plan"]["errors"]:
+            result["error"] = "；".join(result["plan"]["errors"])
+            return result
+        result["stage"], result["success"] = "planned", True
+        return result
+    elif mode == "sync":
+        ok = sync_courses_to_notion(api_key, database_id, final_courses_data, semester_name, only_codes=only_codes,
+                                    add_missing_options=add_options, cache=_open_cache(config))
+        error = "同步 Notion 失敗"
+    elif mode == "upload":
+        upload_result = upload_courses_to_notion(api_key, database_id, final_courses_data, semester_name,
+                                                 resume=resume, add_missing_options=add_options)
+        ok, error = upload_result["failed"] == 0, "上傳 Notion 失敗"
+    else:
+        upload_result = upload_courses_to_notion(api_key, database_id, final_courses_data, semester_name,
+                                                 resume=resume, notes_db_id=notes_db_id,
+                                                 reminder_window_days=window_days, reminder_minutes=reminder_minutes,
+                                                 note_template=note_template, add_missing_options=add_options)
+        config["FUSED_PIPELINE_DONE"] = True
+        ok, error = upload_result["failed"] == 0 and upload_result["notes_failed"] == 0, "上傳 Notion 失敗"
+    result["timings"]["upload"] = time.perf_counter() - stage_started
+    if not ok:
+        result["error"] = error
+        return result
 
-def run_initial_setup(config):
-    """執行一次性的資料庫安裝任務，並回報結果"""
+    # 只在完全成功時記錄，失敗的批次下次仍會重新處理；ics 模式的快取不需要快照
+    schedule_cache.record(params_hash, table_hash, final_courses_data,
+                          None if mode == "ics" else snapshot_hash(base_params_hash, snapshot_rows(final_courses_data)))
+    result["stage"], result["success"] = "done", True
+    return result
+
+def _reminder_settings(config):
+    """讀取提醒視窗天數與提前分鐘數，格式錯誤時拋出 ValueError。"""
+    try:
+        return int(config.get("REMINDER_WINDOW_DAYS") or 30), int(config.get("REMINDER_MINUTES_BEFORE") or 20)
+    except ValueError:
+        raise ValueError("REMINDER_WINDOW_DAYS 與 REMINDER_MINUTES_BEFORE 應為整數")
+
+def _note_template(config):
+    """依 NOTE_TEMPLATE_PATH 建立筆記內容範本；未設定時使用預設範本，設為 none 時建立空白筆記。"""
+    from note_template import NoteTemplate, load_note_template
+    path = (config.get("NOTE_TEMPLATE_PATH") or "").strip()
+    if path.lower() == "none":
+        return None
+    return NoteTemplate(load_note_template(path or None))
+
+def _ask_resume(kind, database_id, semester_name):
+    """若上次同一批次留下了未完成的檢查點日誌 (有已完成或失敗的項目)，詢問是否從中斷處續傳。"""
+    import os
+    from checkpoint_journal import CheckpointJournal, journal_path
+    path = journal_path(kind, database_id, semester_name)
+    if not os.path.exists(path):
+        return False
+    journal = CheckpointJournal(path)
+    completed = journal.load()
+    if not completed and not journal.failed_count:
+        return False
+    answer = input(f"   - 偵測到上次未完成的檢查點日誌 (已完成 {completed} 項、失敗 {journal.failed_count} 項)，"
+                   "是否只補送尚未完成的項目？(Y/n): ").strip().lower()
+    return answer != 'n'
+
+@run_metrics.timed("task.setup")
+def run_initial_setup(config, clear_parent=None):
+    """執行一次性的資料庫安裝任務，並回報結果；clear_parent 為 None 時會互動式詢問是否清空父頁面。"""
+    from setup_databases import setup_all_databases
     print("\n--- 您選擇了【初始化設定】 ---")
     api_key = config.get("NOTION_KEY")
     parent_page_id = config.get("PARENT_PAGE_ID")
     if not all([api_key, parent_page_id]):
         print("❌ config.txt 中缺少 NOTION_KEY 或 PARENT_PAGE_ID。")
         return False
-    return setup_all_databases(api_key, parent_page_id)
+    return setup_all_databases(api_key, parent_page_id, clear_parent=clear_parent,
+                               config_path=config.get("CONFIG_PATH", "config.txt"))
+
+def _open_cache(config):
+    """若 config.txt 設定 USE_NOTION_CACHE=true，開啟本地 SQLite 鏡像；否則回傳 None。"""
+    if not config_flag(config, "USE_NOTION_CACHE"):
+        return None
+    from notion_cache import NotionCache, DEFAULT_CACHE_PATH, DEFAULT_FULL_REFRESH_HOURS
+    try:
+        full_refresh_hours = float(config.get("NOTION_CACHE_FULL_REFRESH_HOURS") or DEFAULT_FULL_REFRESH_HOURS)
+    except ValueError:
+        print(f"⚠️  NOTION_CACHE_FULL_REFRESH_HOURS 格式錯誤，改用預設的 {DEFAULT_FULL_REFRESH_HOURS} 小時。")
+        full_refresh_hours = DEFAULT_FULL_REFRESH_HOURS
+    return NotionCache(config.get("NOTION_CACHE_PATH") or DEFAULT_CACHE_PATH, full_refresh_hours)
 
+@run_metrics.timed("task.reminders")
 def run_reminder_task(config):
     """執行批次新增提醒的維護任務"""
-    from add_reminders import add_reminders_for_upcoming_courses
     print("\n--- 您選擇了【日常維護】 ---")
+    return execute_reminder_task(config)
+
+def execute_reminder_task(config, dry_run=False):
+    """不需互動的提醒維護任務，設定全部取自 config；dry_run=True 時只試算不寫入。"""
+    from add_reminders import add_reminders_for_upcoming_courses
     api_key = config.get("NOTION_KEY")
     database_id = config.get("COURSE_DATABASE_ID")
     if not all([api_key, database_id]):
         print("❌ config.txt 中缺少 NOTION_KEY 或 COURSE_DATABASE_ID。")
         return False
-    return add_reminders_for_upcoming_courses(api_key, database_id)
+    try:
+        window_days, reminder_minutes = _reminder_settings(config)
+    except ValueError as e:
+        print(f"❌ config.txt 中的提醒設定格式錯誤: {e}")
+        return False
+    if dry_run:
+        from dry_run import plan_reminder_task
+        plan = plan_reminder_task(api_key, database_id, window_days, reminder_minutes)
+        return plan is not None and not plan.print_report()["errors"]
+    return add_reminders_for_upcoming_courses(api_key, database_id, cache=_open_cache(config),
+                                              window_days=window_days, reminder_minutes=reminder_minutes)
 
+@run_metrics.timed("task.notes")
 def run_note_creation_task(config):
     """為指定學期批次建立筆記"""
-    from create_notes import create_weekly_notes_for_semester
     print("\n--- 您選擇了【筆記建立】 ---")
     # 執行前，先互動式地詢問學期名稱
     semester_name = input("▶️  請輸入您要為哪個學期建立筆記 (例如: 115上): ").strip()
     if not semester_name:
         print("❌ 未輸入學期名稱，任務中止。")
         return False
-        
+    resume = _ask_resume("notes", config.get("NOTE_DATABASE_ID") or "", semester_name)
+    return execute_note_task(config, semester_name, resume)
+
+def execute_note_task(config, semester_name, resume=False, dry_run=False):
+    """不需互動的筆記建立任務；dry_run=True 時只試算不寫入。"""
+    from create_notes import create_weekly_notes_for_semester
     api_key = config.get("NOTION_KEY")
     course_db_id = config.get("COURSE_DATABASE_ID")
     notes_db_id = config.get("NOTE_DATABASE_ID")
     if not all([api_key, course_db_id, notes_db_id]):
         print("❌ config.txt 中缺少執行此任務所需的資料庫ID。")
         return False
-    return create_weekly_notes_for_semester(api_key, course_db_id, notes_db_id, semester_name)
+    try:
+        template = _note_template(config)
+    except ValueError as e:
+        print(f"❌ 筆記範本設定錯誤: {e}")
+        return False
+    add_options = config_flag(config, "AUTO_ADD_SELECT_OPTIONS", default=True)
+    if dry_run:
+        from dry_run import plan_note_task
+        plan = plan_note_task(api_key, course_db_id, notes_db_id, semester_name, resume, template, add_options)
+        return plan is not None and not plan.print_report()["errors"]
+    return create_weekly_notes_for_semester(api_key, course_db_id, notes_db_id, semester_name,
+                                            cache=_open_cache(config), resume=resume, template=template,
+                                            add_missing_options=add_options)
 
 def main():
     """主程式進入點，提供任務選單並處理任務銜接。"""
@@ -122,6 +348,8 @@ def main():
         print("❌ 讀取設定檔失敗，無法繼續。")
         return
 
+    run_metrics.start_run(f"task{choice}", live=config_flag(config, "METRICS_LIVE"))
+
     if choice == '1':
         if run_initial_setup(config):
             print("\n" + "*"*50 + "\n✅ 初始化設定成功完成！您的 Notion 架構已準備就緒。")
@@ -135,7 +363,12 @@ def main():
     if choice == '2':
         if run_semester_task(config):
             print("\n" + "*"*50 + "\n✅ 學期性功能成功完成！")
-            continue_choice_notes = input("   是否要為此學期預先建立所有筆記頁面(任務3)？(y/N): ").lower()
+            if config.get("FUSED_PIPELINE_DONE"):
+                # 融合模式已一併建立筆記與近期提醒，不需再接任務3、4
+                print("   筆記與近期提醒已在融合模式中一併建立。")
+                continue_choice_notes = 'n'
+            else:
+                continue_choice_notes = input("   是否要為此學期預先建立所有筆記頁面(任務3)？(y/N): ").lower()
             if continue_choice_notes == 'y':
                 choice = '3'
             else:
@@ -172,6 +405,10 @@ def main():
     elif choice not in ['1', '2', '3', '4']:
         print("❌ 無效的選項。")
 
+    metrics_path = run_metrics.finish_run(config.get("METRICS_DIR") or run_metrics.DEFAULT_METRICS_DIR)
+    print("\n" + run_metrics.current_run().summary_line())
+    if metrics_path:
+        print(f"📈 本次執行指標已輸出至 {metrics_path}")
     print("\n🏁 主程式 (main.py) 執行完畢。")
 
 if __name__ == '__main__':
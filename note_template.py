@@ -0,0 +1,101 @@
+import json
+import re
+
+# Notion 單次建立頁面或附加子區塊最多 100 個區塊
+MAX_BLOCKS_PER_REQUEST = 100
+
+# 範本中可用的佔位符，會在每則筆記中替換成對應的值
+TEMPLATE_FIELDS = ("course_name", "course_page_id", "course_url", "semester", "week", "date")
+_PLACEHOLDER = re.compile(r"\{\{(" + "|".join(TEMPLATE_FIELDS) + r")\}\}")
+
+
+def _text(content):
+    return [{"type": "text", "text": {"content": content}}]
+
+
+def _block(block_type, content=None, **extra):
+    body = {"rich_text": _text(content) if content else []} if content is not None else {}
+    body.update(extra)
+    return {"object": "block", "type": block_type, block_type: body}
+
+
+# 預設的筆記內容：連回課程頁面、課前預習、課堂重點與課後作業
+DEFAULT_NOTE_TEMPLATE = [
+    {"object": "block", "type": "link_to_page", "link_to_page": {"type": "page_id", "page_id": "{{course_page_id}}"}},
+    _block("callout", "{{semester}} 第{{week}}週・{{date}}", icon={"type": "emoji", "emoji": "📅"}),
+    _block("heading_2", "課前預習"),
+    _block("to_do", "閱讀本週指定教材", checked=False),
+    _block("heading_2", "課堂重點"),
+    _block("bulleted_list_item", ""),
+    _block("heading_2", "課後作業"),
+    _block("to_do", "整理本週筆記", checked=False),
+    _block("to_do", "完成課後作業", checked=False),
+]
+
+
+def load_note_template(path=None):
+    """讀取 JSON 格式的筆記範本 (區塊陣列)；未指定路徑時回傳預設範本，格式錯誤時拋出 ValueError。"""
+    if not path:
+        return DEFAULT_NOTE_TEMPLATE
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            blocks = json.load(f)
+    except OSError as e:
+        raise ValueError(f"無法讀取筆記範本 {path}: {e}")
+    if not isinstance(blocks, list) or not all(isinstance(b, dict) and b.get("type") for b in blocks):
+        raise ValueError(f"筆記範本 {path} 應為區塊物件的 JSON 陣列")
+    return blocks
+
+
+class _SerializedChunk:
+    """預先序列化的區塊陣列 JSON，切成固定文字與佔位符交錯的片段，渲染時只需字串串接。"""
+
+    def __init__(self, blocks):
+        text = json.dumps(blocks, ensure_ascii=False, separators=(',', ':'))
+        self.parts = _PLACEHOLDER.split(text)  # 偶數索引為固定文字，奇數索引為欄位名稱
+
+    def render(self, escaped):
+        parts = self.parts
+        return "".join(part if i % 2 == 0 else escaped[part] for i, part in enumerate(parts))
+
+
+class NoteTemplate:
+    """筆記內容範本：建構時序列化一次，之後每則筆記只做佔位符替換。
+
+    前 100 個區塊隨建立頁面的請求一併送出，其餘每 100 個區塊一次附加請求。
+    """
+
+    def __init__(self, blocks):
+        self.block_count = len(blocks)
+        chunks = [blocks[i:i + MAX_BLOCKS_PER_REQUEST] for i in range(0, len(blocks), MAX_BLOCKS_PER_REQUEST)]
+        self._head = _SerializedChunk(chunks[0]) if chunks else None
+        self._tail = [_SerializedChunk(chunk) for chunk in chunks[1:]]
+
+    @property
+    def append_requests(self):
+        """每則筆記在建立頁面之外還需要的附加請求數。"""
+        return len(self._tail)
+
+    @staticmethod
+    def _escape(values):
+        # 佔位符位於 JSON 字串內，替換值需要先做 JSON 跳脫 (去掉外層引號)
+        return {name: json.dumps(str(values.get(name, "")), ensure_ascii=False)[1:-1] for name in TEMPLATE_FIELDS}
+
+    def render_create_body(self, payload, values):
+        """將範本的前 100 個區塊接到建立頁面的 payload 後，回傳可直接送出的 UTF-8 bytes。"""
+        body = json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+        if self._head is not None:
+            body = body[:-1] + ',"children":' + self._head.render(self._escape(values)) + '}'
+        return body.encode('utf-8')
+
+    def render_append_bodies(self, values):
+        """回傳其餘區塊的附加請求 bodies (每個最多 100 個區塊)。"""
+        escaped = self._escape(values)
+        return [('{"children":' + chunk.render(escaped) + '}').encode('utf-8') for chunk in self._tail]
+
+
+def note_template_values(course_page, semester_name, week_num, date_start):
+    """由課程頁面組出範本佔位符的值。"""
+    course_name = course_page["properties"]["課程名稱"]["title"][0]["text"]["content"]
+    return {"course_name": course_name, "course_page_id": course_page["id"], "course_url": course_page.get("url", ""),
+            "semester": semester_name, "week": week_num, "date": (date_start or "")[:10]}
@@ -0,0 +1,317 @@
+import contextlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+import run_metrics
+from rate_limiter import notion_limiter
+
+# 可用環境變數指向本地替身伺服器 (例如 benchmarks/fake_notion_server.py)
+NOTION_API_BASE_URL = os.environ.get("NOTION_API_BASE_URL", "https://api.notion.com")
+NOTION_VERSION = "2022-06-28"
+
+# 可重試的暫時性錯誤：429 限流、409 交易衝突、5xx 伺服器錯誤
+RETRY_STATUS_CODES = {409, 429, 500, 502, 503, 504}
+# 非冪等請求 (建立頁面、附加區塊) 只重試確定未被執行的回應；逾時或 5xx 時可能已經建立，重送會產生重複頁面
+NON_IDEMPOTENT_RETRY_STATUS_CODES = {409, 429}
+
+_ID_PATTERN = re.compile(r"[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}")
+
+
+def endpoint_key(method, path):
+    """將請求路徑中的 ID 正規化，作為延遲統計的分類鍵，例如 'POST /v1/databases/{id}/query'。"""
+    return f"{method.upper()} {_ID_PATTERN.sub('{id}', path.split('?', 1)[0])}"
+
+
+def property_value(prop):
+    """將 Notion 屬性物件 (API 回應或請求 payload 皆可) 簡化為可比較的純值。
+
+    title/rich_text 取純文字，select 取選項名稱，number 取數值，date 取 (start, end) 精確到分鐘。
+    """
+    if not prop:
+        return None
+    if "title" in prop or "rich_text" in prop:
+        items = prop.get("title") if "title" in prop else prop.get("rich_text")
+        return "".join(item.get("plain_text") or item.get("text", {}).get("content", "") for item in items or [])
+    if "select" in prop:
+        return (prop["select"] or {}).get("name")
+    if "number" in prop:
+        return prop["number"]
+    if "date" in prop:
+        date = prop["date"] or {}
+        return ((date.get("start") or "")[:16], (date.get("end") or "")[:16])
+    if "relation" in prop:
+        return tuple(sorted(item["id"].replace('-', '') for item in prop["relation"] or []))
+    return None
+
+
+def is_idempotent(method, path):
+    """重送不會產生重複資料的請求：GET、DELETE、查詢資料庫與更新頁面屬性；建立與附加區塊則否。"""
+    method = method.upper()
+    path = path.split('?', 1)[0].rstrip('/')
+    if method in ("GET", "DELETE"):
+        return True
+    if method == "POST":
+        return path.endswith("/query")
+    return not path.endswith("/children")
+
+
+def is_gone_response(response):
+    """寫入頁面時得到「頁面已封存或不存在」的回應 (404，或 400 且訊息提到 archived)。"""
+    if response.status_code == 404:
+        return True
+    return response.status_code == 400 and "archived" in response.text
+
+
+def _request_not_sent(error):
+    """連線階段就失敗 (連線逾時、連線被拒) 的錯誤，請求一定沒有送達伺服器。"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class RequestCounter:
+    """計算某段程式碼在自己的執行緒內送出的請求數與延遲 (見 NotionClient.counting)。"""
+
+    def __init__(self):
+        self.count = 0
+        self.samples = []
+
+    @property
+    def p50(self):
+        samples = sorted(self.samples)
+        return samples[int(0.50 * (len(samples) - 1))] if samples else 0.0
+
+
+class NotionClient:
+    """共用的 Notion API 用戶端：連線池、限流、429/Retry-After 與指數退避重試、各端點延遲統計。"""
+
+    def __init__(self, api_key, base_url=None, limiter=notion_limiter,
+                 max_retries=5, backoff_base=0.5, backoff_cap=30.0, pool_size=10, timeout=30):
+        self.base_url = (base_url or NOTION_API_BASE_URL).rstrip('/')
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+            "Notion-Version": NOTION_VERSION,
+        })
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._stats_lock = threading.Lock()
+        self._stats = {}
+        self._counters = threading.local()
+
+    # --- 統計 ---
+    def _record(self, key, elapsed, status_code=None, retried=False):
+        for counter in getattr(self._counters, "active", ()):
+            counter.count += 1
+            counter.samples.append(elapsed)
+        run_metrics.observe(f"notion.latency {key}", elapsed)
+        run_metrics.incr("notion.requests")
+        if status_code is None or status_code >= 400:
+            run_metrics.incr("notion.errors")
+        if retried:
+            run_metrics.incr("notion.retries")
+        with self._stats_lock:
+            stat = self._stats.get(key)
+            if stat is None:
+                stat = {"count": 0, "errors": 0, "retries": 0, "total": 0.0, "max": 0.0, "samples": deque(maxlen=2048)}
+                self._stats[key] = stat
+            stat["count"] += 1
+            stat["total"] += elapsed
+            stat["max"] = max(stat["max"], elapsed)
+            stat["samples"].append(elapsed)
+            if status_code is None or status_code >= 400:
+                stat["errors"] += 1
+            if retried:
+                stat["retries"] += 1
+
+    @contextlib.contextmanager
+    def counting(self, counter):
+        """在 with 區塊內把目前執行緒送出的請求累計到 counter (RequestCounter)。
+
+        用戶端由整個行程共用；其他執行緒 (例如批次中的其他帳號) 同時送出的請求不會計入。
+        """
+        active = getattr(self._counters, "active", None)
+        if active is None:
+            active = self._counters.active = []
+        active.append(counter)
+        try:
+            yield counter
+        finally:
+            active.remove(counter)
+
+    def latency_stats(self):
+        """回傳各端點的請求數、錯誤數、重試數與延遲 (秒) 的 avg/p50/p95/max。"""
+        report = {}
+        with self._stats_lock:
+            for key, stat in self._stats.items():
+                samples = sorted(stat["samples"])
+                report[key] = {
+                    "count": stat["count"],
+                    "errors": stat["errors"],
+                    "retries": stat["retries"],
+                    "avg": stat["total"] / stat["count"],
+                    "p50": samples[int(0.50 * (len(samples) - 1))],
+                    "p95": samples[int(0.95 * (len(samples) - 1))],
+                    "max": stat["max"],
+                }
+        return report
+
+    def overall_latency_stats(self):
+        """彙總所有端點：總請求數、錯誤數、重試數與延遲 (秒) 的 p50/p95/max。"""
+        with self._stats_lock:
+            stats = list(self._stats.values())
+        samples = sorted(sample for stat in stats for sample in stat["samples"])
+        if not samples:
+            return {"count": 0, "errors": 0, "retries": 0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+        return {
+            "count": sum(stat["count"] for stat in stats),
+            "errors": sum(stat["errors"] for stat in stats),
+            "retries": sum(stat["retries"] for stat in stats),
+            "p50": samples[int(0.50 * (len(samples) - 1))],
+            "p95": samples[int(0.95 * (len(samples) - 1))],
+            "max": samples[-1],
+        }
+
+    def print_latency_report(self):
+        stats = self.latency_stats()
+        if not stats:
+            return
+        print("   📊 Notion API 各端點延遲統計:")
+        for key, s in sorted(stats.items()):
+            print(f"     {key}: {s['count']} 次 (錯誤 {s['errors']}, 重試 {s['retries']}), "
+                  f"avg {s['avg'] * 1000:.0f}ms / p50 {s['p50'] * 1000:.0f}ms / p95 {s['p95'] * 1000:.0f}ms")
+
+    # --- 請求 ---
+    def _backoff_delay(self, attempt, response=None):
+        """優先採用伺服器的 Retry-After，否則使用 full-jitter 指數退避。"""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return max(0.0, float(retry_after))
+                except ValueError:
+                    pass
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    def request(self, method, path, payload=None, data=None, params=None):
+        """送出請求並在暫時性錯誤時自動重試，回傳最後一次的 requests.Response。
+
+        payload 為 dict 時會以 UTF-8 JSON 編碼；data 可直接傳入預先編碼好的 bytes。
+        網路錯誤在重試用盡後會拋出 requests.exceptions.RequestException。
+        非冪等請求 (見 is_idempotent) 只在 429/409 與連線階段的錯誤時重試，讀取逾時、連線中斷或 5xx
+        時直接回傳/拋出，以免重送已被伺服器處理的建立請求而產生重複頁面。
+        """
+        url = path if path.startswith("http") else f"{self.base_url}{path}"
+        key = endpoint_key(method, path)
+        idempotent = is_idempotent(method, path)
+        retry_codes = RETRY_STATUS_CODES if idempotent else NON_IDEMPOTENT_RETRY_STATUS_CODES
+        if payload is not None:
+            data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+
+        for attempt in range(self.max_retries + 1):
+            if self.limiter is not None:
+                waited = self.limiter.acquire()
+                if waited:
+                    run_metrics.observe("notion.rate_limit_wait", waited)
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, data=data, params=params, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self._record(key, time.perf_counter() - started, retried=attempt > 0)
+                if attempt >= self.max_retries or not (idempotent or _request_not_sent(e)):
+                    raise
+                run_metrics.sleep(self._backoff_delay(attempt), "notion.backoff")
+                continue
+
+            self._record(key, time.perf_counter() - started, response.status_code, retried=attempt > 0)
+            if response.status_code not in retry_codes or attempt >= self.max_retries:
+                return response
+            delay = self._backoff_delay(attempt, response)
+            print(f"   ⏳ {key} 回應 {response.status_code}，{delay:.1f} 秒後重試 ({attempt + 1}/{self.max_retries})...")
+            if response.status_code == 429:
+                run_metrics.incr("notion.throttled")
+            run_metrics.sleep(delay, "notion.backoff")
+
+    def get(self, path, params=None):
+        return self.request("GET", path, params=params)
+
+    def post(self, path, payload=None, data=None):
+        return self.request("POST", path, payload=payload, data=data)
+
+    def patch(self, path, payload=None, data=None):
+        return self.request("PATCH", path, payload=payload, data=data)
+
+    def delete(self, path):
+        return self.request("DELETE", path)
+
+    def query_database(self, database_id, payload=None, page_size=100):
+        """逐頁查詢資料庫並逐筆產出頁面物件 (自動跟隨 has_more/next_cursor)。
+
+        HTTP 錯誤會以 requests.exceptions.HTTPError 拋出。
+        """
+        body = dict(payload or {})
+        body["page_size"] = page_size
+        while True:
+            response = self.post(f"/v1/databases/{database_id}/query", body)
+            response.raise_for_status()
+            data = response.json()
+            yield from data.get("results", [])
+            if not data.get("has_more"):
+                return
+            body["start_cursor"] = data.get("next_cursor")
+
+    def iter_block_children(self, block_id, page_size=100):
+        """逐頁列出區塊的子區塊並逐筆產出 (自動跟隨 has_more/next_cursor)。
+
+        HTTP 錯誤會以 requests.exceptions.HTTPError 拋出。
+        """
+        params = {"page_size": page_size}
+        while True:
+            response = self.get(f"/v1/blocks/{block_id}/children", params=params)
+            response.raise_for_status()
+            data = response.json()
+            yield from data.get("results", [])
+            if not data.get("has_more"):
+                return
+            params["start_cursor"] = data.get("next_cursor")
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key):
+    """取得指定 API 金鑰的共用用戶端 (同一行程內重複使用同一個連線池)。"""
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = NotionClient(api_key)
+            _clients[api_key] = client
+        return client
+
+
+def print_latency_report():
+    """列印本行程中所有共用用戶端的延遲統計。"""
+    with _clients_lock:
+        clients = list(_clients.values())
+    for client in clients:
+        client.print_latency_report()
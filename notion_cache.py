@@ -0,0 +1,169 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from notion_api import property_value
+
+DEFAULT_CACHE_PATH = os.path.join(".notion_cache", "notion_mirror.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    page_id          TEXT PRIMARY KEY,
+    database_id      TEXT NOT NULL,
+    last_edited_time TEXT,
+    semester         TEXT,
+    week             INTEGER,
+    course_code      TEXT,
+    date_start_ts    REAL,
+    has_reminder     INTEGER NOT NULL DEFAULT 0,
+    course_page_id   TEXT,
+    raw              TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_pages_db_semester ON pages (database_id, semester);
+CREATE INDEX IF NOT EXISTS idx_pages_db_date ON pages (database_id, date_start_ts);
+CREATE INDEX IF NOT EXISTS idx_pages_course_page ON pages (course_page_id);
+CREATE TABLE IF NOT EXISTS sync_state (
+    database_id      TEXT PRIMARY KEY,
+    last_edited_time TEXT,
+    refreshed_at     TEXT
+);
+CREATE TABLE IF NOT EXISTS full_refresh_state (
+    database_id      TEXT PRIMARY KEY,
+    refreshed_at_ts  REAL NOT NULL
+);
+"""
+# 增量更新看不到被封存的頁面，超過這個時間未完整重建的資料庫會自動做一次完整重建
+DEFAULT_FULL_REFRESH_HOURS = 24
+
+
+def _normalize_id(notion_id):
+    return notion_id.replace('-', '') if notion_id else notion_id
+
+
+def _timestamp(iso_str):
+    """將 Notion 日期字串轉為 epoch 秒數；沒有時區資訊者視為本地時間。"""
+    if not iso_str:
+        return None
+    try:
+        return datetime.fromisoformat(iso_str.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+class NotionCache:
+    """課程與筆記資料庫的本地 SQLite 鏡像，以 last_edited_time 增量更新。
+
+    Notion 的查詢不會回傳已封存的頁面，因此增量更新無法得知刪除：本程式自己封存頁面或寫入時
+    得到「已封存/不存在」的錯誤時，會以 delete_page 移除鏡像中的該列；其餘在 Notion 介面中
+    封存的頁面，則由每 full_refresh_hours 小時一次的完整重建清除。
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, full_refresh_hours=DEFAULT_FULL_REFRESH_HOURS):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.path = path
+        self.full_refresh_hours = full_refresh_hours
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    # --- 寫入 ---
+    def upsert_page(self, database_id, page):
+        """寫入或更新單一頁面 (API 回傳的完整頁面物件)。"""
+        props = page.get("properties", {})
+        date = (props.get("課程日期與提醒") or props.get("上課日期") or {}).get("date") or {}
+        relation = property_value(props.get("關聯到課程")) or ()
+        row = (
+            _normalize_id(page["id"]),
+            _normalize_id(database_id),
+            page.get("last_edited_time"),
+            property_value(props.get("學期")),
+            property_value(props.get("週次")),
+            property_value(props.get("課程代碼")),
+            _timestamp(date.get("start")),
+            1 if date.get("reminder") else 0,
+            relation[0] if relation else None,
+            json.dumps(page, ensure_ascii=False),
+        )
+        with self._lock, self._conn:
+            if page.get("archived") or page.get("in_trash"):
+                self._conn.execute("DELETE FROM pages WHERE page_id = ?", (row[0],))
+            else:
+                self._conn.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+
+    def delete_page(self, page_id):
+        """從鏡像中移除單一頁面 (已封存或已不存在)。"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM pages WHERE page_id = ?", (_normalize_id(page_id),))
+
+    def _full_refresh_due(self, database_id):
+        with self._lock:
+            state = self._conn.execute(
+                "SELECT refreshed_at_ts FROM full_refresh_state WHERE database_id = ?", (database_id,)).fetchone()
+        return not state or time.time() - state[0] >= self.full_refresh_hours * 3600
+
+    def refresh(self, client, database_id, full=False):
+        """從 Notion 拉取自上次同步以來有變動的頁面，回傳本次更新的頁面數。
+
+        full=True 或距上次完整重建已超過 full_refresh_hours 時改為完整重建：重新拉取整個資料庫，
+        並刪除查詢中沒有出現的列 (在 Notion 介面中被封存的頁面)。
+        """
+        database_id = _normalize_id(database_id)
+        with self._lock:
+            state = self._conn.execute(
+                "SELECT last_edited_time FROM sync_state WHERE database_id = ?", (database_id,)).fetchone()
+        full = full or not state or self._full_refresh_due(database_id)
+        since = None if full else state[0]
+
+        query = {"sorts": [{"timestamp": "last_edited_time", "direction": "ascending"}]}
+        if since:
+            # last_edited_time 只精確到分鐘，使用 on_or_after 重抓同一分鐘的頁面，寫入為冪等
+            query["filter"] = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": since}}
+
+        count, newest, seen = 0, since, set()
+        for page in client.query_database(database_id, query):
+            self.upsert_page(database_id, page)
+            seen.add(_normalize_id(page["id"]))
+            count += 1
+            edited = page.get("last_edited_time")
+            if edited and (newest is None or edited > newest):
+                newest = edited
+
+        with self._lock, self._conn:
+            if full:
+                # 查詢全部完成後才刪除沒出現的列，查詢中途失敗時鏡像維持原狀
+                stale = [page_id for (page_id,) in self._conn.execute(
+                    "SELECT page_id FROM pages WHERE database_id = ?", (database_id,)) if page_id not in seen]
+                self._conn.executemany("DELETE FROM pages WHERE page_id = ?", [(page_id,) for page_id in stale])
+                self._conn.execute("INSERT OR REPLACE INTO full_refresh_state VALUES (?, ?)", (database_id, time.time()))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?)",
+                (database_id, newest, datetime.now().isoformat(timespec='seconds')))
+        return count
+
+    # --- 查詢 ---
+    def courses_lacking_reminders(self, course_db_id, window_start, window_end):
+        """回傳日期落在 [window_start, window_end] 內且尚未設定提醒的課程頁面 (完整頁面物件)。"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT raw FROM pages WHERE database_id = ? AND has_reminder = 0 "
+                "AND date_start_ts BETWEEN ? AND ? ORDER BY date_start_ts",
+                (_normalize_id(course_db_id), window_start.timestamp(), window_end.timestamp())).fetchall()
+        return [json.loads(raw) for (raw,) in rows]
+
+    def course_weeks_lacking_notes(self, course_db_id, notes_db_id, semester_name):
+        """回傳該學期中，筆記資料庫裡還沒有任何筆記關聯到的課程頁面 (完整頁面物件)。"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT c.raw FROM pages c WHERE c.database_id = ? AND c.semester = ? "
+                "AND NOT EXISTS (SELECT 1 FROM pages n WHERE n.database_id = ? AND n.course_page_id = c.page_id) "
+                "ORDER BY c.course_code, c.week",
+                (_normalize_id(course_db_id), semester_name, _normalize_id(notes_db_id))).fetchall()
+        return [json.loads(raw) for (raw,) in rows]
@@ -0,0 +1,131 @@
+import threading
+
+import requests
+
+import run_metrics
+
+# 屬性 payload 中可能出現的型別鍵 (與資料庫 schema 的 type 對應)
+PROPERTY_TYPES = ("title", "rich_text", "number", "select", "multi_select", "status", "date", "relation",
+                  "checkbox", "url", "email", "phone_number", "people", "files")
+# 以選項名稱比對的屬性型別
+OPTION_TYPES = ("select", "multi_select")
+
+_schemas = {}
+_schemas_lock = threading.Lock()
+
+
+def get_database_schema(client, database_id, refresh=False):
+    """取得資料庫的屬性 schema ({屬性名稱: 屬性定義})；同一行程內每個資料庫只查詢一次。
+
+    HTTP 錯誤會以 requests.exceptions.HTTPError 拋出。
+    """
+    key = database_id.replace('-', '')
+    with _schemas_lock:
+        schema = _schemas.get(key)
+    if schema is not None and not refresh:
+        run_metrics.incr("schema.cache_hit")
+        return schema
+    response = client.get(f"/v1/databases/{database_id}")
+    response.raise_for_status()
+    schema = response.json().get("properties", {})
+    with _schemas_lock:
+        _schemas[key] = schema
+    return schema
+
+
+def invalidate_schema(database_id=None):
+    """清除快取的 schema (未指定時清除全部)，例如使用者在 Notion 介面中改了欄位之後。"""
+    with _schemas_lock:
+        if database_id is None:
+            _schemas.clear()
+        else:
+            _schemas.pop(database_id.replace('-', ''), None)
+
+
+def _payload_type(prop):
+    return next((key for key in PROPERTY_TYPES if key in prop), None)
+
+
+def _option_names(prop, prop_type):
+    if prop_type == "select":
+        value = prop.get("select")
+        return [value["name"]] if value and value.get("name") else []
+    return [item["name"] for item in prop.get("multi_select") or [] if item.get("name")]
+
+
+def validate_properties(schema, properties_list):
+    """在本地比對多個頁面的 properties 與資料庫 schema。
+
+    回傳 (errors, missing_options)：errors 為無法自動修正的問題 (屬性不存在、型別不符) 的說明列表，
+    missing_options 為 {屬性名稱: [尚未存在的選項名稱]}。
+    """
+    errors, missing_options = [], {}
+    seen_errors = set()
+    for properties in properties_list:
+        for name, prop in properties.items():
+            definition = schema.get(name)
+            prop_type = _payload_type(prop)
+            if definition is None:
+                problem = f"資料庫中沒有屬性「{name}」(可能已在 Notion 介面中改名或刪除)"
+            elif definition.get("type") != prop_type:
+                problem = f"屬性「{name}」在資料庫中是 {definition.get('type')}，但要寫入的是 {prop_type}"
+            else:
+                problem = None
+                if prop_type in OPTION_TYPES:
+                    existing = {option.get("name") for option in (definition.get(prop_type) or {}).get("options", [])}
+                    for option in _option_names(prop, prop_type):
+                        if option not in existing and option not in missing_options.get(name, []):
+                            missing_options.setdefault(name, []).append(option)
+            if problem and problem not in seen_errors:
+                seen_errors.add(problem)
+                errors.append(problem)
+    return errors, missing_options
+
+
+def add_select_options(client, database_id, schema, missing_options):
+    """以一次資料庫 PATCH 補上缺少的選項 (保留既有選項)，成功時更新快取並回傳 True。"""
+    properties = {}
+    for name, options in missing_options.items():
+        prop_type = schema[name]["type"]
+        existing = [{"name": option["name"]} for option in (schema[name].get(prop_type) or {}).get("options", [])]
+        properties[name] = {prop_type: {"options": existing + [{"name": option} for option in options]}}
+    try:
+        response = client.patch(f"/v1/databases/{database_id}", {"properties": properties})
+    except requests.exceptions.RequestException as e:
+        print(f"❌ 新增選項時發生網路錯誤: {e}")
+        return False
+    if response.status_code != 200:
+        print(f"❌ 新增選項失敗: {response.text}")
+        return False
+    with _schemas_lock:
+        _schemas[database_id.replace('-', '')] = response.json().get("properties", schema)
+    run_metrics.incr("schema.options_added", sum(len(options) for options in missing_options.values()))
+    return True
+
+
+@run_metrics.timed("schema.check")
+def check_payload_schema(client, database_id, properties_list, add_missing_options=True, label="資料庫"):
+    """送出任何寫入前先在本地驗證 payload，有問題時只印出一次彙整的錯誤並回傳 False。
+
+    缺少的 select/multi_select 選項在 add_missing_options=True 時以一次 schema PATCH 補上，
+    否則視為錯誤。
+    """
+    try:
+        schema = get_database_schema(client, database_id)
+    except requests.exceptions.RequestException as e:
+        print(f"❌ 無法讀取{label}的結構: {e}")
+        return False
+    errors, missing_options = validate_properties(schema, properties_list)
+    if missing_options and not add_missing_options:
+        errors += [f"屬性「{name}」沒有選項: {', '.join(options)}" for name, options in missing_options.items()]
+    if errors:
+        print(f"❌ 要寫入的資料與{label}的結構不符，已停止且未送出任何寫入:")
+        for problem in errors:
+            print(f"   - {problem}")
+        run_metrics.incr("schema.rejected")
+        return False
+    if missing_options:
+        summary = "；".join(f"{name}: {', '.join(options)}" for name, options in missing_options.items())
+        print(f"   ➕ 為{label}新增缺少的選項 ({summary})...")
+        return add_select_options(client, database_id, schema, missing_options)
+    return True
@@ -1,52 +1,457 @@
-import requests, json, time
+import json
+import requests, threading, time
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import run_metrics
+from checkpoint_journal import CheckpointJournal, journal_path
+from notion_api import get_client, is_gone_response, property_value
+from notion_schema import check_payload_schema
 
-def upload_courses_to_notion(api_key, database_id, courses_data, semester_name):
-    """將處理好的課程資料列表，上傳到指定的 Notion 資料庫。"""
+# 同時進行中的請求數上限；實際速率由共用的權杖桶控制
+DEFAULT_MAX_WORKERS = 4
+
+def iter_course_slots(course):
+    """逐一產出課程的 (週次, 開始ISO, 結束ISO)；Course 紀錄直接由排程產生，不組出日期字典列表。"""
+    if hasattr(course, "iter_occurrences"):
+        yield from course.iter_occurrences()
+        return
+    for i, date_info in enumerate(course.get("重複日期列表", [])):
+        yield date_info.get("week", i + 1), date_info["start"], date_info["end"]
+
+def iter_course_occurrences(course):
+    """逐一產出課程的 (週次, 日期資訊)；週次以學期週數計算，停課週不會讓後續週次位移。"""
+    for week_num, start_iso, end_iso in iter_course_slots(course):
+        yield week_num, {"start": start_iso, "end": end_iso, "week": week_num}
+
+def course_page_key(course, week_num):
+    """課程頁面的識別鍵 (課程代碼, 週次, 星期, 開始時間)，同步計畫與上傳的檢查點日誌共用。
+
+    同一課程代碼可能有多列 (一週上兩次、講授加實驗)，只用代碼與週次會讓它們互相覆蓋。
+    """
+    return (course.get("課程代碼", ""), week_num, course.get("星期", "") or "", course.get("開始時間", "") or "")
+
+def _page_key(page):
+    """由既有課程頁面的屬性組出 course_page_key。"""
+    props = page.get("properties", {})
+    return (property_value(props.get("課程代碼")), property_value(props.get("週次")),
+            property_value(props.get("星期")) or "", property_value(props.get("開始時間")) or "")
+
+def build_course_page_properties(course, semester_name, week_num, date_info):
+    """組出單一週次課程頁面的 properties。"""
+    date_payload = {"start": date_info["start"], "end": date_info["end"], "time_zone": "Asia/Taipei"}
+    return {
+        # 標題不再加上週次資訊
+        "課程名稱": {"title": [{"text": {"content": course.get("課程名稱", "無標題課程")}}]},
+        "課程日期與提醒": {"date": date_payload},
+        "學期": {"select": {"name": semester_name}},
+        "週次": {"number": week_num},
+        "課程代碼": {"rich_text": [{"text": {"content": course.get("課程代碼", "")}}]},
+        "授課教師": {"rich_text": [{"text": {"content": course.get("授課教師", "")}}]},
+        "上課教室": {"rich_text": [{"text": {"content": course.get("上課教室", "")}}]},
+        "學分": {"rich_text": [{"text": {"content": course.get("學分", "")}}]},
+        "必選修": {"select": {"name": course.get("必選修", "選")}},
+        "星期": {"rich_text": [{"text": {"content": course.get("星期", "")}}]},
+        "開始時間": {"rich_text": [{"text": {"content": course.get("開始時間", "")}}]},
+        "結束時間": {"rich_text": [{"text": {"content": course.get("結束時間", "")}}]},
+    }
+
+class CoursePayloadTemplate:
+    """單一課程的頁面建立 payload：每週都相同的屬性只序列化、編碼一次，每週只接上週次與日期。
+
+    render() 回傳可直接送出的 UTF-8 bytes，與 build_course_page_properties 組出的內容相同
+    (只有屬性順序不同)。日期為 process_courses 產生的 ISO 字串，不需 JSON 跳脫。
+    """
+    _WEEK = ',"週次":{"number":'.encode('utf-8')
+    _DATE = '},"課程日期與提醒":{"date":{"start":"'.encode('utf-8')
+
+    def __init__(self, course, semester_name, database_id, reminder=None):
+        properties = build_course_page_properties(course, semester_name, 1, {"start": "", "end": ""})
+        del properties["週次"], properties["課程日期與提醒"]
+        body = json.dumps({"parent": {"database_id": database_id}, "properties": properties},
+                          ensure_ascii=False, separators=(',', ':'))
+        self._prefix = body[:-2].encode('utf-8')  # 去掉 properties 與整個 body 的結尾 "}}"
+        reminder_json = json.dumps(reminder, separators=(',', ':')) if reminder else None
+        self._plain_tail = b'","time_zone":"Asia/Taipei"}}}}'
+        self._reminder_tail = (b'","time_zone":"Asia/Taipei","reminder":' + reminder_json.encode('utf-8') + b'}}}}'
+                               if reminder_json else self._plain_tail)
+
+    def render(self, week_num, start_iso, end_iso, with_reminder=False):
+        return b"".join((self._prefix, self._WEEK, b"%d" % week_num, self._DATE, start_iso.encode(), b'","end":"',
+                         end_iso.encode(), self._reminder_tail if with_reminder else self._plain_tail))
+
+def _post_page(client, page_title, week_num, payload, journal=None, key=None):
+    """透過共用用戶端 (已內建限流與重試) 送出單一頁面建立請求，成功回傳建立的頁面物件，失敗回傳 None。
+
+    傳入 journal 時，成功與失敗都會寫入檢查點日誌，供中斷後續傳。
+    """
+    try:
+        if isinstance(payload, bytes):
+            response = client.post("/v1/pages", data=payload)
+        else:
+            response = client.post("/v1/pages", payload)
+        if response.status_code == 200:
+            run_metrics.incr("upload.created")
+            page = response.json()
+            if journal is not None:
+                journal.record_done(key, page.get("id"))
+            return page
+        run_metrics.incr("upload.failed")
+        # 在錯誤訊息中也使用純標題
+        print(f"   ❌ 新增 '{page_title}' (第{week_num}週) 失敗, 原因: {response.text}")
+        error = f"HTTP {response.status_code}"
+    except requests.exceptions.RequestException as e:
+        run_metrics.incr("upload.failed")
+        print(f"   ❌ 發生網路錯誤: {e}")
+        error = str(e)
+    if journal is not None:
+        journal.record_failure(key, error)
+    return None
+
+def _upload_occurrence(client, course_name, week_num, body, dates, journal, key, page_id=None, fused=None):
+    """建立單一週次的課程頁面；融合模式下接著為它建立筆記。回傳該週次的結果字典。
+
+    body 為預先序列化的建立請求 (bytes)，dates 為 (開始ISO, 結束ISO, 是否帶提醒)。
+    page_id 不為 None 表示課程頁面在先前的執行中已建立 (續傳)，只補建筆記。
+    """
+    start_iso, end_iso, has_reminder = dates
+    entry = {"course_code": key[0], "week": week_num, "page_id": page_id, "start": start_iso,
+             "end": end_iso, "has_reminder": has_reminder, "status": "resumed", "note": None}
+    # 續傳的頁面沒有建立回應，改用 Notion 以頁面 ID 組成的網址 (與回應中的 url 指向同一頁)
+    page_url = f"https://www.notion.so/{page_id.replace('-', '')}" if page_id else ""
+    if page_id is None:
+        page = _post_page(client, course_name, week_num, body, journal, key)
+        if page is None:
+            entry["status"] = "failed"
+            return entry
+        entry["page_id"], entry["status"] = page.get("id"), "created"
+        page_url = page.get("url") or ""
+
+    if fused is not None and fused["notes_db_id"] and not fused["notes_journal"].is_completed((entry["page_id"],)):
+        from create_notes import create_note_for_course_page
+        # 以剛送出的內容組成課程頁面，不必再查詢資料庫
+        course_page = {"id": entry["page_id"], "url": page_url, "properties": {
+            "課程名稱": {"title": [{"text": {"content": course_name}}]}, "週次": {"number": week_num},
+            "課程日期與提醒": {"date": {"start": start_iso, "end": end_iso}}}}
+        entry["note"] = create_note_for_course_page(client, course_page, fused["notes_db_id"], fused["semester_name"],
+                                                    None, fused["notes_journal"], fused["note_template"])
+    return entry
+
+def _run_concurrently(func, jobs, max_workers):
+    """以有限併發執行 jobs，回傳 (結果列表, 耗時秒數)。"""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(lambda job: func(*job), jobs))
+    return results, time.perf_counter() - started
+
+def run_streaming(func, items, max_workers=DEFAULT_MAX_WORKERS, max_pending=None):
+    """邊取得邊執行：items 可為產生器 (例如分頁查詢)，每取得一項就交給執行緒池處理。
+
+    排隊中的工作最多 max_pending 個 (預設為 2 × max_workers)，生產端會被擋住而不會無限堆積。
+    回傳 (依完成順序排列的結果列表, 耗時秒數)；任一工作拋出例外時，等其餘工作結束後重新拋出。
+    """
+    slots = threading.BoundedSemaphore(max_pending or max_workers * 2)
+    results, errors = [], []
+    lock = threading.Lock()
+
+    def on_done(future):
+        slots.release()
+        with lock:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                errors.append(e)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for item in items:
+            slots.acquire()
+            executor.submit(func, item).add_done_callback(on_done)
+    if errors:
+        raise errors[0]
+    return results, time.perf_counter() - started
+
+@run_metrics.timed("upload.total")
+def upload_courses_to_notion(api_key, database_id, courses_data, semester_name, max_workers=DEFAULT_MAX_WORKERS,
+                             resume=False, notes_db_id=None, reminder_window_days=None, reminder_minutes=None,
+                             note_template=None, add_missing_options=True):
+    """將處理好的課程資料列表，以有限併發上傳到指定的 Notion 資料庫。
+
+    每個建立成功的週次頁面 (以 course_page_key 識別) 都會寫入檢查點日誌；resume=True 時跳過日誌中
+    已完成的週次，只重送失敗或尚未送出的頁面。
+
+    融合模式：傳入 notes_db_id 時，每個課程頁面建立後立即建立對應的筆記；傳入
+    reminder_window_days 時，日期落在未來該天數內的課程在建立時就直接帶上提醒，
+    省去之後筆記與提醒任務的整庫查詢與第二輪寫入。note_template 為筆記內容範本 (NoteTemplate)。
+
+    送出前會以快取的資料庫結構在本地驗證所有頁面 payload；不符時不送出任何請求，全部計為失敗。
+    缺少的 select 選項在 add_missing_options=True 時以一次 schema PATCH 補上。
+
+    回傳 {"pages": [每個週次的結果字典], "created", "resumed", "failed", "notes_created",
+          "notes_failed", "reminders", "elapsed"}；每個結果字典含 course_code、week、page_id、
+    start、end、has_reminder、status ("created"/"resumed"/"failed") 與 note。
+    """
     print(f"\n▶️  notion_uploader: 準備將「{semester_name}」學期的課程上傳到 Notion...")
-    
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json", "Notion-Version": "2022-06-28"}
-    
-    total_created_count = 0
+
+    client = get_client(api_key)
+    journal = CheckpointJournal(journal_path("upload", database_id, semester_name))
+    fused = None
+    if notes_db_id:
+        fused = {"notes_db_id": notes_db_id, "semester_name": semester_name, "note_template": note_template,
+                 "notes_journal": CheckpointJournal(journal_path("notes", notes_db_id, semester_name))}
+    if resume:
+        done = journal.load()
+        if fused is not None:
+            fused["notes_journal"].load()
+        print(f"   🔁 續傳模式：檢查點日誌中已有 {done} 個完成的頁面 (先前失敗 {journal.failed_count} 個)。")
+    else:
+        journal.reset()
+        if fused is not None:
+            fused["notes_journal"].reset()
+
+    reminder = None
+    if reminder_window_days:
+        from add_reminders import build_reminder, DEFAULT_REMINDER_MINUTES
+        reminder = build_reminder(reminder_minutes or DEFAULT_REMINDER_MINUTES)
+        window_start = datetime.now()
+        window_end = window_start + timedelta(days=reminder_window_days)
+
+    jobs = []
+    samples = []
+    skipped = 0
     for course in courses_data:
         # [核心修改] 直接使用純課程名稱
         course_name = course.get("課程名稱", "無標題課程")
+        course_code = course.get("課程代碼", "")
         print(f"   正在處理課程: {course_name}")
 
-        for i, date_info in enumerate(course.get("重複日期列表", [])):
-            week_num = i + 1
-            # 標題不再加上週次資訊
-            page_title = course_name 
-            
-            date_payload = {"start": date_info["start"], "end": date_info["end"], "time_zone": "Asia/Taipei"}
-
-            new_page_payload = {
-                "parent": {"database_id": database_id},
-                "properties": {
-                    "課程名稱": {"title": [{"text": {"content": page_title}}]},
-                    "課程日期與提醒": {"date": date_payload},
-                    "學期": {"select": {"name": semester_name}},
-                    "週次": {"number": week_num},
-                    "課程代碼": {"rich_text": [{"text": {"content": course.get("課程代碼", "")}}]},
-                    "授課教師": {"rich_text": [{"text": {"content": course.get("授課教師", "")}}]},
-                    "上課教室": {"rich_text": [{"text": {"content": course.get("上課教室", "")}}]},
-                    "學分": {"rich_text": [{"text": {"content": course.get("學分", "")}}]},
-                    "必選修": {"select": {"name": course.get("必選修", "選")}},
-                    "星期": {"rich_text": [{"text": {"content": course.get("星期", "")}}]},
-                    "開始時間": {"rich_text": [{"text": {"content": course.get("開始時間", "")}}]},
-                    "結束時間": {"rich_text": [{"text": {"content": course.get("結束時間", "")}}]},
-                }
-            }
-            
-            create_url = "https://api.notion.com/v1/pages"
-            try:
-                response = requests.post(create_url, headers=headers, data=json.dumps(new_page_payload, ensure_ascii=False).encode('utf-8'))
-                if response.status_code == 200:
-                    total_created_count += 1
+        template = None
+        for week_num, start_iso, end_iso in iter_course_slots(course):
+            key = course_page_key(course, week_num)
+            page_id = journal.completed_page_id(key)
+            if page_id is not None and (fused is None or fused["notes_journal"].is_completed((page_id,))):
+                skipped += 1
+                continue
+            if template is None:
+                # 靜態屬性每門課只組一次；schema 驗證也只需每門課一份樣本
+                template = CoursePayloadTemplate(course, semester_name, database_id, reminder)
+                samples.append(build_course_page_properties(course, semester_name, week_num,
+                                                            {"start": start_iso, "end": end_iso}))
+            with_reminder = (reminder is not None and
+                             window_start <= datetime.fromisoformat(start_iso[:19]) <= window_end)
+            body = template.render(week_num, start_iso, end_iso, with_reminder)
+            jobs.append((client, course_name, week_num, body, (start_iso, end_iso, with_reminder), journal, key,
+                         page_id, fused))
+
+    if skipped:
+        run_metrics.incr("upload.resumed_skip", skipped)
+        print(f"   已略過 {skipped} 個先前完成的頁面。")
+
+    schema_ok = check_payload_schema(client, database_id, samples, add_missing_options, label="課程資料庫")
+    if schema_ok and fused is not None and jobs:
+        from create_notes import sample_note_properties
+        schema_ok = check_payload_schema(client, notes_db_id, [sample_note_properties(notes_db_id, semester_name)],
+                                         add_missing_options, label="筆記資料庫")
+    if not schema_ok:
+        return {"pages": [], "created": 0, "resumed": skipped, "failed": len(jobs), "notes_created": 0,
+                "notes_failed": 0, "reminders": 0, "elapsed": 0.0}
+
+    mode = "，並同時建立筆記" if fused is not None else ""
+    print(f"   共 {len(jobs)} 個頁面，以 {max_workers} 個併發連線上傳{mode} (限速 {client.limiter.rate:g} 次/秒)...")
+    try:
+        with journal:
+            entries, elapsed = _run_concurrently(_upload_occurrence, jobs, max_workers)
+    finally:
+        if fused is not None:
+            fused["notes_journal"].close()
+    run_metrics.observe("upload.write_phase", elapsed)
+
+    result = {
+        "pages": entries,
+        "created": sum(1 for e in entries if e["status"] == "created"),
+        "resumed": skipped + sum(1 for e in entries if e["status"] == "resumed"),
+        "failed": sum(1 for e in entries if e["status"] == "failed"),
+        "notes_created": sum(1 for e in entries if e["note"] == "created"),
+        "notes_failed": sum(1 for e in entries if e["note"] == "failed"),
+        "reminders": sum(1 for e in entries if e["status"] == "created" and e["has_reminder"]),
+        "elapsed": elapsed,
+    }
+    if result["failed"] == 0 and result["notes_failed"] == 0:
+        # 全部成功時刪除日誌，下次執行不會被誤認為中斷的批次而跳過所有週次
+        journal.finish()
+        if fused is not None:
+            fused["notes_journal"].finish()
+    throughput = len(jobs) / elapsed if elapsed > 0 else 0.0
+    print(f"\n✅ notion_uploader: 上傳完畢，共成功建立了 {result['created']} 堂課。")
+    if fused is not None:
+        print(f"   📝 同時建立了 {result['notes_created']} 則筆記，{result['reminders']} 堂近期課程已直接帶上提醒。")
+    if result["failed"] or result["notes_failed"]:
+        print(f"   ⚠️  有 {result['failed']} 個頁面、{result['notes_failed']} 則筆記失敗，可以續傳模式重新執行以只補送這些項目。")
+    print(f"   ⏱️  總耗時 {elapsed:.1f} 秒，吞吐量 {throughput:.2f} 頁/秒。")
+    client.print_latency_report()
+    return result
+
+# --- 同步模式 ---
+
+# Notion 複合篩選條件的 or 陣列上限
+MAX_FILTER_CONDITIONS = 100
+
+def _course_page_queries(semester_name, course_codes=None):
+    """組出查詢某學期課程頁面的篩選條件；指定 course_codes 時只查這些課程 (每 100 個代碼一次查詢)。"""
+    semester_filter = {"property": "學期", "select": {"equals": semester_name}}
+    if course_codes is None:
+        return [{"filter": semester_filter}]
+    codes = sorted(course_codes)
+    return [{"filter": {"and": [semester_filter, {"or": [
+                {"property": "課程代碼", "rich_text": {"equals": code}}
+                for code in codes[i:i + MAX_FILTER_CONDITIONS]]}]}}
+            for i in range(0, len(codes), MAX_FILTER_CONDITIONS)]
+
+def fetch_existing_course_pages(client, database_id, semester_name, course_codes=None):
+    """一次查出該學期既有課程頁面，回傳 ({course_page_key: page}, 重複頁面列表)。
+
+    指定 course_codes 時只查詢這些課程的頁面。
+    """
+    existing, duplicates = {}, []
+    for query in _course_page_queries(semester_name, course_codes):
+        for page in client.query_database(database_id, query):
+            key = _page_key(page)
+            if key in existing:
+                duplicates.append(page)
+            else:
+                existing[key] = page
+    return existing, duplicates
+
+def plan_semester_sync(existing_pages, duplicate_pages, courses_data, semester_name):
+    """比對既有頁面與最新課表，產生同步計畫。
+
+    頁面以 course_page_key 對應；時段異動 (調課) 的週次沒有完全相同的鍵，改把同一課程同一週
+    剩下的既有頁面依序拿來更新，而不是封存後重建 (保留提醒與筆記關聯)。
+    回傳 {"create": [(key, properties)], "update": [(page_id, key, 變更的 properties)],
+          "archive": [(page_id, key)], "unchanged": 數量}。
+    """
+    plan = {"create": [], "update": [], "archive": [], "unchanged": 0}
+    wanted_keys, unmatched = set(), {}
+    for course in courses_data:
+        for week_num, date_info in iter_course_occurrences(course):
+            key = course_page_key(course, week_num)
+            wanted_keys.add(key)
+            properties = build_course_page_properties(course, semester_name, week_num, date_info)
+            page = existing_pages.get(key)
+            if page is None:
+                unmatched.setdefault(key[:2], []).append((key, properties))
+            else:
+                _plan_page_update(plan, page, key, properties)
+
+    leftovers = {}
+    for key in sorted(key for key in existing_pages if key not in wanted_keys):
+        leftovers.setdefault(key[:2], []).append(existing_pages[key])
+    for code_week, rows in unmatched.items():
+        pages = leftovers.get(code_week, [])
+        for key, properties in rows:
+            if pages:
+                _plan_page_update(plan, pages.pop(0), key, properties)
+            else:
+                plan["create"].append((key, properties))
+    for pages in leftovers.values():
+        plan["archive"].extend((page["id"], _page_key(page)) for page in pages)
+    plan["archive"].extend((page["id"], _page_key(page)) for page in duplicate_pages)
+    return plan
+
+def _plan_page_update(plan, page, key, properties):
+    """比對既有頁面與最新屬性，有差異時加入更新清單。"""
+    current = page.get("properties", {})
+    changed = {name: prop for name, prop in properties.items()
+               if property_value(current.get(name)) != property_value(prop)}
+    if not changed:
+        plan["unchanged"] += 1
+        return
+    # 日期變動時保留使用者已設定的提醒
+    current_date = (current.get("課程日期與提醒") or {}).get("date") or {}
+    if "課程日期與提醒" in changed and current_date.get("reminder"):
+        changed["課程日期與提醒"]["date"]["reminder"] = current_date["reminder"]
+    plan["update"].append((page["id"], key, changed))
+
+def _send_sync_operation(client, action, path, payload, key, database_id=None, cache=None):
+    """執行同步計畫中的單一操作，成功回傳 True；有 cache 時一併更新本地鏡像。"""
+    try:
+        response = client.request("POST" if action == "create" else "PATCH", path, payload)
+        if response.status_code == 200:
+            run_metrics.incr(f"sync.{action}")
+            if cache is not None:
+                page = response.json()
+                if action == "archive":
+                    cache.delete_page(page.get("id") or path.rsplit("/", 1)[-1])
                 else:
-                    # 在錯誤訊息中也使用純標題
-                    print(f"   ❌ 新增 '{page_title}' (第{week_num}週) 失敗, 原因: {response.text}")
-                time.sleep(0.4) 
-            except requests.exceptions.RequestException as e:
-                print(f"   ❌ 發生網路錯誤: {e}")
+                    cache.upsert_page(database_id, page)
+            return True
+        if cache is not None and action != "create" and is_gone_response(response):
+            # 頁面已在 Notion 上被封存或刪除，鏡像中的列不會再被增量更新帶到
+            cache.delete_page(path.rsplit("/", 1)[-1])
+        run_metrics.incr("sync.failed")
+        print(f"   ❌ {action} {key[0]} (第{key[1]}週) 失敗, 原因: {response.text}")
+    except requests.exceptions.RequestException as e:
+        run_metrics.incr("sync.failed")
+        print(f"   ❌ 發生網路錯誤: {e}")
+    return False
+
+def execute_sync_plan(client, database_id, plan, max_workers=DEFAULT_MAX_WORKERS, cache=None):
+    """以有限併發執行同步計畫，回傳各類操作的成功數。"""
+    jobs = []
+    for key, properties in plan["create"]:
+        jobs.append((client, "create", "/v1/pages", {"parent": {"database_id": database_id}, "properties": properties},
+                     key, database_id, cache))
+    for page_id, key, properties in plan["update"]:
+        jobs.append((client, "update", f"/v1/pages/{page_id}", {"properties": properties}, key, database_id, cache))
+    for page_id, key in plan["archive"]:
+        jobs.append((client, "archive", f"/v1/pages/{page_id}", {"archived": True}, key, database_id, cache))
+
+    results, elapsed = _run_concurrently(_send_sync_operation, jobs, max_workers)
+    counts = {"create": 0, "update": 0, "archive": 0}
+    for job, ok in zip(jobs, results):
+        if ok:
+            counts[job[1]] += 1
+    return counts, elapsed
+
+@run_metrics.timed("sync.total")
+def sync_courses_to_notion(api_key, database_id, courses_data, semester_name, max_workers=DEFAULT_MAX_WORKERS,
+                           only_codes=None, add_missing_options=True, cache=None):
+    """冪等同步：只對與 Notion 現況有差異的週次頁面進行建立、更新或封存。
+
+    only_codes 為與上次課表快照比對出的受影響課程代碼 (新增、退選、異動)；指定時只查詢並寫入
+    這些課程的頁面，其餘課程的頁面完全不碰。查詢前先以快取的資料庫結構在本地驗證 payload。
+    cache 為 NotionCache 時，寫入結果 (含封存) 會同步反映到本地鏡像。
+    """
+    print(f"\n▶️  notion_uploader: 以同步模式比對「{semester_name}」學期的 Notion 課程頁面...")
+    if only_codes is not None:
+        if not only_codes:
+            print("✅ notion_uploader: 課表與上次快照相比沒有任何課程異動，無需任何寫入。")
+            return True
+        courses_data = [course for course in courses_data if course.get("課程代碼", "") in only_codes]
+        print(f"   只比對受影響的 {len(only_codes)} 門課程。")
+    client = get_client(api_key)
+    wanted_properties = [build_course_page_properties(course, semester_name, week_num, date_info)
+                         for course in courses_data for week_num, date_info in iter_course_occurrences(course)]
+    if not check_payload_schema(client, database_id, wanted_properties, add_missing_options, label="課程資料庫"):
+        return False
+
+    try:
+        with run_metrics.span("sync.fetch_existing"):
+            existing, duplicates = fetch_existing_course_pages(client, database_id, semester_name, only_codes)
+    except requests.exceptions.RequestException as e:
+        print(f"❌ 查詢既有課程頁面時發生錯誤: {e}")
+        return False
+    print(f"   Notion 上已有 {len(existing) + len(duplicates)} 個頁面 (其中重複 {len(duplicates)} 個)。")
+
+    plan = plan_semester_sync(existing, duplicates, courses_data, semester_name)
+    print(f"   同步計畫: 新增 {len(plan['create'])}、更新 {len(plan['update'])}、"
+          f"封存 {len(plan['archive'])}、不變 {plan['unchanged']}。")
+    if not (plan["create"] or plan["update"] or plan["archive"]):
+        print("✅ notion_uploader: Notion 已是最新狀態，無需任何寫入。")
+        return True
 
-    print(f"\n✅ notion_uploader: 上傳完畢，共成功建立了 {total_created_count} 堂課。")
\ No newline at end of file
+    counts, elapsed = execute_sync_plan(client, database_id, plan, max_workers, cache)
+    run_metrics.observe("sync.write_phase", elapsed)
+    print(f"\n✅ notion_uploader: 同步完畢，新增 {counts['create']}、更新 {counts['update']}、封存 {counts['archive']} 個頁面。")
+    print(f"   ⏱️  寫入耗時 {elapsed:.1f} 秒。")
+    client.print_latency_report()
+    return True
@@ -1,103 +1,437 @@
 import csv
+import importlib.util
 import re
 import os
 from datetime import datetime, timedelta
-from bs4 import BeautifulSoup
 
-# ... (remove_text_in_parentheses, get_time_from_period, format_class_time_to_dict, generate_recurring_dates 函式維持不變) ...
+from collections import namedtuple
+from collections.abc import Mapping
+from functools import lru_cache
+
+import run_metrics
+
 def remove_text_in_parentheses(text):
     return re.sub(r'\(.*?\)|（.*?）', '', text).strip()
+
+# --- 排課引擎 ---
+# 節次對照表預先計算為 {節次: (開始分鐘, 結束分鐘)}，以一天中的分鐘數表示。
+# 預設為東華大學的作息：第 1 節 06:10 開始，每節間隔 60 分鐘、上課 50 分鐘。
+DAY_NAMES = {'一': '週一', '二': '週二', '三': '週三', '四': '週四', '五': '週五', '六': '週六', '日': '週日'}
+DAY_INDEX = {'一': 0, '二': 1, '三': 2, '四': 3, '五': 4, '六': 5, '日': 6}
+
+# day_char: 星期字元；weekday: 0=週一 (無法辨識時為 None)；start/end: 一天中的分鐘數
+TimeSlot = namedtuple('TimeSlot', ['day_char', 'weekday', 'start', 'end'])
+
+def _to_minutes(hhmm):
+    hours, minutes = hhmm.strip().split(':')
+    return int(hours) * 60 + int(minutes)
+
+def _format_minutes(minutes, with_seconds=False):
+    text = f"{minutes // 60:02d}:{minutes % 60:02d}"
+    return text + ":00" if with_seconds else text
+
+def build_period_table(first_start="06:10", period_minutes=60, class_minutes=50, last_period=16, overrides=None):
+    """依作息規則預先計算節次對照表；overrides 可用 {節次: "HH:MM-HH:MM"} 覆寫個別節次。"""
+    first = _to_minutes(first_start)
+    table = {period: (first + (period - 1) * period_minutes, first + (period - 1) * period_minutes + class_minutes)
+             for period in range(1, last_period + 1)}
+    for period, span in (overrides or {}).items():
+        begin, finish = span.split('-')
+        table[int(period)] = (_to_minutes(begin), _to_minutes(finish))
+    return table
+
+PERIOD_TABLE = build_period_table()
+
+def set_period_table(table):
+    """替換目前使用的節次對照表 (例如其他校區的作息)，並清除所有依賴它的快取。"""
+    global PERIOD_TABLE
+    PERIOD_TABLE = dict(table)
+    parse_time_slot.cache_clear()
+    _base_recurrence.cache_clear()
+
+def period_table_from_config(config):
+    """由 config.txt 的 PERIOD_FIRST_START、PERIOD_MINUTES、CLASS_MINUTES、PERIOD_TIMES 建立節次對照表。
+
+    PERIOD_TIMES 格式例如 "1=08:10-09:00,2=09:10-10:00"，用於覆寫個別節次。
+    """
+    overrides = {}
+    for item in (config.get("PERIOD_TIMES") or "").split(','):
+        if '=' in item:
+            period, span = item.split('=', 1)
+            overrides[period.strip()] = span.strip()
+    return build_period_table(
+        first_start=config.get("PERIOD_FIRST_START") or "06:10",
+        period_minutes=int(config.get("PERIOD_MINUTES") or 60),
+        class_minutes=int(config.get("CLASS_MINUTES") or 50),
+        overrides=overrides,
+    )
+
+def configure_schedule(config):
+    """套用 config.txt 中的作息設定 (若有) 並檢查 PARSER_BACKEND，回傳 EXCLUDE_DATES 解析後的停課日。"""
+    if config.get("PARSER_BACKEND"):
+        config["PARSER_BACKEND"] = resolve_parser_backend(config["PARSER_BACKEND"])
+    if any(config.get(key) for key in ("PERIOD_FIRST_START", "PERIOD_MINUTES", "CLASS_MINUTES", "PERIOD_TIMES")):
+        set_period_table(period_table_from_config(config))
+    return parse_exclusion_dates(config.get("EXCLUDE_DATES"))
+
 def get_time_from_period(period):
-    base_time = datetime.strptime("06:10", "%H:%M")
-    delta_minutes = (int(period) - 1) * 60
-    return base_time + timedelta(minutes=delta_minutes)
+    return datetime(1900, 1, 1) + timedelta(minutes=PERIOD_TABLE[int(period)][0])
+
+@lru_cache(maxsize=1024)
+def parse_time_slot(time_str):
+    """將 "三9/三10/三11" 這類上課時間字串解析為 TimeSlot；空字串或格式錯誤時回傳 None。"""
+    parts = time_str.strip().strip('/').split('/')
+    try:
+        day_char = parts[0][0]
+        periods = [int(p[1:]) for p in parts]
+        start, end = PERIOD_TABLE[min(periods)][0], PERIOD_TABLE[max(periods)][1]
+    except (ValueError, IndexError, KeyError):
+        return None
+    return TimeSlot(day_char, DAY_INDEX.get(day_char), start, end)
+
 def format_class_time_to_dict(time_str):
     if not time_str.strip(): return {"weekday": "未排定", "start_time": "", "end_time": ""}
-    parts = time_str.strip('/').split('/')
-    day_map = {'一': '週一', '二': '週二', '三': '週三', '四': '週四', '五': '週五', '六': '週六', '日': '週日'}
-    try:
-        day_char = parts[0][0]; day_chinese = day_map.get(day_char, "未知")
-        periods = [int(p[1:]) for p in parts]; start_period, end_period = min(periods), max(periods)
-        start_time = get_time_from_period(start_period); end_time = get_time_from_period(end_period) + timedelta(minutes=50)
-        return {"weekday": day_chinese, "start_time": start_time.strftime('%H:%M'), "end_time": end_time.strftime('%H:%M')}
-    except (ValueError, IndexError): return {"weekday": time_str, "start_time": "", "end_time": ""}
-def generate_recurring_dates(time_str, semester_start_str, semester_end_str):
+    slot = parse_time_slot(time_str)
+    if slot is None: return {"weekday": time_str, "start_time": "", "end_time": ""}
+    return {"weekday": DAY_NAMES.get(slot.day_char, "未知"), "start_time": _format_minutes(slot.start), "end_time": _format_minutes(slot.end)}
+
+@lru_cache(maxsize=4096)
+def _base_recurrence(weekday, start, end, semester_start_str, semester_end_str):
+    """計算 (時段, 學期) 的所有上課日，回傳 ((日期, 開始ISO, 結束ISO, 週次), ...)；結果會被快取。"""
+    semester_start = datetime.strptime(semester_start_str, "%Y-%m-%d").date()
+    semester_end = datetime.strptime(semester_end_str, "%Y-%m-%d").date()
+    start_text, end_text = _format_minutes(start, True), _format_minutes(end, True)
+    current_date = semester_start + timedelta(days=(weekday - semester_start.weekday()) % 7)
+    occurrences = []
+    while current_date <= semester_end:
+        day = current_date.isoformat()
+        week = (current_date - semester_start).days // 7 + 1
+        occurrences.append((day, f"{day}T{start_text}", f"{day}T{end_text}", week))
+        current_date += timedelta(days=7)
+    return tuple(occurrences)
+
+def parse_exclusion_dates(spec):
+    """解析停課日設定，例如 "2025-10-10,2025-11-03~2025-11-07"，回傳日期字串 (YYYY-MM-DD) 的 frozenset。"""
+    dates = set()
+    for item in (spec or "").split(','):
+        item = item.strip()
+        if not item:
+            continue
+        if '~' in item:
+            first, last = (datetime.strptime(d.strip(), "%Y-%m-%d").date() for d in item.split('~', 1))
+            while first <= last:
+                dates.add(first.isoformat())
+                first += timedelta(days=1)
+        else:
+            dates.add(datetime.strptime(item, "%Y-%m-%d").date().isoformat())
+    return frozenset(dates)
+
+def generate_recurring_dates(time_str, semester_start_str, semester_end_str, exclude_dates=None):
+    """產生學期內每週的上課時段 [{"start", "end", "week"}]；落在 exclude_dates 的日期會被略過，週次不變。"""
     if not time_str.strip(): return []
     try:
-        semester_start = datetime.strptime(semester_start_str, "%Y-%m-%d"); semester_end = datetime.strptime(semester_end_str, "%Y-%m-%d")
+        datetime.strptime(semester_start_str, "%Y-%m-%d"); datetime.strptime(semester_end_str, "%Y-%m-%d")
     except ValueError: print("❌ 錯誤：學期起訖日期格式不正確。"); return []
-    parts = time_str.strip('/').split('/'); day_map_index = {'一': 0, '二': 1, '三': 2, '四': 3, '五': 4, '六': 5, '日': 6}
+    slot = parse_time_slot(time_str)
+    if slot is None or slot.weekday is None: return []
+    occurrences = _base_recurrence(slot.weekday, slot.start, slot.end, semester_start_str, semester_end_str)
+    excluded = exclude_dates or ()
+    return [{"start": start_iso, "end": end_iso, "week": week}
+            for day, start_iso, end_iso, week in occurrences if day not in excluded]
+
+class Course(Mapping):
+    """精簡的課程紀錄：欄位存在 __slots__ 中，每週上課日在需要時才由快取的學期排程逐一產生。
+
+    可當作唯讀字典以原本的中文欄位名稱存取 (course["課程代碼"]、course.get(...)、dict(course))；
+    只有存取「重複日期列表」時才會組出 [{"start", "end", "week"}] 列表。
+    """
+    __slots__ = ("code", "name", "category", "teacher", "weekday", "start_time", "end_time", "room", "credits",
+                 "_recurrence", "_excluded")
+    # 中文欄位名稱 → 屬性名稱，順序與 CSV 及舊版字典一致
+    FIELDS = {"課程代碼": "code", "課程名稱": "name", "必選修": "category", "授課教師": "teacher", "星期": "weekday",
+              "開始時間": "start_time", "結束時間": "end_time", "重複日期列表": None, "上課教室": "room", "學分": "credits"}
+
+    def __init__(self, code, name, category, teacher, weekday, start_time, end_time, room, credits,
+                 recurrence=(), excluded=frozenset()):
+        self.code, self.name, self.category, self.teacher = code, name, category, teacher
+        self.weekday, self.start_time, self.end_time = weekday, start_time, end_time
+        self.room, self.credits = room, credits
+        # recurrence 為 _base_recurrence 的快取結果，同一時段的課程共用同一個 tuple
+        self._recurrence = recurrence
+        self._excluded = excluded
+
+    def iter_occurrences(self):
+        """逐一產出 (週次, 開始ISO, 結束ISO)，略過停課日，不建立任何中間列表。"""
+        excluded = self._excluded
+        for day, start_iso, end_iso, week in self._recurrence:
+            if day not in excluded:
+                yield week, start_iso, end_iso
+
+    def excluding(self, exclude_dates):
+        """回傳額外套用 exclude_dates 停課日的新紀錄 (共用同一份排程)。"""
+        return Course(self.code, self.name, self.category, self.teacher, self.weekday, self.start_time,
+                      self.end_time, self.room, self.credits, self._recurrence,
+                      self._excluded | frozenset(exclude_dates))
+
+    def __getitem__(self, key):
+        attr = self.FIELDS[key]
+        if attr is None:
+            return [{"start": start_iso, "end": end_iso, "week": week} for week, start_iso, end_iso in self.iter_occurrences()]
+        return getattr(self, attr)
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def __repr__(self):
+        return f"Course({self.code!r}, {self.name!r}, {self.weekday} {self.start_time}-{self.end_time})"
+
+def build_course(code, name, category, teacher, time_str, room, credits, semester_start_str, semester_end_str,
+                 exclude_dates=None):
+    """由課表欄位建立 Course；上課時間無法解析或學期日期錯誤時，該課程沒有任何上課日。"""
+    details = format_class_time_to_dict(time_str)
+    recurrence = ()
+    slot = parse_time_slot(time_str) if time_str.strip() else None
+    if slot is not None and slot.weekday is not None:
+        try:
+            recurrence = _base_recurrence(slot.weekday, slot.start, slot.end, semester_start_str, semester_end_str)
+        except ValueError:
+            print("❌ 錯誤：學期起訖日期格式不正確。")
+    return Course(code, name, category, teacher, details.get("weekday"), details.get("start_time"),
+                  details.get("end_time"), room, credits, recurrence, frozenset(exclude_dates or ()))
+
+def exclude_course_dates(courses_data, exclude_dates):
+    """為已處理好的課程套用停課日，不需重新解析或重新產生重複日期。"""
+    excluded = frozenset(exclude_dates)
+    return [course.excluding(excluded) if isinstance(course, Course) else
+            dict(course, 重複日期列表=[d for d in course.get("重複日期列表", []) if d["start"][:10] not in excluded])
+            for course in courses_data]
+
+# --- 課表解析後端 ---
+# 每個後端回傳表格中每一列的儲存格，儲存格為 (原始文字, 逐段 strip 後串接的文字)，
+# 分別對應 BeautifulSoup 的 get_text() 與 get_text(strip=True)。
+GRID_TABLE_ID = "ContentPlaceHolder1_grd_selects"
+_TABLE_TAG_PATTERN = re.compile(r'<(/?)table\b', re.IGNORECASE)
+
+def slice_grid_table(page_source):
+    """直接切出課程表格的 HTML 片段 (含巢狀表格)，找不到時回傳 None。"""
+    id_pos = page_source.find(f'id="{GRID_TABLE_ID}"')
+    if id_pos < 0:
+        return None
+    start = page_source.rfind('<table', 0, id_pos)
+    if start < 0:
+        return None
+    depth = 0
+    for match in _TABLE_TAG_PATTERN.finditer(page_source, start):
+        depth += -1 if match.group(1) else 1
+        if depth == 0:
+            end = page_source.find('>', match.end())
+            return page_source[start:end + 1 if end >= 0 else len(page_source)]
+    return page_source[start:]
+
+def _rows_selectolax(fragment):
+    from selectolax.lexbor import LexborHTMLParser
+    table = LexborHTMLParser(fragment).css_first(f'table#{GRID_TABLE_ID}')
+    if table is None:
+        return None
+    return [[(td.text(strip=False), td.text(strip=True)) for td in tr.css('td')] for tr in table.css('tr')]
+
+def _rows_lxml(fragment):
+    import lxml.html
+    tables = lxml.html.fromstring(fragment).xpath('//table[@id=$table_id]', table_id=GRID_TABLE_ID)
+    if not tables:
+        return None
+    rows = []
+    for tr in tables[0].iter('tr'):
+        cells = []
+        for td in tr.iter('td'):
+            texts = list(td.itertext())
+            cells.append((''.join(texts), ''.join(t.strip() for t in texts)))
+        rows.append(cells)
+    return rows
+
+def _rows_bs4(fragment):
+    from bs4 import BeautifulSoup
+    table = BeautifulSoup(fragment, 'html.parser').find('table', id=GRID_TABLE_ID)
+    if not table:
+        return None
+    return [[(td.get_text(), td.get_text(strip=True)) for td in tr.find_all('td')] for tr in table.find_all('tr')]
+
+# 依優先順序排列：C 實作的解析器優先，BeautifulSoup 為最後的備援
+PARSER_BACKENDS = {"selectolax": _rows_selectolax, "lxml": _rows_lxml, "bs4": _rows_bs4}
+
+def available_parser_backends():
+    """回傳目前環境中可匯入的解析後端名稱 (依優先順序)。"""
+    # 只以 find_spec 檢查頂層套件是否已安裝而不實際匯入，真正用到的後端在解析時才載入
+    available = []
+    for name in PARSER_BACKENDS:
+        if importlib.util.find_spec(name) is not None:
+            available.append(name)
+    return available
+
+def resolve_parser_backend(backend):
+    """檢查 PARSER_BACKEND 設定：不認得或未安裝的後端印出警告並改用 'auto'，回傳實際要用的設定值。"""
+    backend = (backend or "auto").strip().lower()
+    if backend == "auto":
+        return backend
+    if backend not in PARSER_BACKENDS:
+        print(f"⚠️ 不認得的 PARSER_BACKEND「{backend}」(可用: auto、{'、'.join(PARSER_BACKENDS)})，改為自動選擇。")
+        return "auto"
+    if backend not in available_parser_backends():
+        print(f"⚠️ PARSER_BACKEND「{backend}」所需的套件未安裝，改為自動選擇。")
+        return "auto"
+    return backend
+
+def extract_grid_rows(page_source, backend="auto"):
+    """解析課程表格的所有列 (含標題列)，找不到表格時回傳 None。
+
+    backend 為 'auto' 時依 selectolax → lxml → bs4 的順序採用第一個可用的後端；
+    無效的 backend 會先經 resolve_parser_backend 警告並改為 'auto'。
+    """
+    fragment = slice_grid_table(page_source)
+    if fragment is None:
+        return None
+    backend = resolve_parser_backend(backend)
+    if backend == "auto":
+        candidates = available_parser_backends()
+        if not candidates:
+            raise ImportError("找不到任何 HTML 解析套件 (selectolax、lxml 或 beautifulsoup4)。")
+        backend = candidates[0]
+    return PARSER_BACKENDS[backend](fragment)
+
+
+# --- 課表 CSV 快照與變動比對 ---
+CSV_HEADERS = ["課程代碼", "課程名稱", "必選修", "授課教師", "星期", "開始時間", "結束時間", "上課教室", "學分"]
+# 比對時的欄位分組：時間異動需要改每週的日期，其餘只需改文字屬性
+CHANGE_FIELDS = {"time": ("星期", "開始時間", "結束時間"), "room": ("上課教室",), "teacher": ("授課教師",),
+                 "other": ("課程名稱", "必選修", "學分")}
+
+def snapshot_path(output_dir, semester_start):
+    return os.path.join(output_dir, f"{semester_start}_course_schedule.csv")
+
+def snapshot_rows(courses):
+    """將課程資料轉成與 CSV 快照相同的字串欄位列，供比對與雜湊。"""
+    return [{key: "" if course.get(key) is None else str(course.get(key)) for key in CSV_HEADERS} for course in courses]
+
+def load_schedule_snapshot(path):
+    """讀取上次產生的課表 CSV，回傳欄位列列表；檔案不存在或格式不符時回傳 None。"""
+    if not os.path.exists(path):
+        return None
     try:
-        target_weekday = day_map_index.get(parts[0][0]);
-        if target_weekday is None: return []
-        periods = [int(p[1:]) for p in parts]; start_period, end_period = min(periods), max(periods)
-        start_time = get_time_from_period(start_period); end_time = get_time_from_period(end_period) + timedelta(minutes=50)
-        recurring_dates = []; current_date = semester_start; days_ahead = target_weekday - current_date.weekday()
-        if days_ahead < 0: days_ahead += 7
-        current_date += timedelta(days=days_ahead)
-        while current_date <= semester_end:
-            start_iso = f"{current_date.strftime('%Y-%m-%d')}T{start_time.strftime('%H:%M:%S')}"
-            end_iso = f"{current_date.strftime('%Y-%m-%d')}T{end_time.strftime('%H:%M:%S')}"
-            recurring_dates.append({"start": start_iso, "end": end_iso}); current_date += timedelta(days=7)
-        return recurring_dates
-    except (ValueError, IndexError): return []
-
-
-def process_source_and_create_files(page_source, semester_start, semester_end):
-    """接收 page_source，解析資料，存成 CSV，並回傳結構化資料。"""
+        with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            if reader.fieldnames != CSV_HEADERS:
+                return None
+            return [dict(row) for row in reader]
+    except (OSError, csv.Error):
+        return None
+
+def diff_course_schedules(previous_rows, courses):
+    """以課程代碼比對上次快照與本次課表。
+
+    回傳 {"added": [代碼], "dropped": [代碼], "changed": {代碼: [異動類別]}, "unchanged": [代碼]}，
+    異動類別為 CHANGE_FIELDS 的鍵 (time、room、teacher、other)。
+    """
+    def group(rows):
+        # 同一課程代碼可能有多列 (例如一週上兩次)，以排序後的列表比較
+        grouped = {}
+        for row in rows:
+            grouped.setdefault(row.get("課程代碼", ""), []).append(row)
+        return grouped
+
+    def values(rows, fields):
+        return sorted(tuple(row.get(f, "") for f in fields) for row in rows)
+
+    previous = group(previous_rows)
+    current = group(snapshot_rows(courses))
+    diff = {"added": [], "dropped": [], "changed": {}, "unchanged": []}
+    for code, rows in current.items():
+        old = previous.get(code)
+        if old is None:
+            diff["added"].append(code)
+            continue
+        kinds = [kind for kind, fields in CHANGE_FIELDS.items() if values(old, fields) != values(rows, fields)]
+        if kinds:
+            diff["changed"][code] = kinds
+        else:
+            diff["unchanged"].append(code)
+    diff["dropped"] = [code for code in previous if code not in current]
+    return diff
+
+def affected_course_codes(diff):
+    """需要寫入 Notion 的課程代碼：新增、退選與有異動的課程。"""
+    return set(diff["added"]) | set(diff["dropped"]) | set(diff["changed"])
+
+def print_schedule_diff(diff):
+    labels = {"time": "時間", "room": "教室", "teacher": "教師", "other": "其他"}
+    print(f"   🔍 課表變動：新增 {len(diff['added'])} 門、退選 {len(diff['dropped'])} 門、"
+          f"異動 {len(diff['changed'])} 門、不變 {len(diff['unchanged'])} 門。")
+    for code in diff["added"]:
+        print(f"     ➕ {code}")
+    for code in diff["dropped"]:
+        print(f"     ➖ {code}")
+    for code, kinds in diff["changed"].items():
+        print(f"     ✏️  {code} ({'、'.join(labels[k] for k in kinds)})")
+
+@run_metrics.timed("process.total")
+def process_source_and_create_files(page_source, semester_start, semester_end, output_dir="course_schedule",
+                                    parser_backend="auto", exclude_dates=None, table_rows=None, write_csv=True):
+    """接收 page_source，解析資料，存成 CSV，並回傳結構化資料。
+
+    呼叫端若已解析過表格 (例如為了計算課表雜湊)，可直接傳入 table_rows 以免重複解析。
+    write_csv=False 時不寫出 CSV (試算模式不應覆寫上次成功上傳的課表快照)。
+    """
     print("\n▶️  process_courses: 開始解析 HTML 並產生所有學期內課程...")
-    soup = BeautifulSoup(page_source, 'html.parser')
-    table = soup.find('table', id='ContentPlaceHolder1_grd_selects')
-    if not table:
+    if table_rows is None:
+        with run_metrics.span("process.parse"):
+            table_rows = extract_grid_rows(page_source, parser_backend)
+    if table_rows is None:
         print("❌ process_courses: 錯誤，在 HTML 中找不到指定的課程表格。")
         return None
 
     processed_courses = []
-    rows = table.find_all('tr')[1:]
+    rows = table_rows[1:]
     if not rows:
         print("ℹ️  課程表格中沒有資料。")
         return []
 
-    final_headers = ["課程代碼", "課程名稱", "必選修", "授課教師", "星期", "開始時間", "結束時間", "上課教室", "學分"]
-    
-    for row in rows:
-        cols = row.find_all('td')
+    for cols in rows:
         if len(cols) < 8:
             continue
         
-        original_time_str = cols[5].get_text(strip=True)
-        time_details = format_class_time_to_dict(original_time_str)
-        
-        # [核心修改] 將 "星期幾" 改為 "星期"，以匹配 uploader
-        course_data = {
-            "課程代碼": cols[1].get_text(strip=True),
-            "課程名稱": remove_text_in_parentheses(cols[2].get_text()),
-            "必選修": cols[3].get_text(strip=True),
-            "授課教師": cols[4].get_text(strip=True).strip('/'),
-            "星期": time_details.get("weekday"), # 使用正確的鍵名 "星期"
-            "開始時間": time_details.get("start_time"),
-            "結束時間": time_details.get("end_time"),
-            "重複日期列表": generate_recurring_dates(original_time_str, semester_start, semester_end),
-            "上課教室": remove_text_in_parentheses(cols[6].get_text(strip=True)).strip('/'),
-            "學分": cols[7].get_text(strip=True),
-        }
-        processed_courses.append(course_data)
+        # 每個儲存格為 (原始文字, strip 後文字)；每週上課日在上傳時才逐一產生
+        processed_courses.append(build_course(
+            code=cols[1][1],
+            name=remove_text_in_parentheses(cols[2][0]),
+            category=cols[3][1],
+            teacher=cols[4][1].strip('/'),
+            time_str=cols[5][1],
+            room=remove_text_in_parentheses(cols[6][1]).strip('/'),
+            credits=cols[7][1],
+            semester_start_str=semester_start,
+            semester_end_str=semester_end,
+            exclude_dates=exclude_dates,
+        ))
         
     if not processed_courses:
         print("ℹ️  未處理任何課程資料。")
         return []
+    run_metrics.incr("process.courses", len(processed_courses))
+
+    if not write_csv:
+        print(f"✅ process_courses: 資料處理完成 (試算模式，未寫出 CSV)。")
+        return processed_courses
 
     # ... (儲存CSV的部分維持不變) ...
-    output_dir = "course_schedule"
     if not os.path.exists(output_dir): os.makedirs(output_dir)
-    output_filename = os.path.join(output_dir, f"{semester_start}_course_schedule.csv")
+    output_filename = snapshot_path(output_dir, semester_start)
     try:
-        with open(output_filename, 'w', newline='', encoding='utf-8-sig') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=final_headers)
+        with run_metrics.span("process.csv_write"), open(output_filename, 'w', newline='', encoding='utf-8-sig') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=CSV_HEADERS)
             writer.writeheader()
-            for course in processed_courses:
-                row_to_write = {key: course.get(key, '') for key in final_headers}
-                writer.writerow(row_to_write)
+            writer.writerows(snapshot_rows(processed_courses))
         print(f"✅ process_courses: 已將使用者檢查用的課表儲存至 {output_filename}")
     except IOError as e: print(f"❌ 寫入 CSV 檔案時發生錯誤: {e}")
 
@@ -0,0 +1,39 @@
+import threading
+import time
+
+# Notion 官方文件：每個整合平均約 3 次請求/秒，允許短暫爆發。
+NOTION_REQUESTS_PER_SECOND = 3.0
+NOTION_BURST = 3
+
+
+class TokenBucket:
+    """執行緒安全的權杖桶限流器：平均每秒補充 rate 個權杖，最多累積 capacity 個。"""
+
+    def __init__(self, rate=NOTION_REQUESTS_PER_SECOND, capacity=NOTION_BURST):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, tokens=1):
+        """取得權杖，不足時阻塞等待。回傳實際等待的秒數。"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                shortage = (tokens - self._tokens) / self.rate
+            time.sleep(shortage)
+            waited += shortage
+
+
+# 所有模組共用的 Notion 請求預算
+notion_limiter = TokenBucket()
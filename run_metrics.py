@@ -0,0 +1,164 @@
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+DEFAULT_METRICS_DIR = "metrics"
+
+
+class RunMetrics:
+    """單次執行的計時區段 (span)、計數器與延遲觀測值，可匯出為 JSON。"""
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = datetime.now()
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._timers = {}    # 名稱 -> {"count", "total", "max", "samples"}
+        self._counters = {}  # 名稱 -> 數值
+        self._live_thread = None
+        self._live_stop = threading.Event()
+
+    def observe(self, name, seconds):
+        """記錄一次耗時觀測值 (秒)。"""
+        with self._lock:
+            timer = self._timers.get(name)
+            if timer is None:
+                timer = {"count": 0, "total": 0.0, "max": 0.0, "samples": []}
+                self._timers[name] = timer
+            timer["count"] += 1
+            timer["total"] += seconds
+            timer["max"] = max(timer["max"], seconds)
+            if len(timer["samples"]) < 5000:
+                timer["samples"].append(seconds)
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    @contextmanager
+    def span(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def elapsed(self):
+        return time.perf_counter() - self._started
+
+    def snapshot(self):
+        with self._lock:
+            timers = {}
+            for name, timer in self._timers.items():
+                samples = sorted(timer["samples"])
+                timers[name] = {
+                    "count": timer["count"],
+                    "total_s": round(timer["total"], 6),
+                    "avg_s": round(timer["total"] / timer["count"], 6),
+                    "p50_s": round(samples[int(0.50 * (len(samples) - 1))], 6),
+                    "p95_s": round(samples[int(0.95 * (len(samples) - 1))], 6),
+                    "max_s": round(timer["max"], 6),
+                }
+            counters = dict(self._counters)
+        return {
+            "run": self.name,
+            "started_at": self.started_at.isoformat(timespec='seconds'),
+            "wall_time_s": round(self.elapsed(), 3),
+            "counters": counters,
+            "timers": timers,
+        }
+
+    def summary_line(self):
+        with self._lock:
+            c = dict(self._counters)
+        return (f"⏱️  {self.elapsed():6.1f}s | Notion 請求 {c.get('notion.requests', 0)} "
+                f"(錯誤 {c.get('notion.errors', 0)}, 重試 {c.get('notion.retries', 0)}) | "
+                f"頁面建立 {c.get('upload.created', 0) + c.get('notes.created', 0)} | "
+                f"提醒 {c.get('reminders.updated', 0)}")
+
+    def start_live_summary(self, interval=5.0, stream=None):
+        """在背景每 interval 秒輸出一行即時摘要。"""
+        stream = stream or sys.stderr
+
+        def loop():
+            while not self._live_stop.wait(interval):
+                print(self.summary_line(), file=stream, flush=True)
+
+        self._live_thread = threading.Thread(target=loop, daemon=True)
+        self._live_thread.start()
+
+    def stop_live_summary(self):
+        if self._live_thread is not None:
+            self._live_stop.set()
+            self._live_thread.join()
+            self._live_thread = None
+
+    def export_json(self, directory=DEFAULT_METRICS_DIR):
+        """將指標寫入 directory/run-<名稱>-<時間>.json，回傳檔案路徑。"""
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        path = os.path.join(directory, f"run-{self.name}-{self.started_at.strftime('%Y%m%d-%H%M%S')}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        return path
+
+
+# --- 行程層級的目前執行 ---
+_current = RunMetrics("default")
+
+
+def current_run():
+    return _current
+
+
+def start_run(name, live=False, interval=5.0):
+    """開始新的一次執行紀錄並設為目前執行；live=True 時會定期輸出即時摘要。"""
+    global _current
+    _current = RunMetrics(name)
+    if live:
+        _current.start_live_summary(interval)
+    return _current
+
+
+def finish_run(directory=DEFAULT_METRICS_DIR):
+    """結束目前執行並匯出 JSON，回傳檔案路徑；寫入失敗時回傳 None。"""
+    _current.stop_live_summary()
+    try:
+        return _current.export_json(directory)
+    except OSError as e:
+        print(f"⚠️ 匯出執行指標失敗: {e}")
+        return None
+
+
+def span(name):
+    return _current.span(name)
+
+
+def timed(name):
+    """裝飾器：將整個函式的執行時間記錄為名為 name 的 span。"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _current.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def incr(name, value=1):
+    _current.incr(name, value)
+
+
+def observe(name, seconds):
+    _current.observe(name, seconds)
+
+
+def sleep(seconds, name="sleep"):
+    """time.sleep 的替代，並將等待時間計入指標。"""
+    time.sleep(seconds)
+    _current.observe(name, seconds)
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import time
+
+DEFAULT_TTL_MINUTES = 60
+CACHE_SUFFIX = ".schedule_cache.json"
+
+
+def _sha256(obj):
+    text = json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def cache_path(output_dir, username, semester_name):
+    """快取檔與課表 CSV 放在同一個目錄，每個帳號、每個學期各一個。"""
+    safe = lambda text: "".join(ch if ch.isalnum() else "_" for ch in str(text))
+    return os.path.join(output_dir, f"{safe(username)}-{safe(semester_name)}{CACHE_SUFFIX}")
+
+
+def grid_table_hash(table_rows):
+    """課程表格的正規化雜湊：只取每個儲存格 strip 後的文字，忽略 HTML 排版與 ViewState 之類的變動。"""
+    if table_rows is None:
+        return None
+    return _sha256([[stripped for _, stripped in row] for row in table_rows])
+
+
+def notion_targets(mode, database_id=None, notes_db_id=None):
+    """上傳的目的地：課程資料庫 (融合模式再加上筆記資料庫)；ics 模式不寫入 Notion，回傳空列表。"""
+    if mode == "ics":
+        return []
+    ids = [database_id] + ([notes_db_id] if mode == "fused" else [])
+    return [str(db_id or "").replace("-", "").lower() for db_id in ids]
+
+
+def schedule_params_hash(semester_start, semester_end, exclude_dates, period_table, mode, targets=()):
+    """影響處理結果的其他輸入：學期起訖、停課日、節次對照表、上傳模式與目的地資料庫。"""
+    return _sha256({"start": semester_start, "end": semester_end, "exclude": sorted(str(d) for d in exclude_dates or ()),
+                    "periods": sorted(period_table.items()), "mode": mode, "targets": list(targets)})
+
+
+def snapshot_hash(base_params_hash, rows):
+    """課表 CSV 快照的雜湊 (連同不含上傳模式的設定雜湊)，用來確認磁碟上的快照就是上次成功上傳的內容。"""
+    return _sha256({"params": base_params_hash, "rows": rows})
+
+
+def courses_hash(courses):
+    """處理後課程列表的雜湊，供記錄與比對 (Course 紀錄先轉成與舊版相同的字典)。"""
+    return _sha256([dict(course) for course in courses])
+
+
+class ScheduleCache:
+    """記錄某帳號某學期上次成功上傳時的課表雜湊；課表與設定都沒變時可跳過處理與上傳。
+
+    紀錄連同上傳目的地 (notion_targets) 一起保存；目的地資料庫換掉時整筆紀錄作廢，
+    新資料庫會重新完整上傳，也不會拿舊資料庫的快照來只同步差異。
+    """
+
+    def __init__(self, path, targets=()):
+        self.path = path
+        self.targets = list(targets)
+        self.entry = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entry = json.load(f)
+            except (OSError, ValueError):
+                self.entry = {}
+        if self.entry and self.entry.get("targets") != self.targets:
+            self.entry = {}
+
+    def is_fresh(self, params_hash, ttl_minutes):
+        """上次成功上傳後 ttl_minutes 分鐘內且設定相同時回傳 True，此時連登入抓取都可以省略。"""
+        if ttl_minutes <= 0 or self.entry.get("params_hash") != params_hash:
+            return False
+        return time.time() - self.entry.get("fetched_at", 0) < ttl_minutes * 60
+
+    def is_unchanged(self, params_hash, table_hash):
+        """剛抓到的課表與上次成功上傳時相同 (設定也相同) 時回傳 True。"""
+        return (table_hash is not None and self.entry.get("params_hash") == params_hash
+                and self.entry.get("table_hash") == table_hash)
+
+    def matches_snapshot(self, snapshot_hash_value):
+        """磁碟上的 CSV 快照與上次成功上傳時一致時回傳 True，此時才能以它為基準只同步差異。"""
+        return self.entry.get("snapshot_hash") == snapshot_hash_value
+
+    def touch(self):
+        """課表未變動時只更新抓取時間，延長 TTL。"""
+        self.entry["fetched_at"] = time.time()
+        self._save()
+
+    def record(self, params_hash, table_hash, courses, snapshot_hash_value=None):
+        """上傳成功後記錄本次的雜湊。"""
+        self.entry = {"params_hash": params_hash, "table_hash": table_hash, "courses_hash": courses_hash(courses),
+                      "snapshot_hash": snapshot_hash_value, "targets": self.targets,
+                      "course_count": len(courses), "fetched_at": time.time(),
+                      "fetched_at_text": time.strftime("%Y-%m-%d %H:%M:%S")}
+        self._save()
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entry, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠️ 寫入課表快取失敗: {e}")
@@ -1,15 +1,17 @@
 import requests
-import json
-import time
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import run_metrics
+from notion_api import get_client
+from notion_schema import invalidate_schema
+from notion_uploader import DEFAULT_MAX_WORKERS, run_streaming
 
 def test_notion_connection(api_key):
     """測試 Notion API 連線。"""
     print("▶️  正在測試 Notion API 連線...")
-    headers = {"Authorization": f"Bearer {api_key}","Notion-Version": "2022-06-28"}
-    test_url = "https://api.notion.com/v1/users/me"
     try:
-        response = requests.get(test_url, headers=headers)
+        response = get_client(api_key).get("/v1/users/me")
         response.raise_for_status()
         bot_info = response.json()
         bot_name = bot_info.get("name", "未命名機器人")
@@ -19,84 +21,196 @@ def test_notion_connection(api_key):
         print(f"❌ Notion 連線測試失敗: {e}")
         return False
 
-def clear_all_blocks_on_page(api_key, page_id):
-    """刪除指定頁面下的所有內容區塊。"""
+def _delete_block(client, block):
+    """刪除 (封存) 單一區塊，回傳 "deleted"、"missing" (已不存在) 或 "failed"。"""
+    try:
+        response = client.delete(f"/v1/blocks/{block['id']}")
+    except requests.exceptions.RequestException as e:
+        print(f"   ❌ 刪除區塊 {block['id']} 時發生網路錯誤: {e}")
+        return "failed"
+    if response.status_code == 200:
+        return "deleted"
+    if response.status_code == 404:
+        return "missing"
+    print(f"   ❌ 刪除區塊 {block['id']} 失敗: {response.text}")
+    return "failed"
+
+@run_metrics.timed("setup.clear_page")
+def clear_all_blocks_on_page(api_key, page_id, max_workers=DEFAULT_MAX_WORKERS, passes=2):
+    """刪除指定頁面下的所有內容區塊，回傳 {"found", "deleted", "failed", "remaining", "elapsed"}。
+
+    先以分頁游標列出全部子區塊 (邊刪邊翻頁會讓游標位移而漏掉區塊)，再交給有限併發的刪除執行緒池
+    (速率由共用權杖桶控制)；刪除後重新列出頁面確認已清空，仍有殘留時最多再重試 passes - 1 輪。
+    """
     print(f"▶️  正在準備清空頁面 (ID: {page_id})...")
-    headers = {"Authorization": f"Bearer {api_key}", "Notion-Version": "2022-06-28"}
-    get_children_url = f"https://api.notion.com/v1/blocks/{page_id}/children?page_size=100"
+    client = get_client(api_key)
+    summary = {"found": 0, "deleted": 0, "failed": 0, "remaining": None, "elapsed": 0.0}
+    started = time.perf_counter()
     try:
-        response = requests.get(get_children_url, headers=headers)
-        response.raise_for_status()
-        blocks = response.json().get("results", [])
+        # 先列出全部區塊再刪除，避免邊刪邊翻頁時游標位移而漏掉區塊
+        blocks = list(client.iter_block_children(page_id))
+        summary["found"] = len(blocks)
         if not blocks:
             print("   ℹ️  頁面本身是空的，無需清空。")
-            return
-        print(f"   偵測到 {len(blocks)} 個區塊，準備刪除...")
-        for block in blocks:
-            requests.delete(f"https://api.notion.com/v1/blocks/{block['id']}", headers=headers)
-            time.sleep(0.4)
-        print("✅ 頁面內容已成功清空。")
+            summary["remaining"] = 0
+            return summary
+        print(f"   偵測到 {len(blocks)} 個區塊，以 {max_workers} 個執行緒併發刪除...")
+        for attempt in range(passes):
+            results, _ = run_streaming(lambda block: _delete_block(client, block), blocks, max_workers)
+            summary["deleted"] += results.count("deleted") + results.count("missing")
+            summary["failed"] = results.count("failed")
+            # 重新列出確認結果，殘留的區塊在下一輪重試
+            blocks = list(client.iter_block_children(page_id))
+            summary["remaining"] = len(blocks)
+            if not blocks:
+                break
+            print(f"   ⚠️  第 {attempt + 1} 輪後仍有 {len(blocks)} 個區塊未刪除。")
     except requests.exceptions.RequestException as e:
-        print(f"❌ 清空頁面時發生錯誤: {e.response.text}")
+        print(f"❌ 清空頁面時發生錯誤: {e}")
+        return summary
+    finally:
+        summary["elapsed"] = time.perf_counter() - started
+
+    run_metrics.incr("setup.blocks_deleted", summary["deleted"])
+    if summary["remaining"]:
+        print(f"❌ 頁面未能完全清空：已刪除 {summary['deleted']} 個區塊，仍殘留 {summary['remaining']} 個。")
+    else:
+        print(f"✅ 頁面內容已成功清空，共刪除 {summary['deleted']} 個區塊，耗時 {summary['elapsed']:.1f} 秒。")
+    return summary
 
+@run_metrics.timed("setup.create_database")
 def create_database(api_key, parent_page_id, db_title, db_icon, db_properties):
     """通用的資料庫建立函式。"""
     print(f"▶️  正在嘗試建立資料庫: '{db_title}'...")
-    headers = {"Authorization": f"Bearer {api_key}","Content-Type": "application/json","Notion-Version": "2022-06-28"}
     payload = {"parent": {"type": "page_id", "page_id": parent_page_id},"icon": {"type": "emoji", "emoji": db_icon},"title": [{"type": "text", "text": {"content": db_title}}],"properties": db_properties}
-    url = "https://api.notion.com/v1/databases"
     try:
-        response = requests.post(url, headers=headers, data=json.dumps(payload))
+        response = get_client(api_key).post("/v1/databases", payload)
         response.raise_for_status()
         new_db = response.json()
         print(f"✅ 成功建立資料庫: '{db_title}', ID: {new_db['id']}")
         return new_db
     except requests.exceptions.RequestException as e:
-        print(f"❌ 建立資料庫 '{db_title}' 失敗: {e.response.text}")
+        print(f"❌ 建立資料庫 '{db_title}' 失敗: {getattr(e.response, 'text', e)}")
         return None
 
-def update_config_file(key, value, filename="config.txt"):
-    """安全地更新或新增 config.txt 中的一個鍵值對。"""
+DASHBOARD_TITLE = "大學四年學習總部"
+
+def scan_parent_page(api_key, parent_page_id):
+    """逐頁列出父頁面的區塊，回傳 ({子資料庫標題: 資料庫 ID}, 是否已有儀表板佈局)。"""
+    existing, has_layout = {}, False
+    for block in get_client(api_key).iter_block_children(parent_page_id):
+        if block.get("type") == "child_database":
+            existing.setdefault(block["child_database"].get("title", ""), block["id"])
+        elif block.get("type") == "heading_1":
+            text = "".join(item.get("plain_text") or item.get("text", {}).get("content", "")
+                           for item in block["heading_1"].get("rich_text", []))
+            has_layout = has_layout or text == DASHBOARD_TITLE
+    return existing, has_layout
+
+def _stale_relations(existing_properties, db_properties):
+    """找出既有資料庫中指向其他資料庫的關聯屬性 (例如仍連到舊的課程資料庫)，回傳 {屬性名稱: 應有的定義}。"""
+    stale = {}
+    for name, spec in db_properties.items():
+        wanted = (spec.get("relation") or {}).get("database_id")
+        current = existing_properties.get(name)
+        if not wanted or current is None:
+            continue
+        target = (current.get("relation") or {}).get("database_id") or ""
+        if target.replace('-', '') != wanted.replace('-', ''):
+            stale[name] = spec
+    return stale
+
+def reuse_database(api_key, database_id, db_title, db_properties):
+    """取得既有資料庫，補上缺少的屬性並把指向其他資料庫的關聯改回正確目標，失敗時回傳 None。
+
+    其餘既有屬性不會被修改；關聯無法改正時不沿用此資料庫 (回傳 None，由呼叫端建立新的)。
+    """
+    client = get_client(api_key)
+    try:
+        response = client.get(f"/v1/databases/{database_id}")
+        response.raise_for_status()
+        database = response.json()
+        if database.get("archived"):
+            return None
+        existing_properties = database.get("properties", {})
+        missing = {name: spec for name, spec in db_properties.items() if name not in existing_properties}
+        stale = _stale_relations(existing_properties, db_properties)
+        if missing:
+            print(f"   ➕ 為既有資料庫 '{db_title}' 補上缺少的屬性: {', '.join(missing)}")
+        if stale:
+            print(f"   🔗 既有資料庫 '{db_title}' 的關聯屬性指向其他資料庫，改為連到目前的課程資料庫: {', '.join(stale)}")
+        if missing or stale:
+            response = client.patch(f"/v1/databases/{database_id}", {"properties": dict(missing, **stale)})
+            response.raise_for_status()
+            database = response.json()
+            invalidate_schema(database_id)
+            if _stale_relations(database.get("properties", {}), db_properties):
+                print(f"❌ 無法改正資料庫 '{db_title}' 的關聯目標，將改為建立新的資料庫。")
+                return None
+    except requests.exceptions.RequestException as e:
+        print(f"❌ 讀取既有資料庫 '{db_title}' 失敗: {e}")
+        return None
+    print(f"♻️  沿用既有資料庫: '{db_title}', ID: {database['id']}")
+    return database
+
+def provision_database(api_key, parent_page_id, existing, db_title, db_icon, db_properties):
+    """父頁面下已有同名資料庫時沿用之，否則建立新的資料庫。"""
+    if db_title in existing:
+        database = reuse_database(api_key, existing[db_title], db_title, db_properties)
+        if database is not None:
+            run_metrics.incr("setup.databases_reused")
+            return database
+    return create_database(api_key, parent_page_id, db_title, db_icon, db_properties)
+
+def update_config_values(values, filename="config.txt"):
+    """一次更新或新增 config.txt 中的多個鍵值對；寫入暫存檔後以 os.replace 原子性地取代原檔。"""
     print(f"▶️  正在自動更新設定檔 {filename}...")
-    key_found = False
     lines = []
     if os.path.exists(filename):
         with open(filename, 'r', encoding='utf-8') as f:
             lines = f.readlines()
-    with open(filename, 'w', encoding='utf-8') as f:
-        for line in lines:
-            if line.strip().startswith(key + '='):
-                f.write(f"{key}={value}\n")
-                key_found = True
-            else:
-                f.write(line)
-        if not key_found:
-            if lines and not lines[-1].endswith('\n'):
-                f.write('\n')
-            f.write(f"{key}={value}\n")
-    print(f"✅ 設定檔更新完畢: 已自動設定 {key}。")
+    pending = dict(values)
+    output = []
+    for line in lines:
+        key = line.split('=', 1)[0].strip() if '=' in line and not line.strip().startswith('#') else None
+        if key in pending:
+            output.append(f"{key}={pending.pop(key)}\n")
+        else:
+            output.append(line)
+    if pending and output and not output[-1].endswith('\n'):
+        output[-1] += '\n'
+    output.extend(f"{key}={value}\n" for key, value in pending.items())
+
+    tmp_path = filename + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.writelines(output)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, filename)
+    print(f"✅ 設定檔更新完畢: 已自動設定 {', '.join(values)}。")
+
+def update_config_file(key, value, filename="config.txt"):
+    """安全地更新或新增 config.txt 中的一個鍵值對。"""
+    update_config_values({key: value}, filename)
 
 def update_parent_page_title(api_key, page_id, new_title):
     """更新指定頁面的標題。"""
     print(f"▶️  正在嘗試更新父頁面標題為: '{new_title}'...")
-    url = f"https://api.notion.com/v1/pages/{page_id}"
-    headers = {"Authorization": f"Bearer {api_key}","Content-Type": "application/json","Notion-Version": "2022-06-28"}
     payload = {"properties": {"title": { "title": [{"type": "text", "text": {"content": new_title}}] }}}
     try:
-        response = requests.patch(url, headers=headers, data=json.dumps(payload))
+        response = get_client(api_key).patch(f"/v1/pages/{page_id}", payload)
         response.raise_for_status()
         print(f"✅ 父頁面標題已成功更新！")
     except requests.exceptions.RequestException as e:
-        print(f"❌ 更新父頁面標題失敗: {e.response.text}")
+        print(f"❌ 更新父頁面標題失敗: {getattr(e.response, 'text', e)}")
 
+@run_metrics.timed("setup.dashboard_layout")
 def build_dashboard_layout(api_key, page_id, db_objects):
     """在指定頁面上建立儀表板的基礎佈局 (繁體中文版)。"""
     print("\n▶️  正在建立儀表板基礎佈局 (繁體中文)...")
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json", "Notion-Version": "2022-06-28"}
-    url = f"https://api.notion.com/v1/blocks/{page_id}/children"
     layout_payload = {
         "children": [
-            {"type": "heading_1", "heading_1": {"rich_text": [{"text": {"content": "大學四年學習總部"}}]}},
+            {"type": "heading_1", "heading_1": {"rich_text": [{"text": {"content": DASHBOARD_TITLE}}]}},
             {"type": "divider", "divider": {}},
             {"type": "column_list", "column_list": {"children": [
                 {"type": "column", "column": {"children": [
@@ -119,33 +233,18 @@ def build_dashboard_layout(api_key, page_id, db_objects):
         ]
     }
     try:
-        response = requests.patch(url, headers=headers, data=json.dumps(layout_payload, ensure_ascii=False).encode('utf-8'))
+        response = get_client(api_key).patch(f"/v1/blocks/{page_id}/children", layout_payload)
         response.raise_for_status()
         print("✅ 儀表板基礎佈局已成功建立！")
     except requests.exceptions.RequestException as e:
-        print(f"❌ 建立儀表板佈局失敗: {e.response.text}")
+        print(f"❌ 建立儀表板佈局失敗: {getattr(e.response, 'text', e)}")
 
 
-def setup_all_databases(api_key, parent_page_id):
-    """主功能：依序驗證、清空、建立所有核心資料庫，並自動更新設定檔。"""
-    print("\n--- 開始執行資料庫初始化設定 ---")
-    
-    print("\n步驟 1/5: 測試 Notion API 連線...");
-    if not test_notion_connection(api_key): return False
-    
-    print("\n步驟 2/5: 清理環境...")
-    choice = input("   連線成功！是否要清空父頁面上的所有現有內容？(y/N): ").lower()
-    if choice == 'y':
-        confirm = input("   ⚠️  警告：這將永久刪除父頁面內所有區塊！確定要繼續嗎？(y/N): ").lower()
-        if confirm == 'y': clear_all_blocks_on_page(api_key, parent_page_id)
-        else: print("   ℹ️  已取消清空操作。")
-    else: print("   ℹ️  已跳過清空頁面步驟。")
+# --- 各資料庫的結構 ---
 
-    print("\n步驟 3/5: 建立所有核心資料庫...")
-    db_objects = {}
-    
-    # 課程資料庫的最終結構
-    courses_props = {
+def course_database_properties():
+    """課程資料庫的最終結構"""
+    return {
         "課程名稱": {"title": {}}, "學期": {"select": {"options": [{"name": "114上"}]}},
         "週次": {"number": {"format": "number"}}, "課程日期與提醒": {"date": {}},
         "課程代碼": {"rich_text": {}}, "授課教師": {"rich_text": {}},
@@ -153,20 +252,16 @@ def setup_all_databases(api_key, parent_page_id):
         "必選修": {"select": {"options": [{"name": "學程"}, {"name": "選"}]}},
         "星期": {"rich_text": {}}, "開始時間": {"rich_text": {}}, "結束時間": {"rich_text": {}}
     }
-    courses_db = create_database(api_key, parent_page_id, "📚 課程總資料庫", "📚", courses_props)
-    if not courses_db: return False
-    db_objects["courses"] = courses_db; update_config_file("COURSE_DATABASE_ID", courses_db['id'].replace('-', '')); time.sleep(1)
 
-    # 任務資料庫的最終結構
-    tasks_props = {"任務名稱": {"title": {}},"關聯到課程": {"relation": {"database_id": courses_db['id'], "single_property": {}}},"截止日期": {"date": {}}, "類型": {"select": {"options": [{"name": "作業"}, {"name": "考試"}]}},"狀態": {"status": {}}, "學期": {"select": {"options": [{"name": "114上"}]}}}
-    tasks_db = create_database(api_key, parent_page_id, "✅ 任務總資料庫", "✅", tasks_props)
-    if not tasks_db: return False
-    db_objects["tasks"] = tasks_db; update_config_file("TASK_DATABASE_ID", tasks_db['id'].replace('-', '')); time.sleep(1)
-    
-    # 筆記資料庫的最終結構
-    notes_props = {
+def task_database_properties(course_db_id):
+    """任務資料庫的最終結構"""
+    return {"任務名稱": {"title": {}},"關聯到課程": {"relation": {"database_id": course_db_id, "single_property": {}}},"截止日期": {"date": {}}, "類型": {"select": {"options": [{"name": "作業"}, {"name": "考試"}]}},"狀態": {"status": {}}, "學期": {"select": {"options": [{"name": "114上"}]}}}
+
+def note_database_properties(course_db_id):
+    """筆記資料庫的最終結構"""
+    return {
         "筆記標題": {"title": {}},
-        "關聯到課程": {"relation": {"database_id": courses_db['id'], "single_property": {}}},
+        "關聯到課程": {"relation": {"database_id": course_db_id, "single_property": {}}},
         "上課日期": {"date": {}},
         "學期": {"select": {"options": [{"name": "114上"}]}},
         "週次": {"number": {"format": "number"}},
@@ -174,15 +269,68 @@ def setup_all_databases(api_key, parent_page_id):
         "建立時間": {"created_time": {}},
         "最後修改時間": {"last_edited_time": {}}
     }
-    notes_db = create_database(api_key, parent_page_id, "📝 學習筆記總資料庫", "📝", notes_props)
-    if not notes_db: return False
-    db_objects["notes"] = notes_db; update_config_file("NOTE_DATABASE_ID", notes_db['id'].replace('-', ''))
+
+@run_metrics.timed("setup.total")
+def setup_all_databases(api_key, parent_page_id, clear_parent=None, config_path="config.txt"):
+    """主功能：依序驗證、清空、建立所有核心資料庫，並自動更新設定檔。
+
+    父頁面下已有同名資料庫時直接沿用 (只補上缺少的屬性)，任務與筆記資料庫同時建立，
+    所有資料庫 ID 一次原子性地寫回設定檔；重複執行時不會產生重複的資料庫或佈局。
+
+    clear_parent 為 None 時互動式詢問是否清空父頁面；True/False 則直接決定，供非互動執行使用。
+    """
+    print("\n--- 開始執行資料庫初始化設定 ---")
+    
+    print("\n步驟 1/5: 測試 Notion API 連線...");
+    if not test_notion_connection(api_key): return False
+    
+    print("\n步驟 2/5: 清理環境...")
+    if clear_parent is True:
+        print("   ⚠️  依參數設定清空父頁面上的所有現有內容...")
+        clear_all_blocks_on_page(api_key, parent_page_id)
+    elif clear_parent is False:
+        print("   ℹ️  依參數設定跳過清空頁面步驟。")
+    elif input("   連線成功！是否要清空父頁面上的所有現有內容？(y/N): ").lower() == 'y':
+        confirm = input("   ⚠️  警告：這將永久刪除父頁面內所有區塊！確定要繼續嗎？(y/N): ").lower()
+        if confirm == 'y': clear_all_blocks_on_page(api_key, parent_page_id)
+        else: print("   ℹ️  已取消清空操作。")
+    else: print("   ℹ️  已跳過清空頁面步驟。")
+
+    print("\n步驟 3/5: 建立所有核心資料庫...")
+    try:
+        existing, has_layout = scan_parent_page(api_key, parent_page_id)
+    except requests.exceptions.RequestException as e:
+        print(f"❌ 讀取父頁面內容失敗: {e}")
+        return False
+    if existing:
+        print(f"   父頁面下已有 {len(existing)} 個資料庫，同名者將直接沿用。")
+
+    db_objects = {}
+    courses_db = provision_database(api_key, parent_page_id, existing, "📚 課程總資料庫", "📚", course_database_properties())
+    if not courses_db: return False
+    db_objects["courses"] = courses_db
+
+    # 任務與筆記資料庫都只依賴課程資料庫 ID，同時建立
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        tasks_future = executor.submit(provision_database, api_key, parent_page_id, existing, "✅ 任務總資料庫", "✅",
+                                       task_database_properties(courses_db['id']))
+        notes_future = executor.submit(provision_database, api_key, parent_page_id, existing, "📝 學習筆記總資料庫", "📝",
+                                       note_database_properties(courses_db['id']))
+        db_objects["tasks"], db_objects["notes"] = tasks_future.result(), notes_future.result()
+    if not all(db_objects.values()): return False
+
+    update_config_values({"COURSE_DATABASE_ID": db_objects["courses"]['id'].replace('-', ''),
+                          "TASK_DATABASE_ID": db_objects["tasks"]['id'].replace('-', ''),
+                          "NOTE_DATABASE_ID": db_objects["notes"]['id'].replace('-', '')}, config_path)
 
     print("\n步驟 4/5: 建立儀表板佈局...")
-    build_dashboard_layout(api_key, parent_page_id, db_objects)
+    if has_layout:
+        print("   ℹ️  父頁面上已有儀表板佈局，跳過。")
+    else:
+        build_dashboard_layout(api_key, parent_page_id, db_objects)
 
     print("\n步驟 5/5: 更新父頁面標題...")
-    update_parent_page_title(api_key, parent_page_id, "大學四年學習總部")
+    update_parent_page_title(api_key, parent_page_id, DASHBOARD_TITLE)
     
     print("\n" + "="*50)
     print("🎉 所有初始化設定任務已成功執行完畢！")
@@ -1,42 +1,46 @@
 import time
 import os
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, UnexpectedAlertPresentException, NoAlertPresentException
-
-def read_config(filename='config.txt'):
-    """從設定檔讀取設定，並回傳一個字典。"""
-    config = {}
-    try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            for line in f:
-                if '=' in line and not line.strip().startswith('#'):
-                    key, value = line.strip().split('=', 1)
-                    config[key.strip()] = value.strip()
-        return config
-    except FileNotFoundError:
-        print(f"❌ 錯誤：找不到設定檔 {filename}。")
-        return None
+import re
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+import run_metrics
+# read_config 已移至 config_loader，保留此匯入讓舊的 `from web_scraper import read_config` 繼續可用
+from config_loader import read_config  # noqa: F401
 
+USERNAME_FIELD_ID = "ContentPlaceHolder1_ed_StudNo"
+PASSWORD_FIELD_ID = "ContentPlaceHolder1_ed_pass"
+LOGIN_BUTTON_ID = "ContentPlaceHolder1_BtnLoginNew"
+LOGOUT_LINK_ID = "ContentPlaceHolder1_HyperLink5"
+
+@run_metrics.timed("scrape.selenium_session")
 def login_and_get_page_source(login_url, username, password):
     """登入、處理對話框，最終回傳登入成功後的頁面原始碼。"""
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException, UnexpectedAlertPresentException, NoAlertPresentException
+
     print("▶️  正在啟動 Chrome 瀏覽器...")
-    driver = webdriver.Chrome()
+    with run_metrics.span("scrape.browser_start"):
+        driver = webdriver.Chrome()
     wait = WebDriverWait(driver, 10)
     page_source = None
 
     try:
         print(f"▶️  正在前往登入頁面: {login_url}")
+        phase_started = time.perf_counter()
         driver.get(login_url)
-        username_field = wait.until(EC.presence_of_element_located((By.ID, "ContentPlaceHolder1_ed_StudNo")))
+        username_field = wait.until(EC.presence_of_element_located((By.ID, USERNAME_FIELD_ID)))
         username_field.send_keys(username)
-        password_field = wait.until(EC.presence_of_element_located((By.ID, "ContentPlaceHolder1_ed_pass")))
+        password_field = wait.until(EC.presence_of_element_located((By.ID, PASSWORD_FIELD_ID)))
         password_field.send_keys(password)
-        login_button = wait.until(EC.element_to_be_clickable((By.ID, "ContentPlaceHolder1_BtnLoginNew")))
+        login_button = wait.until(EC.element_to_be_clickable((By.ID, LOGIN_BUTTON_ID)))
         login_button.click()
+        run_metrics.observe("scrape.login_form", time.perf_counter() - phase_started)
 
+        phase_started = time.perf_counter()
         print("\n▶️  登入後，啟動「全自動對話框清理循環」(最多等待10秒)...")
         end_time = time.time() + 10
         while time.time() < end_time:
@@ -59,17 +63,18 @@ def login_and_get_page_source(login_url, username, password):
                     break
             except UnexpectedAlertPresentException:
                 continue
-            time.sleep(0.5)
+            run_metrics.sleep(0.5, "scrape.sleep")
 
         wait.until(EC.url_contains("course_sele"))
+        run_metrics.observe("scrape.dialog_cleanup", time.perf_counter() - phase_started)
         print("🎉 登入成功！準備抓取頁面原始碼...")
         
         page_source = driver.page_source
         
         print("✅ 頁面原始碼抓取成功。")
-        time.sleep(2)
+        run_metrics.sleep(2, "scrape.sleep")
         
-        logout_button_element = wait.until(EC.presence_of_element_located((By.ID, "ContentPlaceHolder1_HyperLink5")))
+        logout_button_element = wait.until(EC.presence_of_element_located((By.ID, LOGOUT_LINK_ID)))
         driver.execute_script("arguments[0].click();", logout_button_element)
         print("✅ 已登出。")
 
@@ -93,4 +98,158 @@ def login_and_get_page_source(login_url, username, password):
     finally:
         print("▶️  正在關閉瀏覽器...")
         driver.quit()
-        return page_source
\ No newline at end of file
+        return page_source
+
+
+def _save_error_html(html, filename="error_page_source_http.html"):
+    """將 HTTP 模式失敗時的頁面存到 'error_log/' 以便除錯。"""
+    try:
+        error_log_dir = "error_log"
+        if not os.path.exists(error_log_dir):
+            os.makedirs(error_log_dir)
+        html_path = os.path.join(error_log_dir, filename)
+        with open(html_path, "w", encoding="utf-8") as f:
+            f.write(html)
+        print(f"   ✅ 已將頁面HTML儲存至 {html_path}")
+    except OSError as save_e:
+        print(f"   ⚠️ 儲存除錯檔案時發生額外錯誤: {save_e}")
+
+
+class _AspNetFormParser(HTMLParser):
+    """收集 ASP.NET WebForms 頁面中的表單 action、所有 input 欄位與具 id 的超連結。"""
+
+    def __init__(self):
+        super().__init__()
+        self.form_action = None
+        self.inputs = []   # [{"name", "value", "id", "type"}]
+        self.links = {}    # {id: href}
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "form" and self.form_action is None:
+            self.form_action = attrs.get("action", "")
+        elif tag == "input":
+            self.inputs.append({
+                "name": attrs.get("name"), "value": attrs.get("value") or "",
+                "id": attrs.get("id"), "type": (attrs.get("type") or "text").lower(),
+            })
+        elif tag == "a" and attrs.get("id"):
+            self.links[attrs["id"]] = attrs.get("href")
+
+
+def _parse_aspnet_form(html):
+    parser = _AspNetFormParser()
+    parser.feed(html)
+    return parser
+
+
+def _build_login_form(form, username, password):
+    """重播登入表單：帶上所有 hidden 欄位 (__VIEWSTATE 等)，填入帳密並模擬按下登入鈕。"""
+    by_id = {field["id"]: field for field in form.inputs if field["id"]}
+    data = {field["name"]: field["value"] for field in form.inputs
+            if field["type"] == "hidden" and field["name"]}
+
+    def field_name(field_id):
+        field = by_id.get(field_id)
+        # 找不到時依 ASP.NET 的命名慣例由 ID 推得 name
+        return field["name"] if field and field["name"] else "ctl00$" + field_id.replace("_", "$", 1)
+
+    data[field_name(USERNAME_FIELD_ID)] = username
+    data[field_name(PASSWORD_FIELD_ID)] = password
+    button = by_id.get(LOGIN_BUTTON_ID)
+    if button and button["type"] in ("submit", "image"):
+        data[field_name(LOGIN_BUTTON_ID)] = button["value"]
+    else:
+        # LinkButton 以 __doPostBack 送出，事件目標放在 __EVENTTARGET
+        data["__EVENTTARGET"] = field_name(LOGIN_BUTTON_ID)
+    return data
+
+
+@run_metrics.timed("scrape.http_session")
+def login_and_get_page_source_http(login_url, username, password, session=None, timeout=15):
+    """不啟動瀏覽器，以 requests session 重播 ASP.NET 登入表單，回傳 course_sele 頁面原始碼。
+
+    登入後的 alert 與評量對話框只是前端腳本，HTTP 模式下不需要處理；
+    若登入回應不是 course_sele 頁面，會嘗試跟隨頁面中指向 course_sele 的連結。
+    """
+    import requests
+
+    print("▶️  正在以 HTTP 模式登入 (不啟動瀏覽器)...")
+    own_session = session is None
+    session = session or requests.Session()
+    page_source = None
+    try:
+        response = session.get(login_url, timeout=timeout)
+        response.raise_for_status()
+        form = _parse_aspnet_form(response.text)
+        if not any(field["id"] == USERNAME_FIELD_ID for field in form.inputs):
+            print("❌ 登入頁面中找不到帳號欄位，頁面結構可能已變更。")
+            _save_error_html(response.text)
+            return None
+
+        post_url = urljoin(response.url, form.form_action or login_url)
+        response = session.post(post_url, data=_build_login_form(form, username, password), timeout=timeout)
+        response.raise_for_status()
+
+        if "course_sele" not in response.url:
+            match = re.search(r"""['"]([^'"\s]*course_sele[^'"\s]*)['"]""", response.text)
+            if match:
+                response = session.get(urljoin(response.url, match.group(1)), timeout=timeout)
+                response.raise_for_status()
+
+        if "course_sele" not in response.url:
+            print(f"❌ 登入後未進入選課頁面 (目前位於 {response.url})，可能是帳號密碼錯誤。")
+            _save_error_html(response.text)
+            return None
+
+        print("🎉 登入成功！已取得頁面原始碼。")
+        page_source = response.text
+
+        logout_href = _parse_aspnet_form(page_source).links.get(LOGOUT_LINK_ID)
+        if logout_href and not logout_href.startswith("javascript"):
+            session.get(urljoin(response.url, logout_href), timeout=timeout)
+            print("✅ 已登出。")
+    except requests.exceptions.RequestException as e:
+        print(f"☠️ HTTP 模式登入期間發生錯誤: {type(e).__name__} - {e}")
+    finally:
+        if own_session:
+            session.close()
+    return page_source
+
+
+def fetch_course_page_source(login_url, username, password, mode="auto"):
+    """依 mode 取得選課頁面原始碼：'http' 僅用 HTTP、'selenium' 僅用瀏覽器、'auto' 先 HTTP 失敗再改用 Selenium。
+
+    失敗 (包含未安裝 selenium) 時回傳 None。
+    """
+    mode = (mode or "auto").lower()
+    if mode in ("auto", "http"):
+        page_source = login_and_get_page_source_http(login_url, username, password)
+        if page_source or mode == "http":
+            return page_source
+        run_metrics.incr("scrape.http_fallbacks")
+        print("⚠️ HTTP 模式失敗，改用 Selenium 瀏覽器模式...")
+    try:
+        return login_and_get_page_source(login_url, username, password)
+    except ImportError as e:
+        # selenium 為選用套件，未安裝時視為這次抓取失敗
+        print(f"❌ 無法使用 Selenium 瀏覽器模式 ({e})；請執行 pip install selenium，或確認帳號密碼後改用 FETCH_MODE=http。")
+        return None
+
+
+def fetch_with_retries(login_url, username, password, mode="auto", max_attempts=3, retry_delay=5):
+    """重試抓取選課頁面，成功回傳頁面原始碼，達重試上限則回傳 None。"""
+    for attempt in range(max_attempts):
+        print("\n" + "="*50)
+        print(f"▶️  第 {attempt + 1}/{max_attempts} 次嘗試抓取課程網頁...")
+        run_metrics.incr("scrape.attempts")
+        source = fetch_course_page_source(login_url, username, password, mode)
+        if source:
+            print("✅ 網頁抓取成功！")
+            return source
+        run_metrics.incr("scrape.failures")
+        print(f"⚠️ 第 {attempt + 1} 次抓取失敗。")
+        if attempt < max_attempts - 1:
+            print(f"   將在 {retry_delay} 秒後重試...")
+            run_metrics.sleep(retry_delay, "scrape.retry_sleep")
+    return None